@@ -0,0 +1,303 @@
+import os
+import io
+import json
+import time
+import base64
+import random
+import threading
+import urllib.error
+import urllib.request
+from lazy_imports import load_module
+from metrics import registry, timed, tracked
+
+# Defaults match the Gemini 1.5 Flash free-tier quota; override per deployment
+AI_MODEL_NAME = 'gemini-1.5-flash'
+REQUESTS_PER_MINUTE = int(os.environ.get('GEMINI_RPM', 15))
+MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 4))
+MAX_RETRIES = 4
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+QUEUE_TIMEOUT_SECONDS = 120.0
+REQUEST_TIMEOUT_SECONDS = 90.0
+
+# Set to e.g. http://localhost:8080 to talk to a Gemini-compatible REST
+# server (such as a local fake) instead of the google-generativeai SDK
+API_BASE_URL = os.environ.get('GEMINI_API_BASE_URL')
+
+
+class AIError(Exception):
+    """Base class for AI client failures"""
+    retryable = False
+
+
+class AIConfigurationError(AIError):
+    """Missing library or API key"""
+
+
+class AIQuotaError(AIError):
+    """The service rejected the call for rate/quota reasons (HTTP 429)"""
+    retryable = True
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AIServiceError(AIError):
+    """Transient server-side failure (HTTP 5xx)"""
+    retryable = True
+
+
+class AITimeoutError(AIError):
+    """The call did not complete in time"""
+    retryable = True
+
+
+class AIRequestError(AIError):
+    """The request was rejected as invalid; retrying won't help"""
+
+
+class AIResponseError(AIError):
+    """The response was empty, blocked or could not be used"""
+
+
+class AIQueueFullError(AIError):
+    """No quota or concurrency slot became free within the queue timeout"""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiter
+
+    Callers block until a token is available, so bursts queue up instead
+    of hitting the service quota.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1, rate_per_minute)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout=None):
+        """
+        Take one token, waiting for a refill if needed
+
+        Args:
+            timeout: Maximum seconds to wait (None waits forever)
+
+        Returns:
+            bool: True if a token was taken, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+# Process-wide limits, shared by every session's client
+_rate_limiter = TokenBucket(REQUESTS_PER_MINUTE)
+_concurrency = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+
+def _classify_sdk_error(error):
+    """Map google-generativeai / google-api-core exceptions to AIError types"""
+    name = type(error).__name__
+    code = getattr(error, 'code', None)
+    message = str(error)
+
+    if name in ('ResourceExhausted', 'TooManyRequests') or code == 429:
+        return AIQuotaError(message)
+    if name in ('DeadlineExceeded', 'Timeout') or isinstance(error, TimeoutError):
+        return AITimeoutError(message)
+    if name in ('ServiceUnavailable', 'InternalServerError', 'BadGateway', 'GatewayTimeout') or (
+            isinstance(code, int) and code >= 500):
+        return AIServiceError(message)
+    if name in ('InvalidArgument', 'BadRequest', 'PermissionDenied', 'Unauthenticated', 'NotFound'):
+        return AIRequestError(message)
+    if name in ('StopCandidateException', 'BlockedPromptException'):
+        return AIResponseError(message)
+    return AIServiceError(message)
+
+
+class _SDKBackend:
+    """Calls Gemini through the google-generativeai SDK"""
+
+    def __init__(self, api_key, model_name):
+        try:
+            genai = load_module('google.generativeai')
+        except ImportError:
+            raise AIConfigurationError(
+                "google-generativeai library not installed. Please add it to requirements.txt")
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, parts, timeout):
+        try:
+            response = self.model.generate_content(parts, request_options={'timeout': timeout})
+            return response.text
+        except ValueError as e:
+            # response.text raises ValueError when the candidate was blocked/empty
+            raise AIResponseError(str(e))
+        except AIError:
+            raise
+        except Exception as e:
+            raise _classify_sdk_error(e)
+
+
+class _RestBackend:
+    """Calls a Gemini-compatible generateContent REST endpoint"""
+
+    def __init__(self, api_key, model_name, base_url):
+        self.url = f"{base_url.rstrip('/')}/v1beta/models/{model_name}:generateContent?key={api_key}"
+
+    @staticmethod
+    def _part(part):
+        if isinstance(part, str):
+            return {'text': part}
+        if hasattr(part, 'save'):
+            # PIL image
+            image_format = (getattr(part, 'format', None) or 'PNG').upper()
+            buffer = io.BytesIO()
+            part.save(buffer, format=image_format)
+            mime_type = 'image/jpeg' if image_format in ('JPEG', 'JPG') else f"image/{image_format.lower()}"
+            return {'inline_data': {'mime_type': mime_type,
+                                    'data': base64.b64encode(buffer.getvalue()).decode('ascii')}}
+        if isinstance(part, dict):
+            return part
+        return {'text': str(part)}
+
+    def generate(self, parts, timeout):
+        body = json.dumps({'contents': [{'parts': [self._part(p) for p in parts]}]}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                payload = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            message = f"HTTP {e.code}: {e.read().decode('utf-8', 'replace')[:200]}"
+            if e.code == 429:
+                retry_after = e.headers.get('Retry-After')
+                raise AIQuotaError(message, float(retry_after) if retry_after else None)
+            if e.code >= 500:
+                raise AIServiceError(message)
+            raise AIRequestError(message)
+        except (TimeoutError, OSError) as e:
+            if isinstance(e, TimeoutError) or 'timed out' in str(e):
+                raise AITimeoutError(str(e))
+            raise AIServiceError(str(e))
+        except ValueError as e:
+            raise AIResponseError(f"Invalid JSON response: {str(e)}")
+
+        try:
+            texts = [p.get('text', '') for p in payload['candidates'][0]['content']['parts']]
+        except (KeyError, IndexError, TypeError):
+            raise AIResponseError("Response contained no candidates")
+        text = ''.join(texts)
+        if not text.strip():
+            raise AIResponseError("Response was empty")
+        return text
+
+
+class AIClient:
+    """
+    Rate-limited, retrying AI client
+
+    Every attempt takes a token from the process-wide token bucket and a
+    slot from the process-wide concurrency semaphore; retryable failures
+    back off exponentially with full jitter.
+    """
+
+    def __init__(self, api_key, model_name=AI_MODEL_NAME, base_url=API_BASE_URL,
+                 limiter=None, concurrency=None, max_retries=MAX_RETRIES,
+                 queue_timeout=QUEUE_TIMEOUT_SECONDS, request_timeout=REQUEST_TIMEOUT_SECONDS):
+        if not api_key:
+            raise AIConfigurationError("Gemini API key not configured")
+        if base_url:
+            self.backend = _RestBackend(api_key, model_name, base_url)
+        else:
+            self.backend = _SDKBackend(api_key, model_name)
+        self.limiter = limiter or _rate_limiter
+        self.concurrency = concurrency or _concurrency
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.request_timeout = request_timeout
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt)))
+        retry_after = getattr(error, 'retry_after', None)
+        return max(delay, retry_after or 0)
+
+    def generate(self, parts):
+        """
+        Send one request, queuing for quota and retrying transient failures
+
+        Args:
+            parts: List of prompt parts (text, PIL images)
+
+        Returns:
+            str: Response text
+
+        Raises:
+            AIError: A typed failure once retries are exhausted
+        """
+        for attempt in range(self.max_retries + 1):
+            with tracked('ai.queued'), timed('ai.queue_seconds'):
+                if not self.limiter.acquire(timeout=self.queue_timeout):
+                    registry.counter('ai.errors.AIQueueFullError').inc()
+                    raise AIQueueFullError("Timed out waiting for AI quota")
+                if not self.concurrency.acquire(timeout=self.queue_timeout):
+                    registry.counter('ai.errors.AIQueueFullError').inc()
+                    raise AIQueueFullError("Timed out waiting for a free AI slot")
+            try:
+                with tracked('ai.in_flight'), timed('ai.request_seconds'):
+                    return self.backend.generate(parts, self.request_timeout)
+            except AIError as e:
+                registry.counter(f"ai.errors.{type(e).__name__}").inc()
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                self.concurrency.release()
+            registry.counter('ai.retries').inc()
+            time.sleep(self._backoff(attempt, error))
+
+
+# One client per API key, shared by all sessions in the process
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_ai_client(api_key):
+    """
+    Shared AI client for an API key
+
+    Args:
+        api_key: Google Gemini API key
+
+    Returns:
+        AIClient: Client using the process-wide limiter and concurrency cap
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = AIClient(api_key)
+                _clients[api_key] = client
+    return client
@@ -0,0 +1,191 @@
+import calendar
+import pandas as pd
+from currency import BASE_CURRENCY, convert_to_base
+
+CUBE_KEYS = ['User', 'Month', 'Category', 'Direction']
+DEFAULT_USER = 'default'
+
+
+def build_cells(df, user=DEFAULT_USER, base_currency=BASE_CURRENCY):
+    """
+    Aggregate transactions into cube cells
+
+    Args:
+        df: Transaction DataFrame
+        user: User the transactions belong to
+        base_currency: Currency the sums are reported in
+
+    Returns:
+        pd.DataFrame: Sum and Count indexed by (User, Month, Category, Direction),
+                      sums are positive magnitudes
+    """
+    if df is None or df.empty:
+        index = pd.MultiIndex.from_arrays([[], [], [], []], names=CUBE_KEYS)
+        return pd.DataFrame({'Sum': pd.Series(dtype=float), 'Count': pd.Series(dtype='int64')}, index=index)
+
+    amounts = convert_to_base(df, base_currency)
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    valid = dates.notna() & amounts.notna() & (amounts != 0)
+
+    keys = pd.DataFrame({
+        'User': user,
+        'Month': dates[valid].dt.strftime('%Y-%m'),
+        'Category': df.loc[valid, 'Category'].fillna('Other') if 'Category' in df.columns else 'Other',
+        'Direction': (amounts[valid] > 0).map({True: 'credit', False: 'debit'}),
+        'Sum': amounts[valid].abs(),
+        'Count': 1
+    })
+    return keys.groupby(CUBE_KEYS).agg(Sum=('Sum', 'sum'), Count=('Count', 'sum'))
+
+
+def _days_in_month(month, today):
+    """Days covered by a month, counting only elapsed days for the current one"""
+    period = pd.Period(month, freq='M')
+    if period == today.to_period('M'):
+        return today.day
+    return calendar.monthrange(period.year, period.month)[1]
+
+
+class MetricsCube:
+    """
+    Materialized (User, Month, Category, Direction) cube with sums and counts
+
+    Per-month rollups are kept in dicts and refreshed only for months
+    touched by an update, so page metrics are plain lookups.
+    """
+
+    def __init__(self, df=None, user=DEFAULT_USER, base_currency=BASE_CURRENCY):
+        self.base_currency = base_currency
+        self.cells = build_cells(df, user, base_currency)
+        self.rollups = {}
+        self._refresh_rollups(self.cells.index.droplevel(['Category', 'Direction']).unique())
+
+    def update(self, new_df, user=DEFAULT_USER):
+        """
+        Fold newly imported transactions into the cube
+
+        Args:
+            new_df: DataFrame of new transactions only
+            user: User the transactions belong to
+        """
+        new_cells = build_cells(new_df, user, self.base_currency)
+        if new_cells.empty:
+            return
+        if self.cells.empty:
+            self.cells = new_cells
+        else:
+            self.cells = self.cells.add(new_cells, fill_value=0)
+            self.cells['Count'] = self.cells['Count'].astype('int64')
+        self._refresh_rollups(new_cells.index.droplevel(['Category', 'Direction']).unique())
+
+    def _refresh_rollups(self, user_months):
+        """Recompute rollups for the given (User, Month) pairs"""
+        if len(user_months) == 0:
+            return
+        touched = self.cells.index.droplevel(['Category', 'Direction']).isin(user_months)
+        cells = self.cells[touched].reset_index()
+
+        totals = cells.pivot_table(index=['User', 'Month'], columns='Direction',
+                                   values=['Sum', 'Count'], aggfunc='sum', fill_value=0)
+        debits = cells[cells['Direction'] == 'debit']
+        top = debits.loc[debits.groupby(['User', 'Month'])['Sum'].idxmax()].set_index(['User', 'Month'])
+
+        for key in totals.index:
+            row = totals.loc[key]
+            spend = float(row.get(('Sum', 'debit'), 0.0))
+            has_top = key in top.index
+            self.rollups[key] = {
+                'income': float(row.get(('Sum', 'credit'), 0.0)),
+                'spend': spend,
+                'debit_count': int(row.get(('Count', 'debit'), 0)),
+                'credit_count': int(row.get(('Count', 'credit'), 0)),
+                'top_category': top.at[key, 'Category'] if has_top else 'N/A',
+                'top_share': float(top.at[key, 'Sum'] / spend) if has_top and spend > 0 else 0.0
+            }
+
+    def months(self, user=DEFAULT_USER):
+        """
+        Months with data for a user, oldest first
+
+        Returns:
+            list: 'YYYY-MM' strings
+        """
+        return sorted(month for (u, month) in self.rollups if u == user)
+
+    def month_metrics(self, month, user=DEFAULT_USER, today=None):
+        """
+        Headline metrics for one month
+
+        Args:
+            month: 'YYYY-MM' string
+            user: User to report on
+            today: Reference date for partial current months
+
+        Returns:
+            dict: avg_daily_spend, top_category, top_share, savings_rate,
+                  income, spend (all zero/N/A when the month has no data)
+        """
+        today = pd.Timestamp(today or pd.Timestamp.now())
+        rollup = self.rollups.get((user, month))
+        if rollup is None:
+            return {'avg_daily_spend': 0.0, 'top_category': 'N/A', 'top_share': 0.0,
+                    'savings_rate': 0.0, 'income': 0.0, 'spend': 0.0}
+
+        income = rollup['income']
+        return {
+            'avg_daily_spend': rollup['spend'] / _days_in_month(month, today),
+            'top_category': rollup['top_category'],
+            'top_share': rollup['top_share'],
+            'savings_rate': (income - rollup['spend']) / income if income > 0 else 0.0,
+            'income': income,
+            'spend': rollup['spend']
+        }
+
+    def month_over_month(self, month, user=DEFAULT_USER, today=None):
+        """
+        Metrics for a month with deltas against the previous month
+
+        Returns:
+            dict: Same keys as month_metrics() plus a 'deltas' dict with the
+                  relative change in avg_daily_spend and top_share and the
+                  absolute change in savings_rate (None if no previous data)
+        """
+        current = self.month_metrics(month, user, today)
+        previous_month = (pd.Period(month, freq='M') - 1).strftime('%Y-%m')
+
+        deltas = {'avg_daily_spend': None, 'top_share': None, 'savings_rate': None}
+        if (user, previous_month) in self.rollups:
+            previous = self.month_metrics(previous_month, user, today)
+            for key in ('avg_daily_spend', 'top_share'):
+                if previous[key] > 0:
+                    deltas[key] = (current[key] - previous[key]) / previous[key]
+            deltas['savings_rate'] = current['savings_rate'] - previous['savings_rate']
+
+        current['deltas'] = deltas
+        return current
+
+    def category_breakdown(self, month, user=DEFAULT_USER, direction='debit'):
+        """
+        Totals per category for one month (drill-down)
+
+        Returns:
+            pd.Series: Sum indexed by Category, largest first
+        """
+        try:
+            cells = self.cells.xs((user, month, direction), level=['User', 'Month', 'Direction'])
+        except KeyError:
+            return pd.Series(dtype=float)
+        return cells['Sum'].sort_values(ascending=False)
+
+    def category_trend(self, category, user=DEFAULT_USER, direction='debit'):
+        """
+        Monthly totals of one category (drill-down)
+
+        Returns:
+            pd.Series: Sum indexed by Month, oldest first
+        """
+        try:
+            cells = self.cells.xs((user, category, direction), level=['User', 'Category', 'Direction'])
+        except KeyError:
+            return pd.Series(dtype=float)
+        return cells['Sum'].sort_index()
@@ -0,0 +1,312 @@
+import math
+import numpy as np
+import pandas as pd
+from currency import BASE_CURRENCY, convert_to_base
+from metrics import timed
+from processor import canonical_merchants
+
+# A debit is unusual when it is above the HIGH_QUANTILE of what its
+# merchant (or, for new merchants, its category) usually costs, at least
+# MIN_RATIO times the typical amount, and Z_THRESHOLD standard deviations
+# out on a log scale. Keys need MIN_OBSERVATIONS before they can alert.
+HIGH_QUANTILE = 0.99
+MIN_RATIO = 3.0
+Z_THRESHOLD = 3.0
+MIN_OBSERVATIONS = 8
+
+# A category spikes when a day's total is this far above its usual day
+SPIKE_Z = 3.0
+SPIKE_RATIO = 3.0
+# Days kept open for late rows before their totals join the statistics
+SPIKE_WINDOW_DAYS = 7
+
+# Relative accuracy of the quantile sketches (log-spaced bins)
+SKETCH_ACCURACY = 0.05
+# History this recent is replayed row by row on build so its alerts exist
+ALERT_DAYS = 30
+MAX_ALERTS = 200
+
+ALERT_KEYS = ['date', 'kind', 'merchant', 'category', 'amount', 'typical', 'score']
+
+_SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_SKETCH_GAMMA)
+
+
+class RunningStats:
+    """Streaming count, mean and variance (Welford)"""
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def std(self):
+        return math.sqrt(self.m2 / self.n) if self.n > 1 else 0.0
+
+    def z(self, x):
+        """Standard score of x (inf for a value above a constant series)"""
+        std = self.std()
+        if std > 0:
+            return (x - self.mean) / std
+        return math.inf if x > self.mean else 0.0
+
+
+def _bin(amount):
+    """Sketch bin of a positive amount (amounts below 1 share bin 0)"""
+    return max(0, math.ceil(math.log(amount) / _LOG_GAMMA)) if amount > 1 else 0
+
+
+class QuantileSketch:
+    """
+    Log-binned quantile sketch of positive amounts
+
+    Every quantile is within SKETCH_ACCURACY of the true value; size is
+    bounded by the log range of amounts (about 200 bins for 1 to 10^9),
+    so adding and querying are constant time in the number of rows.
+    """
+
+    __slots__ = ('bins', 'count')
+
+    def __init__(self, bins=None):
+        self.bins = bins or {}
+        self.count = sum(self.bins.values())
+
+    def add(self, amount):
+        key = _bin(amount)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        self.count += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return 2 * _SKETCH_GAMMA ** key / (_SKETCH_GAMMA + 1) if key else 1.0
+        return 2 * _SKETCH_GAMMA ** key / (_SKETCH_GAMMA + 1)
+
+
+class KeyStats:
+    """Log-amount moments plus a quantile sketch for one merchant or category"""
+
+    __slots__ = ('moments', 'sketch')
+
+    def __init__(self, moments=None, sketch=None):
+        self.moments = moments or RunningStats()
+        self.sketch = sketch or QuantileSketch()
+
+    def add(self, amount):
+        self.moments.add(math.log1p(amount))
+        self.sketch.add(amount)
+
+    def assess(self, amount):
+        """
+        How unusual an amount is for this key
+
+        Returns:
+            tuple: (score, typical) where score is the log-scale z-score if
+                   the amount breaks every threshold, else None
+        """
+        if self.moments.n < MIN_OBSERVATIONS:
+            return None, None
+        typical = self.sketch.quantile(0.5)
+        if amount < MIN_RATIO * typical or amount <= self.sketch.quantile(HIGH_QUANTILE):
+            return None, typical
+        score = self.moments.z(math.log1p(amount))
+        return (score if score >= Z_THRESHOLD else None), typical
+
+
+def to_debits(df, base_currency=BASE_CURRENCY):
+    """
+    Reduce transactions to the debits anomalies are scored on
+
+    Args:
+        df: Transaction DataFrame
+        base_currency: Currency amounts are reported in
+
+    Returns:
+        pd.DataFrame: Day (days since the epoch), Merchant, Category and
+                      positive Amount, sorted by Day
+    """
+    if df is None or df.empty:
+        return pd.DataFrame({'Day': pd.Series(dtype='int64'), 'Merchant': pd.Series(dtype=object),
+                             'Category': pd.Series(dtype=object), 'Amount': pd.Series(dtype=float)})
+
+    amounts = convert_to_base(df, base_currency)
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    debit = (amounts < 0) & dates.notna()
+    debits = pd.DataFrame({
+        'Day': (dates[debit] - pd.Timestamp('1970-01-01')).dt.days.astype('int64'),
+        'Merchant': canonical_merchants(df.loc[debit, 'Particulars']),
+        'Category': df.loc[debit, 'Category'].fillna('Other') if 'Category' in df.columns else 'Other',
+        'Amount': -amounts[debit]
+    })
+    return debits.sort_values('Day', kind='stable').reset_index(drop=True)
+
+
+def _key_stats(debits, column):
+    """KeyStats per value of column, built in grouped passes"""
+    logs = np.log1p(debits['Amount'])
+    moments = logs.groupby(debits[column]).agg(['size', 'mean', 'var'])
+    bins = np.maximum(0, np.ceil(np.log(debits['Amount'].clip(lower=1)) / _LOG_GAMMA)).astype('int64')
+    counts = bins.groupby([debits[column], bins]).size()
+
+    stats = {}
+    for key, row in moments.iterrows():
+        m2 = 0.0 if pd.isna(row['var']) else row['var'] * (row['size'] - 1)
+        stats[key] = KeyStats(RunningStats(int(row['size']), float(row['mean']), float(m2)))
+    for (key, bin_), count in counts.items():
+        sketch = stats[key].sketch
+        sketch.bins[int(bin_)] = int(count)
+        sketch.count += int(count)
+    return stats
+
+
+class AnomalyDetector:
+    """
+    Streaming detector of unusual debits and category spend spikes
+
+    Keeps running statistics per merchant, per category and of daily
+    category totals. New rows are scored against them in constant time,
+    then folded in, so history is never rescanned. Building from history
+    aggregates everything older than ALERT_DAYS in grouped passes and
+    replays the rest row by row to recover recent alerts.
+    """
+
+    def __init__(self, df=None, base_currency=BASE_CURRENCY, today=None):
+        self.base_currency = base_currency
+        self.alerts = []
+        today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        cutoff = (today - pd.Timestamp('1970-01-01')).days - ALERT_DAYS
+
+        debits = to_debits(df, base_currency)
+        history, recent = debits[debits['Day'] < cutoff], debits[debits['Day'] >= cutoff]
+        self.merchants = _key_stats(history[history['Merchant'] != ''], 'Merchant')
+        self.categories = _key_stats(history, 'Category')
+        daily = history.groupby(['Category', 'Day'])['Amount'].sum().reset_index()
+        self.daily = {key: stats.moments for key, stats in _key_stats(daily, 'Category').items()}
+        # Open (category -> {day: total}) days still accepting rows
+        self.open_days = {}
+        self.latest_day = int(history['Day'].max()) if not history.empty else None
+        self._observe(recent)
+
+    @timed('stage.anomalies')
+    def update(self, new_df):
+        """
+        Score newly added transactions, then fold them into the statistics
+
+        Args:
+            new_df: DataFrame of new transactions only
+
+        Returns:
+            list: Alerts raised by these rows (see ALERT_KEYS)
+        """
+        return self._observe(to_debits(new_df, self.base_currency))
+
+    def _observe(self, debits):
+        raised = []
+        for day, merchant, category, amount in zip(debits['Day'], debits['Merchant'], debits['Category'],
+                                                   debits['Amount']):
+            day, amount = int(day), float(amount)
+            alert = self.score(day, merchant, category, amount)
+            if alert:
+                raised.append(alert)
+            if merchant:
+                self.merchants.setdefault(merchant, KeyStats()).add(amount)
+            self.categories.setdefault(category, KeyStats()).add(amount)
+            spike = self._add_to_day(day, category, amount)
+            if spike:
+                raised.append(spike)
+
+        if raised:
+            self.alerts = (self.alerts + raised)[-MAX_ALERTS:]
+        return raised
+
+    def score(self, day, merchant, category, amount):
+        """
+        Alert for one debit if it is unusual, without updating statistics
+
+        The merchant's own history decides; merchants with too little
+        history are judged against their category.
+
+        Returns:
+            dict or None: Alert (see ALERT_KEYS)
+        """
+        stats = self.merchants.get(merchant) if merchant else None
+        if stats is None or stats.moments.n < MIN_OBSERVATIONS:
+            stats, kind = self.categories.get(category), 'category'
+        else:
+            kind = 'merchant'
+        if stats is None:
+            return None
+        score, typical = stats.assess(amount)
+        if score is None:
+            return None
+        return self._alert(day, kind, merchant, category, amount, typical, score)
+
+    def _add_to_day(self, day, category, amount):
+        """Add a debit to its category's day total; returns a spike alert when it first crosses"""
+        if self.latest_day is None or day > self.latest_day:
+            self.latest_day = day
+            self._close_days(day - SPIKE_WINDOW_DAYS)
+
+        days = self.open_days.setdefault(category, {})
+        if day <= self.latest_day - SPIKE_WINDOW_DAYS and day not in days:
+            # Too late to stay open: counts towards the statistics directly
+            self.daily.setdefault(category, RunningStats()).add(math.log1p(amount))
+            return None
+
+        before = days.get(day, 0.0)
+        days[day] = before + amount
+        stats = self.daily.get(category)
+        if stats is None or stats.n < MIN_OBSERVATIONS:
+            return None
+        typical = math.expm1(stats.mean)
+
+        def spiking(total):
+            return total >= SPIKE_RATIO * typical and stats.z(math.log1p(total)) >= SPIKE_Z
+
+        if spiking(days[day]) and not spiking(before):
+            return self._alert(day, 'category_spike', '', category, days[day], typical,
+                               stats.z(math.log1p(days[day])))
+        return None
+
+    def _close_days(self, before_day):
+        """Fold day totals older than before_day into the daily statistics"""
+        for category, days in self.open_days.items():
+            for day in [d for d in days if d <= before_day]:
+                self.daily.setdefault(category, RunningStats()).add(math.log1p(days.pop(day)))
+
+    @staticmethod
+    def _alert(day, kind, merchant, category, amount, typical, score):
+        return {'date': pd.Timestamp('1970-01-01') + pd.Timedelta(days=day), 'kind': kind, 'merchant': merchant,
+                'category': category, 'amount': round(amount, 2), 'typical': round(typical, 2),
+                'score': round(min(score, 99.0), 1)}
+
+    def recent_alerts(self, days=ALERT_DAYS, today=None):
+        """
+        Alerts for transactions dated in the last few days
+
+        Args:
+            days: Look-back window
+            today: Reference date (defaults to today)
+
+        Returns:
+            list: Alerts, most recent first (a transaction flagged again by
+                  a later import appears once)
+        """
+        today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        start = today - pd.Timedelta(days=days)
+        unique = {}
+        for alert in self.alerts:
+            if start <= alert['date'] <= today:
+                unique[(alert['date'], alert['kind'], alert['merchant'], alert['category'], alert['amount'])] = alert
+        return sorted(unique.values(), key=lambda a: (a['date'], a['score']), reverse=True)
@@ -1,11 +1,32 @@
 import streamlit as st
-import pandas as pd
 import json
 import os
+import hmac
+import hashlib
 from datetime import datetime, timedelta
-import plotly.graph_objects as go
-from processor import process_data, categorize_transaction, get_financial_summary
 from auth_utils import validate_password, validate_email
+from lazy_imports import lazy_module
+from caching import cache_stats
+from metrics import registry as metrics_registry, timed
+from workspaces import workspaces, sessions, start_maintenance
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Heavy modules are imported on first use, so the login page renders
+# without pandas, plotly or the data/AI stack (see lazy_imports)
+pd = lazy_module('pandas')
+go = lazy_module('plotly.graph_objects')
+currency = lazy_module('currency')
+state = lazy_module('state')
+import_worker = lazy_module('import_worker')
+budgets = lazy_module('budgets')
+goals = lazy_module('goals')
+analytics = lazy_module('analytics')
+recurring = lazy_module('recurring')
+classifier = lazy_module('classifier')
+forecast = lazy_module('forecast')
+anomalies = lazy_module('anomalies')
+profiling = lazy_module('profiling')
+reports = lazy_module('reports')
 
 # --- PAGE CONFIG ---
 st.set_page_config(
@@ -27,19 +48,157 @@ def load_categories():
 # --- SESSION STATE INIT ---
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
-if 'transactions' not in st.session_state:
-    st.session_state.transactions = pd.DataFrame()
 if 'theme' not in st.session_state:
     st.session_state.theme = 'dark'
 if 'user_name' not in st.session_state:
     st.session_state.user_name = 'Andrew'
-if 'goals' not in st.session_state:
-    st.session_state.goals = []
 if 'categories' not in st.session_state:
     st.session_state.categories = load_categories()
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 'Dashboard'
 
+# Data-backed state is loaded after sign-in
+USER_STATE_KEYS = ['goals', 'base_currency', 'budgets', 'import_jobs']
+
+def init_user_state():
+    start_maintenance()
+    import_worker.start_embedded(api_key=get_api_key)
+    if 'goals' not in st.session_state:
+        st.session_state.goals = state.user_store().load_goals(user_email())
+    if 'base_currency' not in st.session_state:
+        st.session_state.base_currency = currency.BASE_CURRENCY
+    if 'budgets' not in st.session_state:
+        st.session_state.budgets = state.user_store().load_budgets(user_email())
+
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'local'
+
+def clear_user_state():
+    for key in USER_STATE_KEYS + ['user_email', 'admin_digest']:
+        st.session_state.pop(key, None)
+
+# --- TRANSACTION STORE ---
+# Transactions and derived trackers live in the signed-in user's workspace
+# (shared by their sessions, evicted when idle), not in session_state. The
+# store itself is shared with other replicas and import workers (see state)
+def current_user():
+    return st.session_state.get('user_email') or analytics.DEFAULT_USER
+
+def user_email():
+    return st.session_state.get('user_email')
+
+def get_transactions():
+    return workspaces.get(current_user(), 'transactions',
+                          lambda: state.transaction_store().load(user_email()))
+
+def get_budget_tracker():
+    base_currency = st.session_state.base_currency
+    return workspaces.get(current_user(), ('budget_tracker', base_currency),
+                          lambda: budgets.BudgetTracker(get_transactions(), base_currency))
+
+def get_goal_tracker():
+    base_currency = st.session_state.base_currency
+    return workspaces.get(current_user(), ('goal_tracker', base_currency),
+                          lambda: goals.GoalTracker(st.session_state.goals, get_transactions(), base_currency))
+
+def get_metrics_cube():
+    base_currency = st.session_state.base_currency
+    return workspaces.get(current_user(), ('metrics_cube', base_currency),
+                          lambda: analytics.MetricsCube(get_transactions(), current_user(), base_currency))
+
+def get_recurring_detector():
+    base_currency = st.session_state.base_currency
+    return workspaces.get(current_user(), ('recurring_detector', base_currency),
+                          lambda: recurring.RecurringDetector(get_transactions(), base_currency))
+
+def get_anomaly_detector():
+    base_currency = st.session_state.base_currency
+    return workspaces.get(current_user(), ('anomaly_detector', base_currency),
+                          lambda: anomalies.AnomalyDetector(get_transactions(), base_currency))
+
+def get_cash_flow_model():
+    base_currency = st.session_state.base_currency
+    return workspaces.get(current_user(), ('cash_flow', base_currency),
+                          lambda: forecast.CashFlowModel(get_transactions(), base_currency))
+
+# Forecasts are kept per horizon and recomputed when the store's data
+# version or the date changes
+def get_forecast(horizon):
+    stamp = (state.transaction_store().version(user_email()), datetime.now().date())
+    return forecast.forecast_cache.get_or_load(
+        (st.session_state.base_currency, horizon),
+        lambda: get_cash_flow_model().forecast(get_recurring_detector().patterns, horizon),
+        namespace=current_user(), version=stamp)
+
+# Operator features (Performance page, cache stats, ?profile=) unlock for
+# a session that enters ADMIN_TOKEN (secrets or environment) in Settings.
+# Sign-in doesn't verify passwords, so the typed email must not grant them.
+def admin_token():
+    try:
+        token = st.secrets.get('ADMIN_TOKEN')
+    except Exception:
+        token = None
+    return token or os.environ.get('ADMIN_TOKEN', '')
+
+def _token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def unlock_admin(token):
+    expected = admin_token()
+    if not expected or not hmac.compare_digest(_token_digest(token), _token_digest(expected)):
+        return False
+    st.session_state.admin_digest = _token_digest(expected)
+    return True
+
+# Sessions unlocked with a token that has since been changed lose access
+def is_admin():
+    expected = admin_token()
+    return bool(expected) and st.session_state.get('admin_digest') == _token_digest(expected)
+
+def get_api_key():
+    try:
+        api_key = st.secrets.get('GEMINI_API_KEY')
+    except Exception:
+        api_key = None
+    return api_key or os.environ.get('GEMINI_API_KEY')
+
+# Persist new rows and fold them into the running aggregates
+def record_transactions(new_df):
+    new_df = state.transaction_store().append(user_email(), new_df)
+    sync_transactions()
+    return new_df
+
+# Fold in rows added to the store since this process last read it, by
+# this session or by other replicas and import workers
+def sync_transactions():
+    apply_transactions(state.transaction_store().sync(user_email()))
+
+# Fold rows that are already persisted into whatever the workspace holds;
+# evicted items are rebuilt from the store on next access, so skip them
+@timed('stage.apply')
+def apply_transactions(new_df):
+    if new_df.empty:
+        return new_df
+    user = current_user()
+    transactions = workspaces.get(user, 'transactions')
+    if transactions is not None:
+        workspaces.put(user, 'transactions', pd.concat([transactions, new_df], ignore_index=True))
+    for tracker in workspaces.cached(user, 'budget_tracker'):
+        tracker.update(new_df)
+    for tracker in workspaces.cached(user, 'goal_tracker'):
+        tracker.update(st.session_state.goals, new_df)
+    for cube in workspaces.cached(user, 'metrics_cube'):
+        cube.update(new_df, user)
+    for detector in workspaces.cached(user, 'recurring_detector'):
+        detector.update(new_df)
+    for model in workspaces.cached(user, 'cash_flow'):
+        model.update(new_df)
+    for detector in workspaces.cached(user, 'anomaly_detector'):
+        detector.update(new_df)
+    workspaces.remeasure(user)
+    return new_df
+
 # --- PREMIUM DARK THEME STYLING ---
 def apply_theme():
     theme = st.session_state.theme
@@ -591,6 +750,8 @@ def render_sidebar():
             "Goals": "🎯",
             "Settings": "⚙️"
         }
+        if is_admin():
+            pages["Performance"] = "🩺"
         
         st.markdown("### Menu")
         
@@ -603,6 +764,7 @@ def render_sidebar():
         
         if st.button("Sign Out", use_container_width=True):
             st.session_state.logged_in = False
+            clear_user_state()
             st.rerun()
 
 # --- DASHBOARD PAGE ---
@@ -611,6 +773,25 @@ def dashboard_page():
     st.markdown("Financial overview and insights")
     st.markdown("<br>", unsafe_allow_html=True)
     
+    # Budget Alerts
+    for alert in get_budget_tracker().alerts(st.session_state.budgets):
+        message = f"{alert['category']}: {alert['spent']:,.0f} of {alert['budget']:,.0f} {st.session_state.base_currency} spent this month"
+        if alert['level'] == 'exceeded':
+            st.error(f"Budget exceeded · {message}")
+        else:
+            st.warning(f"Approaching budget · {message}")
+    
+    # Unusual spend flagged as rows were imported
+    for alert in get_anomaly_detector().recent_alerts()[:5]:
+        amount = f"{alert['amount']:,.0f} {st.session_state.base_currency}"
+        when = alert['date'].strftime('%d %b')
+        if alert['kind'] == 'category_spike':
+            st.warning(f"Spending spike · {alert['category']}: {amount} on {when}, "
+                       f"a typical day is {alert['typical']:,.0f}")
+        else:
+            st.warning(f"Unusual spend · {alert['merchant'] or alert['category']}: {amount} on {when}, "
+                       f"usually around {alert['typical']:,.0f}")
+    
     # Metrics Row
     col1, col2, col3, col4 = st.columns(4, gap="medium")
     
@@ -633,17 +814,46 @@ def dashboard_page():
     
     with col1:
         st.markdown("### Cash Flow")
-        dates = pd.date_range(start='2024-12-01', end='2024-12-27', freq='D')
-        balance = [50000 + i * 340 + (i % 5) * 800 for i in range(len(dates))]
+        horizon = st.radio("Forecast", forecast.HORIZONS, horizontal=True, key='forecast_horizon',
+                           format_func=lambda days: f"{days} days", label_visibility='collapsed')
+        cash_flow = get_forecast(horizon)
+        recorded = cash_flow[~cash_flow['Projected']]
+        # The projection starts from the last recorded balance
+        projected = cash_flow[cash_flow['Projected'] | (cash_flow['Date'] == recorded['Date'].max())]
         
         fig = go.Figure()
         fig.add_trace(go.Scatter(
-            x=dates, 
-            y=balance,
+            x=projected['Date'],
+            y=projected['Upper'],
             mode='lines',
-            fill='tozeroy',
+            line=dict(width=0),
+            hoverinfo='skip',
+            showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            x=projected['Date'],
+            y=projected['Lower'],
+            mode='lines',
+            line=dict(width=0),
+            fill='tonexty',
+            fillcolor='rgba(59, 130, 246, 0.08)',
+            hoverinfo='skip',
+            showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            x=recorded['Date'],
+            y=recorded['Balance'],
+            mode='lines',
+            name='Balance',
             line=dict(color='#3b82f6', width=3),
-            fillcolor='rgba(59, 130, 246, 0.05)',
+            hovertemplate='%{y:,.0f}<extra></extra>'
+        ))
+        fig.add_trace(go.Scatter(
+            x=projected['Date'],
+            y=projected['Balance'],
+            mode='lines',
+            name='Forecast',
+            line=dict(color='#3b82f6', width=2, dash='dot'),
             hovertemplate='%{y:,.0f}<extra></extra>'
         ))
         fig.update_layout(
@@ -664,6 +874,7 @@ def dashboard_page():
             ),
             margin=dict(l=0, r=0, t=0, b=0),
             height=320,
+            showlegend=False,
             hovermode='x unified'
         )
         st.plotly_chart(fig, use_container_width=True)
@@ -710,6 +921,20 @@ def dashboard_page():
         "Amount": ["₹1,68,256", "-₹1,450", "-₹3,280", "-₹420", "-₹799"]
     })
     st.dataframe(recent_df, use_container_width=True, hide_index=True, height=250)
+    
+    # Upcoming recurring debits
+    upcoming = get_recurring_detector().upcoming(days=30)
+    if not upcoming.empty:
+        st.markdown("<br><br>", unsafe_allow_html=True)
+        st.markdown("### Upcoming Payments")
+        upcoming_df = pd.DataFrame({
+            "Due": upcoming['Next_Date'].dt.strftime('%d %b'),
+            "Merchant": upcoming['Merchant'],
+            "Category": upcoming['Category'],
+            "Frequency": upcoming['Period'],
+            "Amount": upcoming['Amount'].map(lambda a: f"{a:,.0f} {st.session_state.base_currency}")
+        })
+        st.dataframe(upcoming_df, use_container_width=True, hide_index=True)
 
 # --- TRANSACTIONS PAGE ---
 def transactions_page():
@@ -730,7 +955,7 @@ def transactions_page():
             amount = st.number_input("Amount", min_value=0.0, step=0.01, format="%.2f")
         
         with col2:
-            currency = st.selectbox("Currency", ["INR (₹)", "USD ($)", "EUR (€)", "AED (د.إ)"])
+            currency_label = st.selectbox("Currency", ["INR (₹)", "USD ($)", "EUR (€)", "AED (د.إ)"])
             
             categories = st.session_state.categories
             category_names = [cat['name'] for cat in categories]
@@ -744,20 +969,70 @@ def transactions_page():
         with col1:
             if st.button("Add Transaction", use_container_width=True):
                 if description and amount > 0:
+                    new_row = pd.DataFrame([{
+                        'Date': pd.Timestamp(expense_date),
+                        'Particulars': description,
+                        'Category': category,
+                        'Amount': -amount if transaction_type == "Debit" else amount,
+                        'Currency': currency.parse_currency_code(currency_label),
+                        'Transaction_ID': None
+                    }])
+                    record_transactions(new_row)
+                    classifier.confirm_categories(user_email(), [description], [category])
                     st.success("Transaction added successfully")
     
     with tab2:
         st.markdown("<br>", unsafe_allow_html=True)
         
-        uploaded_file = st.file_uploader(
-            "Upload bank statement or payment screenshot",
+        uploaded_files = st.file_uploader(
+            "Upload bank statements or payment screenshots",
             type=['pdf', 'csv', 'jpg', 'jpeg', 'png'],
+            accept_multiple_files=True,
             label_visibility="collapsed"
         )
         
-        if uploaded_file:
-            st.success("File uploaded successfully")
-            st.info("Analyzing file with AI...")
+        if uploaded_files:
+            st.success(f"{len(uploaded_files)} file(s) uploaded successfully")
+            
+            if st.button("Analyze with AI", use_container_width=True):
+                # Parsing, dedup and storing run on the import workers
+                job_id = import_worker.submit_import(user_email(), uploaded_files)
+                st.session_state.import_jobs = st.session_state.get('import_jobs', []) + [job_id]
+                with st.spinner("Analyzing files..."):
+                    state.job_queue().wait(job_id, IMPORT_WAIT_SECONDS)
+        
+        import_results()
+
+# Imports run on the workers; the page waits this long for one, then shows
+# its outcome on a later run of the session once it finishes
+IMPORT_WAIT_SECONDS = 120
+
+def import_results():
+    running = []
+    for job_id in st.session_state.get('import_jobs', []):
+        job = state.job_queue().status(job_id)
+        if job is None:
+            continue
+        if job['status'] in ('queued', 'running'):
+            running.append(job_id)
+            continue
+        if job['status'] == 'failed':
+            st.error(f"Import failed: {job['error']}")
+            continue
+        sync_transactions()
+        for entry in job['result']:
+            if entry['status'] != 'ok':
+                st.error(f"{entry['file']}: {entry['error']}")
+            elif entry['streamed']:
+                st.info(f"{entry['file']}: {entry['written']} new transaction(s) imported, "
+                        f"{entry['duplicates']} duplicate(s) and {entry['invalid']} invalid row(s) skipped")
+            else:
+                st.info(f"{entry['file']}: {entry['written']} new transaction(s) imported")
+    st.session_state.import_jobs = running
+    if running:
+        st.info(f"{len(running)} import(s) still running; new transactions appear when they finish")
+        if st.button("Check imports"):
+            st.rerun()
 
 # --- CATEGORIES PAGE ---
 def categories_page():
@@ -798,6 +1073,9 @@ def categories_page():
     # Display and Edit Categories
     st.markdown("### Your Categories")
     
+    category_budgets = st.session_state.budgets
+    budget_status = get_budget_tracker().month_status(category_budgets)
+    
     for i, cat in enumerate(st.session_state.categories):
         with st.expander(f"{cat.get('icon', '📦')} {cat['name']}", expanded=False):
             col1, col2 = st.columns(2, gap="large")
@@ -814,7 +1092,13 @@ def categories_page():
             
             st.markdown("<br>", unsafe_allow_html=True)
             
-            budget = st.number_input("Monthly Budget", min_value=0, step=1000, key=f"budget_{i}")
+            budget = st.number_input("Monthly Budget", min_value=0, step=1000,
+                                     value=int(category_budgets.get(cat['name'], 0)), key=f"budget_{i}")
+            
+            status = budget_status.get(cat['name'])
+            if status:
+                st.progress(min(status['used'], 1.0))
+                st.caption(f"{status['spent']:,.0f} of {status['budget']:,.0f} {st.session_state.base_currency} spent this month ({status['used'] * 100:.1f}%)")
             
             st.markdown("<br>", unsafe_allow_html=True)
             
@@ -823,6 +1107,10 @@ def categories_page():
                 st.session_state.categories[i]['icon'] = edit_icon
                 st.session_state.categories[i]['type'] = edit_type.lower()
                 st.session_state.categories[i]['color'] = edit_color
+                category_budgets.pop(cat['name'], None)
+                if budget > 0:
+                    category_budgets[edit_name] = float(budget)
+                state.user_store().save_budgets(user_email(), category_budgets)
                 st.success(f"Category '{edit_name}' updated successfully")
                 st.rerun()
 
@@ -840,23 +1128,38 @@ def goals_page():
         with col1:
             target_amount = st.number_input("Target Amount (₹)", min_value=0, step=1000)
             duration_type = st.selectbox("Duration", ["Monthly", "Yearly", "Custom"])
+            rule_type = st.selectbox("Track Progress From", list(goals.RULE_TYPES.keys()),
+                                     format_func=lambda key: goals.RULE_TYPES[key])
         
         with col2:
-            current_amount = st.number_input("Current Amount (₹)", min_value=0, step=1000)
+            current_amount = st.number_input("Starting Amount (₹)", min_value=0, step=1000)
+            target_date = None
             if duration_type == "Custom":
                 target_date = st.date_input("Target Date")
+            rule_value = None
+            if rule_type == 'category':
+                rule_value = st.selectbox("Category", [cat['name'] for cat in st.session_state.categories])
+            elif rule_type == 'keyword':
+                rule_value = st.text_input("Keyword", placeholder="e.g., SIP, PPF")
+            elif rule_type == 'account':
+                rule_value = st.text_input("Savings Account", placeholder="Account name or last digits")
         
         st.markdown("<br>", unsafe_allow_html=True)
         
         if st.button("Create Goal", use_container_width=True):
             if goal_name and target_amount > 0:
                 goal = {
+                    'id': max([g.get('id', 0) for g in st.session_state.goals], default=0) + 1,
                     'name': goal_name,
                     'target': target_amount,
-                    'current': current_amount,
-                    'duration': duration_type
+                    'start_amount': current_amount,
+                    'duration': duration_type,
+                    'target_date': str(target_date) if target_date else None,
+                    'rule': {'type': rule_type, 'value': rule_value}
                 }
                 st.session_state.goals.append(goal)
+                state.user_store().save_goals(user_email(), st.session_state.goals)
+                get_goal_tracker().track(goal, get_transactions())
                 st.success(f"Goal '{goal_name}' created successfully")
                 st.rerun()
     
@@ -865,17 +1168,25 @@ def goals_page():
     # Display Goals
     if st.session_state.goals:
         st.markdown("### Active Goals")
+        tracker = get_goal_tracker()
         for i, goal in enumerate(st.session_state.goals):
-            progress = (goal['current'] / goal['target']) * 100 if goal['target'] > 0 else 0
+            status = tracker.progress(goal)
+            progress = status['pct']
             
             col1, col2 = st.columns([3, 1])
             with col1:
                 st.markdown(f"**{goal['name']}** · {goal['duration']}")
-                st.progress(min(progress / 100, 1.0))
-                st.caption(f"₹{goal['current']:,} of ₹{goal['target']:,} ({progress:.1f}%)")
+                st.progress(max(min(progress / 100, 1.0), 0.0))
+                st.caption(f"₹{status['current']:,.0f} of ₹{status['target']:,.0f} ({progress:.1f}%)")
+                if progress >= 100:
+                    st.caption("Goal reached 🎉")
+                elif status['projected_date'] is not None:
+                    st.caption(f"Projected completion: {status['projected_date']:%d %b %Y} at ₹{status['velocity'] * 30:,.0f}/month")
             with col2:
                 if st.button("Remove", key=f"del_{i}"):
-                    st.session_state.goals.pop(i)
+                    removed = st.session_state.goals.pop(i)
+                    state.user_store().save_goals(user_email(), st.session_state.goals)
+                    tracker.untrack(removed.get('id'))
                     st.rerun()
             
             st.markdown("<br>", unsafe_allow_html=True)
@@ -888,16 +1199,141 @@ def analytics_page():
     st.markdown("Detailed financial insights")
     st.markdown("<br>", unsafe_allow_html=True)
     
+    cube = get_metrics_cube()
+    user = current_user()
+    months = cube.months(user)
+    
+    if not months:
+        st.info("No transactions yet. Add or upload transactions to see analytics.")
+        return
+    
+    month = st.selectbox("Month", months[::-1], format_func=lambda m: pd.Period(m, freq='M').strftime('%B %Y'))
+    metrics = cube.month_over_month(month, user)
+    deltas = metrics['deltas']
+    base_currency = st.session_state.base_currency
+    
+    st.markdown("<br>", unsafe_allow_html=True)
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Avg. Daily Spend", "₹3,628", "-8.2%")
+        delta = f"{deltas['avg_daily_spend'] * 100:+.1f}%" if deltas['avg_daily_spend'] is not None else None
+        st.metric("Avg. Daily Spend", f"{metrics['avg_daily_spend']:,.0f} {base_currency}", delta, delta_color="inverse")
     
     with col2:
-        st.metric("Top Category", "Rent", "73.2%")
+        st.metric("Top Category", metrics['top_category'], f"{metrics['top_share'] * 100:.1f}% of spend", delta_color="off")
     
     with col3:
-        st.metric("Savings Rate", "35.2%", "+2.1%")
+        delta = f"{deltas['savings_rate'] * 100:+.1f}%" if deltas['savings_rate'] is not None else None
+        st.metric("Savings Rate", f"{metrics['savings_rate'] * 100:.1f}%", delta)
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    # Drill-down charts (read from the cube, not the ledger)
+    col1, col2 = st.columns([1, 1.5], gap="large")
+    
+    with col1:
+        st.markdown("### Spend by Category")
+        breakdown = cube.category_breakdown(month, user)
+        fig = go.Figure(go.Bar(
+            x=breakdown.values,
+            y=breakdown.index,
+            orientation='h',
+            marker=dict(color='#3b82f6'),
+            hovertemplate='<b>%{y}</b><br>%{x:,.0f}<extra></extra>'
+        ))
+        fig.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            xaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.05)', zeroline=False, color='#707070'),
+            yaxis=dict(showgrid=False, autorange='reversed', color='#707070'),
+            margin=dict(l=0, r=0, t=0, b=0),
+            height=320
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        st.markdown("### Category Trend")
+        if breakdown.empty:
+            st.caption("No spending recorded this month.")
+        else:
+            category = st.selectbox("Category", list(breakdown.index), label_visibility="collapsed")
+            trend = cube.category_trend(category, user)
+            fig = go.Figure(go.Scatter(
+                x=[pd.Period(m, freq='M').to_timestamp() for m in trend.index],
+                y=trend.values,
+                mode='lines+markers',
+                line=dict(color='#10b981', width=3),
+                hovertemplate='%{x|%b %Y}<br>%{y:,.0f}<extra></extra>'
+            ))
+            fig.update_layout(
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                xaxis=dict(showgrid=False, showline=False, zeroline=False, color='#707070'),
+                yaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.05)', zeroline=False, color='#707070'),
+                margin=dict(l=0, r=0, t=0, b=0),
+                height=320
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    export_report_section(months)
+
+def export_report_section(months):
+    st.markdown("### Export Report")
+    st.caption("Download a statement of your transactions; long ranges are prepared in the background")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        period = st.selectbox("Period", ["Month", "Year", "Custom range"], key='report_period')
+    with col2:
+        if period == "Month":
+            month = st.selectbox("Report month", months[::-1], key='report_month',
+                                 format_func=lambda m: pd.Period(m, freq='M').strftime('%B %Y'))
+            start = pd.Period(month, freq='M').start_time.date()
+            end = pd.Period(month, freq='M').end_time.date()
+        elif period == "Year":
+            years = sorted({m[:4] for m in months}, reverse=True)
+            year = st.selectbox("Report year", years, key='report_year')
+            start, end = datetime(int(year), 1, 1).date(), datetime(int(year), 12, 31).date()
+        else:
+            first = pd.Period(months[0], freq='M').start_time.date()
+            last = pd.Period(months[-1], freq='M').end_time.date()
+            start = st.date_input("From", first, key='report_start')
+            end = st.date_input("To", last, key='report_end')
+    with col3:
+        fmt = st.selectbox("Format", list(reports.FORMATS), format_func=str.upper, key='report_format')
+
+    if st.button("Generate Report"):
+        if start > end:
+            st.warning("The start date must be before the end date")
+            return
+        status, result = reports.request_report(current_user(), start, end, fmt, st.session_state.base_currency,
+                                                state.transaction_store().path(user_email()))
+        st.session_state.report_job = result if status == 'running' else None
+        st.session_state.report_file = (result, fmt) if status == 'done' else None
+
+    job_id = st.session_state.get('report_job')
+    if job_id:
+        status, result = reports.report_jobs.status(job_id)
+        if status == 'running':
+            st.info("Your report is being prepared in the background")
+            if st.button("Check status"):
+                st.rerun()
+            return
+        st.session_state.report_job = None
+        if status == 'error':
+            st.session_state.report_file = None
+            st.warning(f"Report failed: {result}")
+            return
+        st.session_state.report_file = (result, job_id.rsplit('.', 1)[-1])
+
+    report_file = st.session_state.get('report_file')
+    if report_file and os.path.exists(report_file[0]):
+        path, fmt = report_file
+        with open(path, 'rb') as f:
+            st.download_button(f"Download {fmt.upper()}", f.read(), file_name=f"pennywyse_statement.{fmt}",
+                               mime=reports.FORMATS[fmt])
 
 # --- SETTINGS PAGE ---
 def settings_page():
@@ -915,6 +1351,44 @@ def settings_page():
     
     st.markdown("<br><br>", unsafe_allow_html=True)
     
+    st.markdown("### Currency")
+    
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        base_currency = st.selectbox(
+            "Base Currency",
+            currency.SUPPORTED_CURRENCIES,
+            index=currency.SUPPORTED_CURRENCIES.index(st.session_state.base_currency)
+        )
+        if base_currency != st.session_state.base_currency:
+            st.session_state.base_currency = base_currency
+            st.rerun()
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    st.markdown("### Smart Categorization")
+    st.caption("Train your category model from the categories you picked for manual entries")
+    
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        if st.button("Retrain Model", use_container_width=True):
+            examples = classifier.train_classifier(user_email(), st.session_state.categories)
+            if examples:
+                st.success(f"Model trained on {examples:,} examples")
+            else:
+                st.warning("Not enough confirmed categories to train yet")
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    st.markdown("### Memory")
+    usage = sessions.stats().get(session_id())
+    if usage:
+        st.caption(f"This session: {usage['state_bytes'] / 1024:,.0f} KB of session state · "
+                   f"your workspace: {usage['workspace_bytes'] / 1024 ** 2:,.1f} MB in memory, "
+                   f"{usage['spilled_bytes'] / 1024 ** 2:,.1f} MB spilled to disk")
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
     st.markdown("### Profile")
     new_name = st.text_input("Display Name", value=st.session_state.user_name)
     
@@ -922,26 +1396,187 @@ def settings_page():
         st.session_state.user_name = new_name
         st.success("Profile updated successfully")
         st.rerun()
+    
+    if admin_token() and not is_admin():
+        st.markdown("<br><br>", unsafe_allow_html=True)
+        st.markdown("### Operator Access")
+        token = st.text_input("Admin Token", type="password")
+        if st.button("Unlock", use_container_width=True):
+            if unlock_admin(token):
+                st.rerun()
+            else:
+                st.error("Invalid admin token")
+
+# --- PERFORMANCE PAGE (admins only) ---
+def _ms(seconds):
+    return '–' if seconds is None or pd.isna(seconds) else f"{seconds * 1000:,.1f} ms"
+
+def _latency_table(histograms, label):
+    return pd.DataFrame({
+        label: [h['name'] for h in histograms],
+        "Count": [h['count'] for h in histograms],
+        "p50": [_ms(h['p50']) for h in histograms],
+        "p95": [_ms(h['p95']) for h in histograms],
+        "p99": [_ms(h['p99']) for h in histograms],
+        "Max": [_ms(h['max']) for h in histograms],
+        "Total": [f"{h['total']:,.1f} s" for h in histograms]
+    })
+
+def performance_page():
+    st.markdown("# Performance")
+    st.markdown("Live metrics of this server process")
+    
+    if st.button("Refresh"):
+        st.rerun()
+    
+    st.markdown("<br>", unsafe_allow_html=True)
+    
+    session_stats = sessions.stats()
+    snapshot = metrics_registry.snapshot()
+    gauges = snapshot['gauges']
+    
+    col1, col2, col3, col4 = st.columns(4, gap="medium")
+    with col1:
+        st.metric("Active Sessions", len(session_stats))
+    with col2:
+        st.metric("Workspace Memory", f"{workspaces.nbytes() / 1024 ** 2:,.1f} MB",
+                  f"{len(workspaces.workspaces)} user(s)", delta_color="off")
+    with col3:
+        st.metric("Imports Running", gauges.get('imports.active') or 0,
+                  f"{gauges.get('jobs.pending') or 0} import(s), {gauges.get('reports.pending') or 0} report(s) queued",
+                  delta_color="off")
+    with col4:
+        st.metric("AI Requests Queued", gauges.get('ai.queued') or 0,
+                  f"{gauges.get('ai.in_flight') or 0} in flight", delta_color="off")
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    st.markdown("### Sessions")
+    if session_stats:
+        sessions_df = pd.DataFrame({
+            "Session": [sid[:8] for sid in session_stats],
+            "User": [info['user'] or '–' for info in session_stats.values()],
+            "Session State": [f"{info['state_bytes'] / 1024:,.0f} KB" for info in session_stats.values()],
+            "Workspace": [f"{info['workspace_bytes'] / 1024 ** 2:,.1f} MB" for info in session_stats.values()],
+            "Spilled": [f"{info['spilled_bytes'] / 1024 ** 2:,.1f} MB" for info in session_stats.values()],
+            "Idle": [f"{info['idle_seconds']:,.0f} s" for info in session_stats.values()]
+        })
+        st.dataframe(sessions_df, use_container_width=True, hide_index=True)
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    st.markdown("### AI Calls")
+    ai = [h for h in snapshot['histograms'] if h['name'].startswith('ai.')]
+    if ai:
+        st.dataframe(_latency_table(ai, "Metric"), use_container_width=True, hide_index=True)
+    else:
+        st.caption("No AI calls yet")
+    errors = {name[len('ai.errors.'):]: value for name, value in snapshot['counters'].items()
+              if name.startswith('ai.errors.')}
+    if errors or snapshot['counters'].get('ai.retries'):
+        st.caption(f"Retries: {snapshot['counters'].get('ai.retries', 0)} · Errors: " +
+                   (', '.join(f"{name} {count}" for name, count in errors.items()) or 'none'))
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    st.markdown("### Slowest Stages")
+    st.caption("Pipeline stages and page renders, slowest 95th percentile first")
+    stages = [h for h in snapshot['histograms'] if h['name'].startswith(('stage.', 'page.')) and h['count']]
+    if stages:
+        stages.sort(key=lambda h: h['p95'], reverse=True)
+        st.dataframe(_latency_table(stages, "Stage"), use_container_width=True, hide_index=True)
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    st.markdown("### Profiling")
+    st.caption("Profile one page load of your session, or add ?profile=1 (or ?profile=cprofile) to any URL. "
+               "Sampled profiles are collapsed stacks for flamegraph.pl or speedscope; cProfile output opens in snakeviz.")
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        mode = st.selectbox("Profiler", list(profiling.MODES), format_func=lambda m: {
+            'sample': "Sampling (flame graph)", 'cprofile': "cProfile"}[m])
+        if st.button("Profile Next Page Load", use_container_width=True):
+            st.session_state.profile_next_run = mode
+            st.info("Open the page to profile; its next load will be recorded")
+    profiles = profiling.list_profiles()
+    if profiles:
+        profiles_df = pd.DataFrame({
+            "Session": [p['session'][:8] for p in profiles],
+            "Page": [p['page'] for p in profiles],
+            "Profiler": [p['mode'] for p in profiles],
+            "Recorded": [datetime.fromtimestamp(p['created']).strftime('%d %b %H:%M:%S') for p in profiles],
+            "Size": [f"{p['bytes'] / 1024:,.0f} KB" for p in profiles]
+        })
+        st.dataframe(profiles_df, use_container_width=True, hide_index=True, height=220)
+        latest = profiles[0]
+        with open(latest['path'], 'rb') as f:
+            st.download_button(f"Download latest ({latest['page']}, {latest['mode']})", f.read(),
+                               file_name=os.path.basename(latest['path']))
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    st.markdown("### Caches")
+    stats = pd.DataFrame(cache_stats())
+    stats_df = pd.DataFrame({
+        "Cache": stats['name'],
+        "Items": stats['items'].map(lambda n: '–' if pd.isna(n) else f"{n:,.0f}"),
+        "Size": [('–' if pd.isna(b) else f"{b / 1024 ** 2:,.1f} MB") +
+                 ('' if pd.isna(m) else f" / {m / 1024 ** 2:,.0f} MB")
+                 for b, m in zip(stats['bytes'], stats['max_bytes'])],
+        "Hits": stats['hits'],
+        "Misses": stats['misses'],
+        "Hit Rate": stats['hit_rate'].map(lambda r: '–' if pd.isna(r) else f"{r:.0%}"),
+        "Evictions": stats['evictions'],
+        "Expired": stats['expirations'],
+        "Invalidated": stats['invalidations']
+    })
+    st.dataframe(stats_df, use_container_width=True, hide_index=True)
 
 # --- MAIN APP ---
+# Profiling is opt-in per script run: ?profile=1 (sampled stacks) or
+# ?profile=cprofile for unlocked operators (or anyone when PROFILING_ENABLED is set),
+# or the Performance page toggle, which profiles the session's next run
+def profile_mode():
+    mode = st.session_state.pop('profile_next_run', None)
+    if mode:
+        return mode
+    requested = st.query_params.get('profile')
+    if not requested or not (os.environ.get('PROFILING_ENABLED') or is_admin()):
+        return None
+    return 'cprofile' if requested == 'cprofile' else 'sample'
+
 def main_app():
+    mode = profile_mode()
+    if mode is None:
+        run_app()
+    else:
+        with profiling.profiled(session_id(), st.session_state.current_page, mode):
+            run_app()
+
+def run_app():
+    init_user_state()
+    sync_transactions()
+    sessions.touch(session_id(), current_user(), st.session_state.to_dict())
     apply_theme()
     render_sidebar()
     
     page = st.session_state.current_page
     
-    if page == "Dashboard":
-        dashboard_page()
-    elif page == "Transactions":
-        transactions_page()
-    elif page == "Analytics":
-        analytics_page()
-    elif page == "Categories":
-        categories_page()
-    elif page == "Goals":
-        goals_page()
-    elif page == "Settings":
-        settings_page()
+    with timed(f"page.{page}"):
+        if page == "Dashboard":
+            dashboard_page()
+        elif page == "Transactions":
+            transactions_page()
+        elif page == "Analytics":
+            analytics_page()
+        elif page == "Categories":
+            categories_page()
+        elif page == "Goals":
+            goals_page()
+        elif page == "Settings":
+            settings_page()
+        elif page == "Performance" and is_admin():
+            performance_page()
 
 # --- ROUTE ---
 if not st.session_state.logged_in:
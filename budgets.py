@@ -0,0 +1,133 @@
+import pandas as pd
+from currency import BASE_CURRENCY, convert_to_base
+
+# Fraction of a budget at which a category starts raising a warning
+WARNING_THRESHOLD = 0.8
+
+
+def monthly_spend(df, base_currency=BASE_CURRENCY):
+    """
+    Aggregate debit spend per (Month, Category) in one grouped pass
+
+    Args:
+        df: Transaction DataFrame with Date, Amount, Category (and Currency)
+        base_currency: Currency the spend is reported in
+
+    Returns:
+        pd.Series: Spend indexed by (Month, Category), Month as 'YYYY-MM'
+    """
+    empty = pd.Series(dtype=float, index=pd.MultiIndex.from_arrays([[], []], names=['Month', 'Category']))
+    if df is None or df.empty:
+        return empty
+
+    amounts = convert_to_base(df, base_currency)
+    is_debit = amounts < 0
+    if not is_debit.any():
+        return empty
+
+    dates = pd.to_datetime(df.loc[is_debit, 'Date'], errors='coerce')
+    months = dates.dt.strftime('%Y-%m')
+    categories = df.loc[is_debit, 'Category'].fillna('Other')
+
+    spend = (-amounts[is_debit]).groupby([months.rename('Month'), categories.rename('Category')]).sum()
+    return spend
+
+
+class BudgetTracker:
+    """
+    Keeps a running (Month, Category) spend aggregate for budget checks
+
+    Build it once from the transaction store and feed it new rows through
+    update(); evaluations then read the aggregate instead of the ledger.
+    """
+
+    def __init__(self, df=None, base_currency=BASE_CURRENCY):
+        self.base_currency = base_currency
+        self.spend = monthly_spend(df, base_currency)
+
+    def update(self, new_df):
+        """
+        Fold newly added transactions into the spend aggregate
+
+        Args:
+            new_df: DataFrame of new transactions only
+        """
+        new_spend = monthly_spend(new_df, self.base_currency)
+        if new_spend.empty:
+            return
+        self.spend = self.spend.add(new_spend, fill_value=0) if not self.spend.empty else new_spend
+
+    def report(self, budgets):
+        """
+        Spend vs budget for every budgeted category and every month with data
+
+        Args:
+            budgets: dict of category name -> monthly budget amount
+
+        Returns:
+            pd.DataFrame: Month, Category, Budget, Spent, Remaining, Used
+        """
+        columns = ['Month', 'Category', 'Budget', 'Spent', 'Remaining', 'Used']
+        budgets = pd.Series({name: amount for name, amount in budgets.items() if amount and amount > 0}, dtype=float)
+        if budgets.empty:
+            return pd.DataFrame(columns=columns)
+
+        months = sorted(self.spend.index.get_level_values('Month').unique())
+        if not months:
+            months = [pd.Timestamp.now().strftime('%Y-%m')]
+
+        grid = pd.MultiIndex.from_product([months, budgets.index], names=['Month', 'Category'])
+        report = self.spend.reindex(grid, fill_value=0.0).rename('Spent').reset_index()
+        report['Budget'] = report['Category'].map(budgets)
+        report['Remaining'] = report['Budget'] - report['Spent']
+        report['Used'] = report['Spent'] / report['Budget']
+        return report[columns]
+
+    def month_status(self, budgets, month=None):
+        """
+        Spend vs budget for a single month, keyed by category
+
+        Args:
+            budgets: dict of category name -> monthly budget amount
+            month: 'YYYY-MM' string (defaults to the current month)
+
+        Returns:
+            dict: Category -> dict with budget, spent, remaining, used
+        """
+        month = month or pd.Timestamp.now().strftime('%Y-%m')
+        status = {}
+        for name, budget in budgets.items():
+            if not budget or budget <= 0:
+                continue
+            spent = float(self.spend.get((month, name), 0.0))
+            status[name] = {
+                'budget': float(budget),
+                'spent': round(spent, 2),
+                'remaining': round(budget - spent, 2),
+                'used': spent / budget
+            }
+        return status
+
+    def alerts(self, budgets, month=None, threshold=WARNING_THRESHOLD):
+        """
+        Categories that are close to or over budget for a month
+
+        Args:
+            budgets: dict of category name -> monthly budget amount
+            month: 'YYYY-MM' string (defaults to the current month)
+            threshold: Fraction of budget that triggers a warning
+
+        Returns:
+            list: dicts with category, spent, budget, used and level
+                  ('exceeded' or 'warning'), most severe first
+        """
+        alerts = []
+        for name, status in self.month_status(budgets, month).items():
+            if status['used'] >= 1:
+                level = 'exceeded'
+            elif status['used'] >= threshold:
+                level = 'warning'
+            else:
+                continue
+            alerts.append({'category': name, 'level': level, **status})
+        return sorted(alerts, key=lambda a: a['used'], reverse=True)
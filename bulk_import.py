@@ -0,0 +1,283 @@
+# Headless bulk import of statement files:
+#
+#     python bulk_import.py statements/ --user someone@example.com --workers 8
+#
+# Runs the Upload tab's parse -> normalize -> categorize -> dedup -> store
+# pipeline over a directory. Files are parsed in a process pool; dedup and
+# writes happen in the parent so the store and its dedup index have a
+# single writer. Finished files are recorded in a checkpoint next to the
+# store, keyed by store and file content, so an interrupted run picks up
+# where it stopped and a fresh store imports everything. Run from the app directory
+# (data/ paths are relative) with GEMINI_API_KEY set for PDFs and screenshots.
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import mimetypes
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ai_client
+import processor
+import state
+from storage import TRANSACTIONS_PATH, DedupIndex, append_transactions
+
+SUPPORTED_EXTENSIONS = ('.csv', '.pdf', '.jpg', '.jpeg', '.png')
+# Appended to the store path (minus extension) for the default checkpoint
+CHECKPOINT_SUFFIX = '.import_checkpoint.jsonl'
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class LocalFile(io.BytesIO):
+    """A file on disk, shaped like a Streamlit UploadedFile for processor"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.size = len(self.getbuffer())
+
+
+def find_statements(directory):
+    """
+    Statement files under a directory, in a stable order
+
+    Args:
+        directory: Directory to scan recursively
+
+    Returns:
+        list: Paths relative to directory
+    """
+    found = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(root, name), directory))
+    return sorted(found)
+
+
+def checkpoint_path_for(store_path):
+    """Default checkpoint file of a transaction store"""
+    return os.path.splitext(store_path)[0] + CHECKPOINT_SUFFIX
+
+
+def _store_id(store_path):
+    return os.path.abspath(store_path)
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, the key it is checkpointed under"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_checkpoint(path, store_path):
+    """
+    Files already imported successfully into a store
+
+    Args:
+        path: Checkpoint file (JSON lines)
+        store_path: Transaction store the imports went to
+
+    Returns:
+        dict: Content hash -> stats of its last successful import
+    """
+    done = {}
+    # A missing or emptied store was replaced; everything is imported again
+    if not os.path.exists(store_path) or not os.path.getsize(store_path):
+        return done
+    store = _store_id(store_path)
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial line from an interrupted write
+                if entry.get('status') == 'ok' and entry.get('store') == store and entry.get('sha256'):
+                    done[entry['sha256']] = entry
+    except OSError:
+        pass
+    return done
+
+
+def _has_required_columns(path):
+    """Whether a CSV's header names the columns process_data needs"""
+    with open(path, 'r', encoding='utf-8-sig', errors='ignore') as f:
+        header = [col.strip().strip('"') for col in f.readline().split(',')]
+    return all(col in header for col in processor.REQUIRED_COLUMNS)
+
+
+def _init_worker(requests_per_minute):
+    """Give each worker its share of the AI quota"""
+    ai_client._rate_limiter = ai_client.TokenBucket(requests_per_minute)
+
+
+def _parse_file(path, api_key, currency, email=None):
+    """
+    Parse, normalize and categorize one file (runs in a worker process)
+
+    Returns:
+        tuple: (DataFrame of cleaned rows, error message or None, seconds)
+    """
+    started = time.perf_counter()
+    if path.lower().endswith('.csv') and _has_required_columns(path):
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            text = f.read()
+    else:
+        # Not a structured export; extract with the model
+        if not api_key:
+            return None, "GEMINI_API_KEY is not set", time.perf_counter() - started
+        try:
+            text = processor.ai_parse_file(LocalFile(path), api_key)
+        except ai_client.AIError as e:
+            return None, str(e), time.perf_counter() - started
+
+    return processor.process_data(text, currency=currency, email=email), None, time.perf_counter() - started
+
+
+def import_directory(directory, store_path=TRANSACTIONS_PATH, workers=None, api_key=None,
+                     currency=processor.BASE_CURRENCY, checkpoint_path=None, on_file=None, writer=None, email=None):
+    """
+    Import every statement in a directory into a transaction store
+
+    Args:
+        directory: Directory of statements (CSV, PDF, JPEG/PNG)
+        store_path: Transaction store to write to
+        workers: Worker processes (defaults to the CPU count)
+        api_key: Gemini API key for files that need the model
+        currency: Currency assumed for rows without one
+        checkpoint_path: Checkpoint file (defaults to one next to store_path)
+        on_file: Optional callback receiving each file's stats dict
+        writer: Optional callable (rows, index) storing new rows (defaults
+                to appending to store_path)
+        email: User the store belongs to (selects their classifier)
+
+    Returns:
+        list: Stats dict per file processed in this run (file, status,
+              rows, written, duplicates, seconds, error)
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint_path = checkpoint_path or checkpoint_path_for(store_path)
+    done = load_checkpoint(checkpoint_path, store_path)
+    store = _store_id(store_path)
+
+    pending = []
+    for rel_path in find_statements(directory):
+        path = os.path.join(directory, rel_path)
+        stat, digest = os.stat(path), file_digest(path)
+        if digest in done:
+            continue
+        pending.append((rel_path, stat, digest))
+
+    results = []
+    if writer is None:
+        writer = lambda rows, index: append_transactions(rows, store_path, index)
+    with DedupIndex(store_path) as index, open(checkpoint_path, 'a') as checkpoint:
+
+        def finish(entry, df=None):
+            if df is not None and not df.empty:
+                new_rows = df[~index.contains(df)]
+                written = writer(new_rows, index)
+                entry.update(rows=len(df), written=len(written), duplicates=len(df) - len(new_rows))
+            if entry['status'] == 'ok' and not entry['rows']:
+                # process_data returns no rows for text it couldn't parse;
+                # not recorded as done, so the next run retries the file
+                entry.update(status='error', error="No transactions found")
+            entry['seconds'] = round(time.perf_counter() - entry.pop('_started'), 3)
+            checkpoint.write(json.dumps(entry) + '\n')
+            checkpoint.flush()
+            results.append(entry)
+            if on_file is not None:
+                on_file(entry)
+
+        def new_entry(rel_path, stat, digest):
+            return {'store': store, 'file': rel_path, 'sha256': digest, 'size': stat.st_size, 'status': 'ok',
+                    'rows': 0, 'written': 0, 'duplicates': 0, 'error': None, '_started': time.perf_counter()}
+
+        # Large structured CSVs stream straight into the store from this process
+        parallel = []
+        for rel_path, stat, digest in pending:
+            path = os.path.join(directory, rel_path)
+            if (rel_path.lower().endswith('.csv') and stat.st_size >= processor.STREAMING_THRESHOLD_BYTES
+                    and _has_required_columns(path)):
+                entry = new_entry(rel_path, stat, digest)
+                try:
+                    stats = processor.process_csv_chunked(path, store_path, currency, writer=writer, email=email)
+                    entry.update(rows=stats['rows_read'] - stats['invalid'], written=stats['rows_written'],
+                                 duplicates=stats['duplicates'])
+                except Exception as e:
+                    entry.update(status='error', error=str(e))
+                finish(entry)
+            else:
+                parallel.append((rel_path, stat, digest))
+
+        if not parallel:
+            return results
+
+        rpm = max(1, ai_client.REQUESTS_PER_MINUTE // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rpm,)) as pool:
+            futures = {}
+            for rel_path, stat, digest in parallel:
+                future = pool.submit(_parse_file, os.path.join(directory, rel_path), api_key, currency, email)
+                futures[future] = new_entry(rel_path, stat, digest)
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    df, error, seconds = future.result()
+                except Exception as e:
+                    df, error, seconds = None, str(e), 0.0
+                # Count the worker's parse time plus storing, not time spent queued
+                entry['_started'] = time.perf_counter() - seconds
+                if error:
+                    entry.update(status='error', error=error)
+                finish(entry, df)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a directory of bank statements into PennyWyse")
+    parser.add_argument('directory', help="Directory of CSV, PDF and screenshot statements")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--user', help="Email of the user whose store to import into")
+    target.add_argument('--store', default=TRANSACTIONS_PATH, help="Transaction store path")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--currency', default=processor.BASE_CURRENCY, help="Default currency for rows")
+    parser.add_argument('--checkpoint', default=None, help="Checkpoint file for resuming")
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get('GEMINI_API_KEY')
+
+    def report(entry):
+        detail = entry['error'] or f"{entry['written']} written, {entry['duplicates']} duplicate(s)"
+        print(f"{entry['status']:5}  {entry['file']}  {entry['rows']} row(s)  {detail}  {entry['seconds']:.2f}s",
+              flush=True)
+
+    if args.user:
+        # Through the configured state backend, holding the user's write
+        # lock so app replicas and import workers don't interleave
+        store = state.transaction_store()
+        with store.lock(args.user):
+            results = import_directory(args.directory, store.path(args.user), args.workers, api_key,
+                                       args.currency, args.checkpoint, on_file=report,
+                                       writer=lambda rows, index: store.append(args.user, rows, index),
+                                       email=args.user)
+    else:
+        results = import_directory(args.directory, args.store, args.workers, api_key, args.currency,
+                                   args.checkpoint, on_file=report)
+
+    failed = [entry for entry in results if entry['status'] != 'ok']
+    print(f"{len(results)} file(s) processed, {sum(e['written'] for e in results)} transaction(s) written, "
+          f"{len(failed)} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+# Every cache registers itself here so the admin panel can list their
+# counters; names are unique per process
+_registry = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def estimate_size(value, _seen=None):
+    """
+    Approximate in-memory size of a cached item
+
+    DataFrames and Series are measured exactly (including object columns);
+    other objects are measured through the DataFrames and Series they hold.
+    Objects reachable more than once (including through a cycle) are
+    counted once.
+
+    Args:
+        value: Cached object
+
+    Returns:
+        int: Size in bytes
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    memory_usage = getattr(value, 'memory_usage', None)
+    if callable(memory_usage):
+        usage = memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v, _seen) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + sum(estimate_size(v, _seen) for v in vars(value).values())
+    return sys.getsizeof(value)
+
+
+def register(cache):
+    """
+    Make a cache's stats() visible in cache_stats()
+
+    Args:
+        cache: Object with a name attribute and a stats() method
+
+    Returns:
+        object: The cache
+    """
+    with _registry_lock:
+        _registry[cache.name] = cache
+    return cache
+
+
+def cache_stats():
+    """
+    Counters of every registered cache
+
+    Returns:
+        list: One stats dict per cache (name, items, bytes, hits, misses,
+              evictions, expirations, invalidations, hit_rate, ...)
+    """
+    with _registry_lock:
+        caches = list(_registry.values())
+    return [cache.stats() for cache in caches]
+
+
+def _hit_rate(hits, misses):
+    return round(hits / (hits + misses), 3) if hits + misses else None
+
+
+class CacheCounters:
+    """
+    Hit/miss/eviction counters for caches that manage their own storage
+
+    Args:
+        name: Name shown in the admin panel
+        usage: Optional callable returning (items, bytes) currently held
+    """
+
+    def __init__(self, name, usage=None):
+        self.name = name
+        self.usage = usage
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        register(self)
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def evicted(self, count=1):
+        with self._lock:
+            self.evictions += count
+
+    def stats(self):
+        items, nbytes = self.usage() if self.usage else (None, None)
+        return {'name': self.name, 'items': items, 'bytes': nbytes, 'max_items': None, 'max_bytes': None,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'expirations': 0,
+                'invalidations': 0, 'hit_rate': _hit_rate(self.hits, self.misses)}
+
+
+class LruCacheCounters:
+    """
+    Registry adapter for a functools.lru_cache function
+
+    Hot per-row lookups keep the C implementation; its cache_info() is
+    reported like the other caches. With no cache_clear() calls, every
+    miss beyond the current size was an eviction.
+    """
+
+    def __init__(self, name, function):
+        self.name = name
+        self.function = function
+        register(self)
+
+    def stats(self):
+        info = self.function.cache_info()
+        return {'name': self.name, 'items': info.currsize, 'bytes': None, 'max_items': info.maxsize,
+                'max_bytes': None, 'hits': info.hits, 'misses': info.misses,
+                'evictions': max(0, info.misses - info.currsize), 'expirations': 0, 'invalidations': 0,
+                'hit_rate': _hit_rate(info.hits, info.misses)}
+
+
+class BoundedCache:
+    """
+    Thread-safe LRU cache bounded by item count and/or total size
+
+    Entries may expire (ttl seconds) and may carry a version, such as a
+    file's mtime or a store's data version; reading with a different
+    version drops the entry. Keys live in namespaces (typically the user's
+    email) that can be dropped as a whole.
+
+    Args:
+        name: Name shown in the admin panel (also the registry key)
+        max_items: Most entries kept (None for no limit)
+        max_bytes: Most total estimated bytes kept (None for no limit)
+        ttl: Default seconds an entry stays valid (None for no expiry)
+        sizer: Callable measuring an entry (defaults to estimate_size)
+    """
+
+    def __init__(self, name, max_items=None, max_bytes=None, ttl=None, sizer=estimate_size):
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizer = sizer
+        # (namespace, key) -> (value, size, expires_at, version)
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        self._lock = threading.RLock()
+        register(self)
+
+    def get(self, key, default=None, namespace=None, version=None):
+        """
+        Cached value, or default on a miss
+
+        Args:
+            key: Entry key
+            default: Returned on a miss
+            namespace: Namespace the key lives in
+            version: Expected version; a stored entry with another version
+                     is dropped and reported as a miss
+
+        Returns:
+            object: The value or default
+        """
+        full_key = (namespace, key)
+        with self._lock:
+            entry = self.entries.get(full_key)
+            if entry is not None:
+                value, _, expires_at, stored_version = entry
+                if expires_at is not None and expires_at <= time.monotonic():
+                    self._remove(full_key)
+                    self.expirations += 1
+                elif version is not None and stored_version != version:
+                    self._remove(full_key)
+                    self.invalidations += 1
+                else:
+                    self.entries.move_to_end(full_key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return default
+
+    def put(self, key, value, namespace=None, version=None, ttl=None):
+        """
+        Store a value, evicting least recently used entries over the limits
+
+        Values larger than max_bytes on their own are not stored.
+
+        Returns:
+            object: value
+        """
+        size = self.sizer(value)
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        full_key = (namespace, key)
+        with self._lock:
+            if full_key in self.entries:
+                self._remove(full_key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return value
+            self.entries[full_key] = (value, size, expires_at, version)
+            self.nbytes += size
+            while self.entries and ((self.max_items is not None and len(self.entries) > self.max_items) or
+                                    (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+        return value
+
+    def get_or_load(self, key, loader, namespace=None, version=None, ttl=None):
+        """
+        Cached value, built with loader() on a miss
+
+        The loader runs outside the lock; concurrent misses may both load.
+        """
+        missing = object()
+        value = self.get(key, missing, namespace, version)
+        if value is not missing:
+            return value
+        return self.put(key, loader(), namespace, version, ttl)
+
+    def _remove(self, full_key):
+        _, size, _, _ = self.entries.pop(full_key)
+        self.nbytes -= size
+
+    def discard(self, key, namespace=None):
+        """Forget one entry if present"""
+        with self._lock:
+            if (namespace, key) in self.entries:
+                self._remove((namespace, key))
+
+    def drop_namespace(self, namespace):
+        """Forget every entry of a namespace"""
+        with self._lock:
+            for full_key in [k for k in self.entries if k[0] == namespace]:
+                self._remove(full_key)
+
+    def clear(self):
+        """Forget every entry (counters are kept)"""
+        with self._lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """
+        Current size and counters
+
+        Returns:
+            dict: name, items, bytes, max_items, max_bytes, hits, misses,
+                  evictions, expirations, invalidations, hit_rate
+        """
+        with self._lock:
+            return {'name': self.name, 'items': len(self.entries), 'bytes': self.nbytes,
+                    'max_items': self.max_items, 'max_bytes': self.max_bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions, 'expirations': self.expirations,
+                    'invalidations': self.invalidations, 'hit_rate': _hit_rate(self.hits, self.misses)}
@@ -0,0 +1,246 @@
+import re
+import uuid
+import zlib
+import base64
+import threading
+from io import BytesIO
+import numpy as np
+import pandas as pd
+from caching import BoundedCache
+from state import transaction_store, user_store
+from storage import user_key
+
+# Hashed character n-gram naive Bayes model, used as the second
+# categorization tier after keyword matching and before any AI call.
+# Every user has their own model, trained only on categories they chose
+# themselves, kept with their settings in the user store:
+#   category_labels         confirmed category per canonical merchant
+#   category_model          the model (base64 .npz)
+#   category_model_version  changes whenever the model is retrained
+LABELS_DOC = 'category_labels'
+MODEL_DOC = 'category_model'
+MODEL_VERSION_DOC = 'category_model_version'
+# Confirmed labels kept per user; the least recently confirmed go first
+MAX_LABELS = 20000
+N_FEATURES = 2 ** 14
+NGRAM_RANGE = (2, 4)
+MIN_CONFIDENCE = 0.6
+# Log-likelihoods are averaged per n-gram and rescaled, which keeps long
+# descriptions from producing overconfident predictions
+EVIDENCE_SCALE = 5.0
+
+# Shared across sessions in this process: models by user, versioned by
+# their model version document
+_model_cache = BoundedCache('category_model', max_items=16)
+_model_lock = threading.Lock()
+
+
+def _normalize_text(text):
+    """Lower-case and drop digits/punctuation so reference numbers don't dominate"""
+    return ' '.join(re.sub(r'[^a-z]+', ' ', str(text).lower()).split())
+
+
+def _ngram_hashes(text):
+    """Hashed character n-grams of one description"""
+    normalized = _normalize_text(text)
+    if not normalized:
+        return []
+    padded = f" {normalized} "
+    hashes = []
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(padded) - n + 1):
+            hashes.append(zlib.crc32(padded[i:i + n].encode('utf-8')) % N_FEATURES)
+    return hashes
+
+
+def hash_features(texts):
+    """
+    Featurize descriptions as a CSR-style list of hashed n-gram indices
+
+    Args:
+        texts: Iterable of transaction descriptions
+
+    Returns:
+        tuple: (indptr, indices) numpy arrays; row i owns
+               indices[indptr[i]:indptr[i + 1]]
+    """
+    rows = [_ngram_hashes(text) for text in texts]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    indices = np.fromiter((h for row in rows for h in row), dtype=np.int64, count=int(indptr[-1]))
+    return indptr, indices
+
+
+class CategoryModel:
+    """
+    Multinomial naive Bayes over hashed character n-grams
+
+    Scoring is linear in log space, so a batch is one gather and one
+    segmented sum over the feature weights.
+    """
+
+    def __init__(self, classes, log_prior, feature_log_prob):
+        self.classes = np.asarray(classes)
+        self.log_prior = np.asarray(log_prior, dtype=np.float32)
+        self.feature_log_prob = np.asarray(feature_log_prob, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, texts, labels, alpha=0.1):
+        """
+        Train a model from descriptions and their confirmed categories
+
+        Args:
+            texts: List of transaction descriptions
+            labels: List of category names, aligned with texts
+            alpha: Additive smoothing
+
+        Returns:
+            CategoryModel: Trained model
+        """
+        classes, y = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+        indptr, indices = hash_features(texts)
+        row_of_feature = np.repeat(y, np.diff(indptr))
+
+        counts = np.zeros((N_FEATURES, len(classes)), dtype=np.float64)
+        np.add.at(counts, (indices, row_of_feature), 1.0)
+
+        smoothed = counts + alpha
+        feature_log_prob = np.log(smoothed / smoothed.sum(axis=0, keepdims=True))
+        log_prior = np.log(np.bincount(y, minlength=len(classes)) / len(y))
+        return cls(classes, log_prior, feature_log_prob)
+
+    def predict(self, texts):
+        """
+        Predict categories for a batch of descriptions
+
+        Args:
+            texts: List of transaction descriptions
+
+        Returns:
+            tuple: (labels, confidences) numpy arrays aligned with texts
+        """
+        if len(texts) == 0:
+            return np.array([], dtype=str), np.array([], dtype=np.float32)
+
+        indptr, indices = hash_features(texts)
+        scores = np.tile(self.log_prior, (len(texts), 1))
+
+        lengths = np.diff(indptr)
+        has_features = lengths > 0
+        if indices.size:
+            summed = np.add.reduceat(self.feature_log_prob[indices], indptr[:-1][has_features], axis=0)
+            scores[has_features] += summed / lengths[has_features, None] * EVIDENCE_SCALE
+
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        best = probs.argmax(axis=1)
+        return self.classes[best], probs[np.arange(len(texts)), best]
+
+    def to_bytes(self):
+        """Serialize the model as a compressed .npz"""
+        buffer = BytesIO()
+        np.savez_compressed(buffer, classes=self.classes, log_prior=self.log_prior,
+                            feature_log_prob=self.feature_log_prob)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Read a model serialized by to_bytes"""
+        with np.load(BytesIO(data), allow_pickle=False) as arrays:
+            return cls(arrays['classes'], arrays['log_prior'], arrays['feature_log_prob'])
+
+
+def get_model(email=None):
+    """
+    A user's model, loaded once per version
+
+    Args:
+        email: Authenticated email (None for the legacy shared store)
+
+    Returns:
+        CategoryModel or None: None if the user hasn't trained one yet
+    """
+    store = user_store()
+    version = store.get(email, MODEL_VERSION_DOC)
+    if version is None:
+        return None
+
+    key = user_key(email)
+    cached = _model_cache.get(key, version=version)
+    if cached is not None:
+        return cached
+
+    with _model_lock:
+        cached = _model_cache.get(key, version=version)
+        if cached is not None:
+            return cached
+        try:
+            model = CategoryModel.from_bytes(base64.b64decode(store.get(email, MODEL_DOC)))
+        except Exception as e:
+            print(f"Error loading category model: {str(e)}")
+            return None
+        return _model_cache.put(key, model, version=version)
+
+
+def confirm_categories(email, particulars, categories):
+    """
+    Record categories a user chose themselves, as training labels
+
+    Only explicit choices belong here (e.g. manual entry), never
+    categories assigned by keywords, the model or the AI extractor, so
+    the model doesn't learn from its own guesses.
+
+    Args:
+        email: Authenticated email
+        particulars: Transaction descriptions
+        categories: Chosen category names, aligned with particulars
+    """
+    from processor import canonical_merchants
+    merchants = canonical_merchants(pd.Series(list(particulars), dtype=object))
+    # Read-modify-write of a shared document: serialized per user
+    with transaction_store().lock(email):
+        labels = user_store().get(email, LABELS_DOC, {})
+        for merchant, category in zip(merchants, categories):
+            if merchant and category and category != 'Other':
+                labels.pop(merchant, None)
+                labels[merchant] = str(category)
+        for merchant in list(labels)[:max(0, len(labels) - MAX_LABELS)]:
+            del labels[merchant]
+        user_store().put(email, LABELS_DOC, labels)
+
+
+def train_classifier(email=None, categories=None):
+    """
+    Train and save a user's category model from their confirmed labels
+
+    Examples are the canonical merchants the user confirmed a category
+    for (see confirm_categories), matching how
+    processor.categorize_transactions queries the model. Category
+    keywords are added as extra examples so every category is
+    represented even before the user has confirmed any rows.
+
+    Args:
+        email: Authenticated email (None for the legacy shared store)
+        categories: Category dicts with 'name' and 'keywords' (optional)
+
+    Returns:
+        int: Number of training examples, 0 if nothing was trained
+    """
+    store = user_store()
+    confirmed = store.get(email, LABELS_DOC, {})
+    texts, labels = list(confirmed), list(confirmed.values())
+
+    for cat in categories or []:
+        for keyword in cat.get('keywords', []):
+            texts.append(keyword)
+            labels.append(cat['name'])
+
+    if len(set(labels)) < 2:
+        return 0
+
+    model = CategoryModel.fit(texts, labels)
+    store.put(email, MODEL_DOC, base64.b64encode(model.to_bytes()).decode('ascii'))
+    store.put(email, MODEL_VERSION_DOC, uuid.uuid4().hex)
+    return len(texts)
@@ -0,0 +1,314 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import closing
+import pandas as pd
+from lazy_imports import load_module
+from metrics import registry, timed
+from storage import TRANSACTION_COLUMNS, _normalize_transactions, read_rows
+
+# A transaction store's CSV is an append-only log: every write adds its
+# batch at the end, so write cost doesn't grow with history. A background
+# compactor folds the log, up to a recorded offset, into one columnar
+# file per month next to it:
+#   <store>.compacted/<YYYY-MM>-<generation>.arrow  (sorted by date, deduplicated)
+#   <store>.compacted/manifest.sqlite                (offset folded, current files)
+# Reads merge the compacted months with the log after that offset. The log
+# itself is kept: sync offsets, replica mirrors and the dedup index all
+# address it by byte. Month files are uncompressed Arrow IPC (Feather),
+# which loads without parsing; Parquet's decoding was slower than the CSV.
+COMPACT_MIN_BYTES = 4 * 1024 * 1024
+COMPACT_INTERVAL_SECONDS = 30
+# Month files replaced by a newer compaction are removed once this old,
+# so reads that started before the switch can finish
+STALE_SECONDS = 600
+# Rows without a parseable date are kept in their own file
+UNDATED = 'undated'
+READ_RETRIES = 3
+MANIFEST_TIMEOUT_SECONDS = 10
+NUMERIC_COLUMNS = {'Date', 'Amount'}
+
+
+def compacted_dir(path):
+    """Directory holding the compacted month files of a transaction store"""
+    return os.path.splitext(path)[0] + '.compacted'
+
+
+def _manifest_path(path):
+    return os.path.join(compacted_dir(path), 'manifest.sqlite')
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+# Shared by every session in this process
+_available = None
+
+
+def available():
+    """Whether compaction can run here (month files need pyarrow)"""
+    global _available
+    if _available is None:
+        try:
+            load_module('pyarrow.feather')
+            _available = True
+        except ImportError:
+            print("Transaction compaction disabled: pyarrow not installed")
+            _available = False
+    return _available
+
+
+def _snapshot(path):
+    """
+    Current compaction of a store
+
+    Returns:
+        tuple: (log offset folded, {month: file}); (0, {}) if there is none
+               or it no longer matches the log
+    """
+    manifest = _manifest_path(path)
+    if not os.path.exists(manifest):
+        return 0, {}
+    with closing(sqlite3.connect(manifest, timeout=MANIFEST_TIMEOUT_SECONDS, isolation_level=None)) as conn:
+        try:
+            conn.execute('BEGIN')
+            row = conn.execute("SELECT offset FROM compacted").fetchone()
+            files = dict(conn.execute("SELECT month, file FROM files").fetchall())
+            conn.execute('COMMIT')
+        except sqlite3.OperationalError:
+            # Not set up yet by the first compaction
+            return 0, {}
+    offset = row[0] if row else 0
+    # A log that shrank was replaced or rolled back; it is compacted afresh
+    if not offset or offset > _size(path):
+        return 0, {}
+    return offset, files
+
+
+def _write_month(rows, path):
+    pa = load_module('pyarrow')
+    schema = pa.schema([(col, pa.timestamp('ns') if col == 'Date' else
+                         pa.float64() if col == 'Amount' else pa.string()) for col in TRANSACTION_COLUMNS])
+    rows = rows.copy()
+    for col in TRANSACTION_COLUMNS:
+        if col not in NUMERIC_COLUMNS:
+            rows[col] = [None if pd.isna(value) else str(value) for value in rows[col]]
+    table = pa.Table.from_pandas(rows, schema=schema, preserve_index=False)
+    load_module('pyarrow.feather').write_feather(table, path, compression='uncompressed')
+
+
+def _read_months(directory, names):
+    """Month files as one DataFrame (memory-mapped, converted in one pass)"""
+    if not names:
+        return _normalize_transactions(pd.DataFrame(columns=TRANSACTION_COLUMNS))
+    feather = load_module('pyarrow.feather')
+    tables = [feather.read_table(os.path.join(directory, name), memory_map=True) for name in names]
+    return load_module('pyarrow').concat_tables(tables).to_pandas()
+
+
+def read_transactions(path, end=None):
+    """
+    Transactions of a store up to a log offset, compacted months merged
+    with the log after them
+
+    Args:
+        path: CSV log of the transaction store
+        end: Log offset to read up to (default: everything written)
+
+    Returns:
+        tuple: (DataFrame of rows, log offset actually read); compacted
+               rows come first, by date
+    """
+    end = _size(path) if end is None else end
+    for _ in range(READ_RETRIES):
+        offset, files = _snapshot(path)
+        if not offset or offset > end:
+            break
+        try:
+            compacted = _read_months(compacted_dir(path), [files[month] for month in sorted(files)])
+        except FileNotFoundError:
+            # Replaced by a newer compaction while reading
+            continue
+        tail, end = read_rows(path, offset, end)
+        if not tail.empty:
+            compacted = pd.concat([compacted, tail], ignore_index=True)
+        return compacted, end
+    return read_rows(path, 0, end)
+
+
+def read_chunks(path, start=None, end=None, chunksize=100000):
+    """
+    Stream a store's transactions in chunks
+
+    Compacted months outside [start, end] are skipped unread, so callers
+    still filter the rows they get by date.
+
+    Args:
+        path: CSV log of the transaction store
+        start: First date of interest (default: no limit)
+        end: Last date of interest (default: no limit)
+        chunksize: Rows per chunk read from the log
+
+    Yields:
+        pd.DataFrame: Transactions (one compacted month, or a slice of the log)
+    """
+    size = _size(path)
+    if not size:
+        return
+    offset, files = _snapshot(path)
+    first = pd.Timestamp(start).strftime('%Y-%m') if start is not None else None
+    last = pd.Timestamp(end).strftime('%Y-%m') if end is not None else None
+    for month in sorted(files):
+        if month == UNDATED:
+            if first or last:
+                continue
+        elif (first and month < first) or (last and month > last):
+            continue
+        yield _read_months(compacted_dir(path), [files[month]])
+
+    if not offset:
+        yield from pd.read_csv(path, dtype={'Transaction_ID': str}, chunksize=chunksize)
+    elif size > offset:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            yield from pd.read_csv(f, header=None, names=TRANSACTION_COLUMNS, dtype={'Transaction_ID': str},
+                                   chunksize=chunksize)
+
+
+def _fold(rows):
+    """Sort a month's rows by date and drop repeats of the same transaction"""
+    rows = _normalize_transactions(rows).sort_values('Date', kind='stable')
+    # Only rows carrying a Transaction_ID are known to be the same
+    # transaction written twice (a retried write); identical rows without
+    # one may be genuine repeats entered by hand
+    repeated = rows.duplicated() & rows['Transaction_ID'].notna()
+    return rows[~repeated].reset_index(drop=True)
+
+
+@timed('stage.compact')
+def compact(path, min_bytes=COMPACT_MIN_BYTES):
+    """
+    Fold the log written since the last compaction into the month files
+
+    Only months the new rows fall in are rewritten. A store is compacted
+    by one process at a time; others skip it.
+
+    Args:
+        path: CSV log of the transaction store
+        min_bytes: Skip stores with less uncompacted log than this
+
+    Returns:
+        int: Log rows folded (0 if skipped)
+    """
+    if not available() or _size(path) - _snapshot(path)[0] < max(min_bytes, 1):
+        return 0
+
+    directory = compacted_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(_manifest_path(path), timeout=0, isolation_level=None)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS compacted (offset INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS files (month TEXT PRIMARY KEY, file TEXT, rows INTEGER)")
+        conn.execute('BEGIN IMMEDIATE')
+    except sqlite3.OperationalError:
+        # Another process is compacting this store
+        conn.close()
+        return 0
+
+    try:
+        # Readers only hold the manifest briefly; wait for them to commit
+        conn.execute(f"PRAGMA busy_timeout = {MANIFEST_TIMEOUT_SECONDS * 1000}")
+        row = conn.execute("SELECT offset FROM compacted").fetchone()
+        offset = row[0] if row else 0
+        files = dict(conn.execute("SELECT month, file FROM files").fetchall())
+        if offset > _size(path):
+            offset, files = 0, {}
+        tail, end = read_rows(path, offset, _size(path))
+        if end - offset < max(min_bytes, 1):
+            return 0
+
+        generation = uuid.uuid4().hex[:12]
+        months = tail['Date'].dt.strftime('%Y-%m').fillna(UNDATED)
+        written = []
+        for month, rows in tail.groupby(months, sort=True):
+            if month in files:
+                rows = pd.concat([_read_months(directory, [files[month]]), rows], ignore_index=True)
+            rows = _fold(rows)
+            name = f"{month}-{generation}.arrow"
+            _write_month(rows, os.path.join(directory, name))
+            written.append((month, name, len(rows)))
+            files[month] = name
+
+        if not offset:
+            conn.execute("DELETE FROM files")
+        conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", written)
+        conn.execute("DELETE FROM compacted")
+        conn.execute("INSERT INTO compacted VALUES (?)", (end,))
+        conn.execute('COMMIT')
+    finally:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        conn.close()
+
+    _remove_stale(directory, set(files.values()))
+    registry.counter('compaction.rows').inc(len(tail))
+    return len(tail)
+
+
+def _remove_stale(directory, live):
+    now = time.time()
+    for name in os.listdir(directory):
+        if not name.endswith('.arrow') or name in live:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > STALE_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+# Stores waiting for this process's compactor thread.
+# Shared by every session in this process
+_pending = set()
+_pending_lock = threading.Lock()
+_compactor_thread = None
+
+
+def request_compaction(path):
+    """
+    Have the background compactor look at a store
+
+    Called after writes and full reads; cheap, and safe to call often.
+    The compactor thread is started on first use.
+
+    Args:
+        path: CSV log of the transaction store
+    """
+    global _compactor_thread
+    if not available():
+        return
+    with _pending_lock:
+        _pending.add(path)
+        if _compactor_thread is None:
+            _compactor_thread = threading.Thread(target=_run_compactor, name='store-compactor', daemon=True)
+            _compactor_thread.start()
+
+
+def _run_compactor():
+    while True:
+        time.sleep(COMPACT_INTERVAL_SECONDS)
+        with _pending_lock:
+            paths = list(_pending)
+            _pending.clear()
+        for path in paths:
+            try:
+                compact(path)
+            except Exception as e:
+                print(f"Error compacting {path}: {str(e)}")
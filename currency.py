@@ -0,0 +1,142 @@
+import os
+import numpy as np
+import pandas as pd
+from caching import BoundedCache
+
+# Rates are stored as "units of INR per 1 unit of Currency", one row per
+# (Date, Currency). INR itself is implicit and always 1.0.
+RATES_PATH = 'data/exchange_rates.csv'
+BASE_CURRENCY = 'INR'
+SUPPORTED_CURRENCIES = ['INR', 'USD', 'EUR', 'AED']
+
+# In-memory rate tables by path, versioned by the file's mtime
+_rate_cache = BoundedCache('exchange_rates', max_items=4)
+
+
+def parse_currency_code(label):
+    """
+    Extract the ISO code from a UI label such as "USD ($)"
+
+    Args:
+        label: Currency label or code
+
+    Returns:
+        str: Upper-case ISO currency code
+    """
+    if not label:
+        return BASE_CURRENCY
+    return str(label).strip().split()[0].upper()
+
+
+def load_rate_table(path=RATES_PATH):
+    """
+    Load the date-indexed exchange rate table, cached in memory
+
+    The table is re-read only when the file on disk changes.
+
+    Args:
+        path: CSV file with Date, Currency, Rate columns
+
+    Returns:
+        pd.DataFrame: Rates sorted by Date, with INR rows omitted
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return pd.DataFrame(columns=['Date', 'Currency', 'Rate'])
+
+    cached = _rate_cache.get(path, version=mtime)
+    if cached is not None:
+        return cached
+
+    rates = pd.read_csv(path)
+    rates['Date'] = pd.to_datetime(rates['Date'], errors='coerce')
+    rates['Currency'] = rates['Currency'].astype(str).str.strip().str.upper()
+    rates['Rate'] = pd.to_numeric(rates['Rate'], errors='coerce')
+    rates = rates.dropna(subset=['Date', 'Rate'])
+    rates = rates[rates['Currency'] != BASE_CURRENCY]
+    rates = rates.sort_values('Date').reset_index(drop=True)
+
+    return _rate_cache.put(path, rates, version=mtime)
+
+
+def clear_rate_cache():
+    """Drop all cached rate tables"""
+    _rate_cache.clear()
+
+
+def _rates_as_of(dates, currencies, rates):
+    """
+    Look up the INR rate for each (date, currency) pair with an as-of join
+
+    Uses the latest rate on or before each date; dates earlier than the
+    table fall back to the earliest known rate. Unknown currencies and INR
+    get a rate of 1.0.
+
+    Args:
+        dates: Series of datetimes
+        currencies: Series of currency codes, aligned with dates
+        rates: Rate table from load_rate_table()
+
+    Returns:
+        np.ndarray: Rates aligned with the input order
+    """
+    lookup = pd.DataFrame({
+        'Date': dates.values,
+        'Currency': currencies.values,
+        '_pos': range(len(dates))
+    })
+    # merge_asof needs a non-null, sorted key
+    fallback_date = lookup['Date'].max() if lookup['Date'].notna().any() else pd.Timestamp.now()
+    lookup['Date'] = lookup['Date'].fillna(fallback_date)
+    lookup = lookup.sort_values('Date', kind='stable')
+
+    if rates.empty:
+        return np.ones(len(dates))
+
+    merged = pd.merge_asof(lookup, rates, on='Date', by='Currency', direction='backward')
+
+    missing = merged['Rate'].isna()
+    if missing.any():
+        earliest = rates.groupby('Currency')['Rate'].first()
+        merged.loc[missing, 'Rate'] = merged.loc[missing, 'Currency'].map(earliest)
+
+    merged['Rate'] = merged['Rate'].fillna(1.0)
+    return merged.sort_values('_pos')['Rate'].values
+
+
+def convert_to_base(df, base_currency=BASE_CURRENCY, rates=None):
+    """
+    Convert transaction amounts to the base currency in one vectorized pass
+
+    Args:
+        df: Transaction DataFrame with Date, Amount and optional Currency
+        base_currency: Target currency code
+        rates: Optional rate table (defaults to load_rate_table())
+
+    Returns:
+        pd.Series: Amounts in base_currency, aligned with df.index
+    """
+    base_currency = parse_currency_code(base_currency)
+    amounts = pd.to_numeric(df['Amount'], errors='coerce')
+
+    if 'Currency' not in df.columns:
+        currencies = pd.Series(BASE_CURRENCY, index=df.index)
+    else:
+        currencies = df['Currency'].fillna(BASE_CURRENCY).astype(str).str.upper()
+
+    # Fast path: nothing to convert
+    if (currencies == base_currency).all():
+        return amounts
+
+    if rates is None:
+        rates = load_rate_table()
+
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    to_inr = _rates_as_of(dates, currencies, rates)
+
+    if base_currency == BASE_CURRENCY:
+        return amounts * to_inr
+
+    base_to_inr = _rates_as_of(dates, pd.Series(base_currency, index=df.index), rates)
+    return amounts * to_inr / base_to_inr
@@ -0,0 +1,189 @@
+import difflib
+import pandas as pd
+
+# The same transaction seen in two sources (bank PDF, UPI screenshot) can
+# be booked a day apart; genuine repeats (two coffees on one day) differ
+# in reference number or are simply more numerous than existing matches.
+DATE_WINDOW_DAYS = 1
+DAY_SHIFT_PENALTY = 0.1
+MIN_MATCH_CONFIDENCE = 0.6
+# Similarity assumed when neither side has a usable merchant name
+UNKNOWN_MERCHANT_SIMILARITY = 0.7
+
+MATCH_COLUMNS = ['New_Index', 'Existing_Index', 'Confidence', 'Similarity', 'Day_Shift', 'Reason']
+
+
+def normalize_ids(ids):
+    """
+    Canonical form of Transaction_IDs, so the same reference compares equal
+
+    Numeric IDs read from CSV without a dtype come back as floats
+    ("412345678901.0"), and may have been stored that way.
+
+    Args:
+        ids: Series of Transaction_IDs
+
+    Returns:
+        pd.Series: Stripped IDs without a trailing '.0', None where blank
+    """
+    ids = ids.astype('string').str.strip().str.replace(r'\.0$', '', regex=True)
+    return ids.astype(object).where(ids.fillna('').ne(''), None)
+
+
+def match_frame(df):
+    """
+    Reduce transactions to the fields duplicates are matched on
+
+    A precomputed 'Merchant' column is used as-is; otherwise merchants
+    are canonicalized from Particulars.
+
+    Args:
+        df: Transaction DataFrame
+
+    Returns:
+        pd.DataFrame: Day, Cents, Currency, Merchant, Transaction_ID indexed
+                      like df (rows without Date or Amount dropped)
+    """
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    amounts = pd.to_numeric(df['Amount'], errors='coerce')
+    valid = dates.notna() & amounts.notna()
+
+    if 'Merchant' in df.columns:
+        merchants = df.loc[valid, 'Merchant'].fillna('').astype(str)
+    else:
+        from processor import canonical_merchants
+        merchants = canonical_merchants(df.loc[valid, 'Particulars'])
+
+    ids = normalize_ids(df.loc[valid, 'Transaction_ID']) if 'Transaction_ID' in df.columns else None
+
+    return pd.DataFrame({
+        'Day': (dates[valid] - pd.Timestamp('1970-01-01')).dt.days.astype('int64'),
+        'Cents': (amounts[valid] * 100).round().astype('int64'),
+        'Currency': df.loc[valid, 'Currency'].fillna('').astype(str).str.upper() if 'Currency' in df.columns else '',
+        'Merchant': merchants,
+        'Transaction_ID': ids
+    }, index=df.index[valid])
+
+
+def merchant_similarity(a, b):
+    """
+    Similarity of two canonical merchant names, 0.0 to 1.0
+
+    Args:
+        a: Canonical merchant name
+        b: Canonical merchant name
+
+    Returns:
+        float: 1.0 for identical names
+    """
+    if not a and not b:
+        return UNKNOWN_MERCHANT_SIMILARITY
+    if not a or not b:
+        return 0.0
+    a, b = a.lower(), b.lower()
+    if a == b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def match_duplicates(new_df, existing_df, date_window=DATE_WINDOW_DAYS, min_confidence=MIN_MATCH_CONFIDENCE):
+    """
+    Pair new transactions with the existing transactions they duplicate
+
+    Candidates come from two blocks: equal Transaction_IDs, and equal
+    amounts within date_window days of each other. Only candidates are
+    compared, so cost grows with the number of rows, not row pairs.
+    Within the amount block, rows with different Transaction_IDs or
+    currencies never match, and confidence is the merchant similarity
+    reduced by DAY_SHIFT_PENALTY per day of shift. Pairs are assigned
+    one-to-one, most confident first, so two genuine same-day purchases
+    only lose the one that already exists.
+
+    Args:
+        new_df: Incoming transactions
+        existing_df: Transactions already stored (or candidates of them)
+        date_window: Largest date shift, in days, between duplicates
+        min_confidence: Lowest confidence reported as a match
+
+    Returns:
+        pd.DataFrame: One row per match (MATCH_COLUMNS); New_Index and
+                      Existing_Index are index labels of the inputs
+    """
+    if new_df is None or existing_df is None or new_df.empty or existing_df.empty:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    new = match_frame(new_df).rename_axis('New_Index').reset_index()
+
+    # Only existing rows sharing an amount or a Transaction_ID can match;
+    # filtering first keeps merchant canonicalization off the full history
+    cents = (pd.to_numeric(existing_df['Amount'], errors='coerce') * 100).round()
+    related = cents.isin(new['Cents'])
+    if 'Transaction_ID' in existing_df.columns:
+        related |= normalize_ids(existing_df['Transaction_ID']).isin(new['Transaction_ID'].dropna())
+    existing = match_frame(existing_df[related]).rename_axis('Existing_Index').reset_index()
+    if existing.empty:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    candidates = []
+
+    # Same reference number: the same transaction whatever the other fields say
+    with_ids = existing.dropna(subset=['Transaction_ID'])
+    if not with_ids.empty:
+        by_id = new.dropna(subset=['Transaction_ID']).merge(with_ids, on='Transaction_ID', suffixes=('', '_e'))
+        if not by_id.empty:
+            candidates.append(pd.DataFrame({
+                'New_Index': by_id['New_Index'], 'Existing_Index': by_id['Existing_Index'],
+                'Confidence': 1.0, 'Similarity': 1.0, 'Day_Shift': (by_id['Day'] - by_id['Day_e']).abs(),
+                'Reason': 'transaction_id'
+            }))
+
+    # Same amount within the date window: expand new rows over the shifts
+    shifted = pd.concat([new.assign(Day=new['Day'] + shift, Day_Shift=abs(shift))
+                         for shift in range(-date_window, date_window + 1)], ignore_index=True)
+    block = shifted.merge(existing, on=['Day', 'Cents'], suffixes=('', '_e'))
+
+    both_ids = block['Transaction_ID'].notna() & block['Transaction_ID_e'].notna()
+    block = block[~both_ids & ((block['Currency'] == block['Currency_e']) |
+                               (block['Currency'] == '') | (block['Currency_e'] == ''))]
+    if not block.empty:
+        similarity = pd.Series([merchant_similarity(a, b) for a, b in zip(block['Merchant'], block['Merchant_e'])],
+                               index=block.index)
+        candidates.append(pd.DataFrame({
+            'New_Index': block['New_Index'], 'Existing_Index': block['Existing_Index'],
+            'Confidence': (similarity * (1 - DAY_SHIFT_PENALTY * block['Day_Shift'])).round(3),
+            'Similarity': similarity.round(3), 'Day_Shift': block['Day_Shift'], 'Reason': 'amount_date_merchant'
+        }))
+
+    candidates = [c for c in candidates if not c.empty]
+    if not candidates:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    ranked = pd.concat(candidates, ignore_index=True)
+    ranked = ranked[ranked['Confidence'] >= min_confidence]
+    # Reference-number matches claim their rows before fuzzy ones
+    ranked = ranked.assign(By_ID=ranked['Reason'] == 'transaction_id').sort_values(
+        ['Confidence', 'By_ID', 'Day_Shift'], ascending=[False, False, True], kind='stable')
+
+    used_new, used_existing, keep = set(), set(), []
+    for position, new_index, existing_index in zip(range(len(ranked)), ranked['New_Index'], ranked['Existing_Index']):
+        if new_index in used_new or existing_index in used_existing:
+            continue
+        used_new.add(new_index)
+        used_existing.add(existing_index)
+        keep.append(position)
+    return ranked.iloc[keep][MATCH_COLUMNS].reset_index(drop=True)
+
+
+def duplicate_mask(new_df, existing_df, **kwargs):
+    """
+    Which new transactions duplicate existing ones
+
+    Args:
+        new_df: Incoming transactions
+        existing_df: Transactions already stored
+        **kwargs: Passed to match_duplicates()
+
+    Returns:
+        pd.Series: Boolean mask aligned with new_df
+    """
+    matches = match_duplicates(new_df, existing_df, **kwargs)
+    return pd.Series(new_df.index.isin(matches['New_Index']), index=new_df.index)
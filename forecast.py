@@ -0,0 +1,354 @@
+# Daily balance projection: recurring debits and credits are laid out on
+# their expected dates, and discretionary spend (everything not recurring)
+# follows a seasonal baseline. Benchmark with:
+#
+#     python forecast.py --benchmark
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from caching import BoundedCache
+from currency import BASE_CURRENCY, convert_to_base
+from metrics import timed
+from processor import canonical_merchants
+
+HORIZONS = [30, 60, 90]
+# Recent days the baseline level is estimated from; longer histories only
+# shape the weekday and month-of-year profile
+LEVEL_DAYS = 90
+PROFILE_DAYS = 3 * 365
+# Month-of-year effects are trusted fully after this many years of history
+SEASONAL_YEARS = 2
+# Two-sided 80% band for the accumulated discretionary error
+BAND_Z = 1.2816
+HISTORY_DAYS = 60
+
+FORECAST_COLUMNS = ['Date', 'Recurring', 'Discretionary', 'Balance', 'Lower', 'Upper', 'Projected']
+
+# Finished forecasts, namespaced by user and versioned by data version and date
+FORECAST_CACHE_BYTES = 32 * 1024 * 1024
+forecast_cache = BoundedCache('forecasts', max_bytes=FORECAST_CACHE_BYTES)
+
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def _days(values):
+    """Days since the epoch as int64 for datetime-like values"""
+    return (np.asarray(values, dtype='datetime64[D]') - _EPOCH).astype(np.int64)
+
+
+def to_flows(df, base_currency=BASE_CURRENCY):
+    """
+    Reduce transactions to their day, merchant, direction and amount
+
+    Args:
+        df: Transaction DataFrame
+        base_currency: Currency amounts are reported in
+
+    Returns:
+        pd.DataFrame: Day (days since the epoch), Merchant (categorical),
+                      Debit, Amount; rows without a date or amount dropped
+    """
+    if df is None or df.empty:
+        return pd.DataFrame({'Day': pd.Series(dtype='int64'), 'Merchant': pd.Categorical([]),
+                             'Debit': pd.Series(dtype=bool), 'Amount': pd.Series(dtype=float)})
+
+    amounts = convert_to_base(df, base_currency)
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    valid = amounts.notna() & dates.notna()
+    return pd.DataFrame({
+        'Day': _days(dates[valid].to_numpy(dtype='datetime64[D]')),
+        'Merchant': pd.Categorical(canonical_merchants(df.loc[valid, 'Particulars'])),
+        'Debit': (amounts[valid] < 0).to_numpy(),
+        'Amount': amounts[valid].to_numpy(dtype=np.float64)
+    })
+
+
+def _weekday(days):
+    """Monday=0 weekday of epoch days (1970-01-01 was a Thursday)"""
+    return (days + 3) % 7
+
+
+def _month(days):
+    """Zero-based calendar month of epoch days"""
+    return (days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12)
+
+
+def seasonal_profile(first_day, discretionary, today):
+    """
+    Weekday and month-of-year factors of discretionary spend
+
+    Factors are ratios to the mean day and shrink towards 1 when there is
+    too little history to support them.
+
+    Returns:
+        tuple: (weekday_factors[7], month_factors[12])
+    """
+    start = max(first_day, today - PROFILE_DAYS)
+    days = np.arange(start, today, dtype=np.int64)
+    spend = discretionary[start - first_day:today - first_day]
+    weekday_factors, month_factors = np.ones(7), np.ones(12)
+    mean = spend.mean() if len(spend) else 0.0
+    if mean == 0:
+        return weekday_factors, month_factors
+
+    weekdays = _weekday(days)
+    counts = np.bincount(weekdays, minlength=7)
+    sums = np.bincount(weekdays, weights=spend, minlength=7)
+    weeks = len(spend) / 7
+    weight = min(1.0, weeks / 8)
+    weekday_factors = np.where(counts > 0, 1 + weight * (sums / np.maximum(counts, 1) / mean - 1), 1.0)
+
+    months = _month(days)
+    counts = np.bincount(months, minlength=12)
+    sums = np.bincount(months, weights=spend, minlength=12)
+    weight = min(1.0, len(spend) / 365 / SEASONAL_YEARS) if len(spend) >= 365 else 0.0
+    month_factors = np.where(counts > 0, 1 + weight * (sums / np.maximum(counts, 1) / mean - 1), 1.0)
+    return weekday_factors, month_factors
+
+
+def recurring_schedule(patterns, start, horizon):
+    """
+    Recurring flows on each day of the horizon
+
+    Patterns missing more than two cycles are treated as cancelled, as in
+    RecurringDetector.upcoming(); overdue ones roll to their next cycle.
+    Monthly patterns keep their day of the month (clipped to short months)
+    instead of drifting by their median interval.
+
+    Args:
+        patterns: RecurringDetector.patterns
+        start: First forecast day (days since the epoch)
+        horizon: Number of days
+
+    Returns:
+        np.ndarray: Signed amount per day
+    """
+    if patterns is None or patterns.empty:
+        return np.zeros(horizon)
+
+    interval = np.maximum(patterns['Interval_Days'].to_numpy(dtype=np.float64).round(), 1).astype(np.int64)
+    last = _days(patterns['Last_Date'].to_numpy(dtype='datetime64[D]'))
+    following = _days(patterns['Next_Date'].to_numpy(dtype='datetime64[D]'))
+    amount = patterns['Amount'].to_numpy(dtype=np.float64)
+
+    monthly = (patterns['Period'] == 'Monthly').to_numpy()
+
+    active = last + 2 * interval >= start - 1
+    schedule = np.zeros(horizon)
+
+    periodic = active & ~monthly
+    if periodic.any():
+        behind = np.ceil(np.maximum(start - following[periodic], 0) / interval[periodic]).astype(np.int64)
+        first = following[periodic] + behind * interval[periodic]
+        cycles = np.arange(horizon // int(interval[periodic].min()) + 1)
+        dates = first[:, None] + cycles[None, :] * interval[periodic][:, None] - start
+        weights = np.broadcast_to(amount[periodic][:, None], dates.shape)
+        inside = (dates >= 0) & (dates < horizon)
+        schedule += np.bincount(dates[inside], weights=weights[inside], minlength=horizon)
+
+    monthly &= active
+    if monthly.any():
+        last_dates = last[monthly].astype('datetime64[D]')
+        last_months = last_dates.astype('datetime64[M]')
+        day_of_month = (last_dates - last_months.astype('datetime64[D]')).astype(np.int64)
+        end_month = np.datetime64(start + horizon, 'D').astype('datetime64[M]')
+        cycles = np.arange(1, int((end_month - last_months.min()).astype(np.int64)) + 1)
+        months = last_months[:, None] + cycles[None, :]
+        month_ends = (months + 1).astype('datetime64[D]') - 1
+        dates = np.minimum(months.astype('datetime64[D]') + day_of_month[:, None], month_ends)
+        dates = (dates - _EPOCH).astype(np.int64) - start
+        weights = np.broadcast_to(amount[monthly][:, None], dates.shape)
+        inside = (dates >= 0) & (dates < horizon)
+        schedule += np.bincount(dates[inside], weights=weights[inside], minlength=horizon)
+    return schedule
+
+
+def daily_flows(flows, patterns, today):
+    """
+    Per-day net flow and discretionary spend up to today
+
+    Args:
+        flows: Output of to_flows()
+        patterns: RecurringDetector.patterns (debits of their merchants are
+                  not discretionary)
+        today: Last day (days since the epoch); later flows are ignored
+
+    Returns:
+        tuple: (first_day, net, discretionary) with one value per day from
+               first_day through today; discretionary spend is negative
+    """
+    flows = flows[flows['Day'].to_numpy() <= today]
+    if flows.empty:
+        return today, np.zeros(1), np.zeros(1)
+
+    days = flows['Day'].to_numpy()
+    amounts = flows['Amount'].to_numpy()
+    debit = flows['Debit'].to_numpy()
+    if patterns is not None and not patterns.empty:
+        recurring_debits = patterns.loc[patterns['Direction'] == 'debit', 'Merchant']
+        debit = debit & ~flows['Merchant'].isin(recurring_debits).to_numpy()
+
+    first_day = int(days.min())
+    length = today - first_day + 1
+    net = np.bincount(days - first_day, weights=amounts, minlength=length)
+    discretionary = np.bincount(days[debit] - first_day, weights=amounts[debit], minlength=length)
+    return first_day, net, discretionary
+
+
+class CashFlowModel:
+    """
+    Daily cash-flow history and forecaster
+
+    Keeps transactions reduced to (day, merchant, debit, amount), so each
+    forecast is a handful of vectorized passes over the history.
+    """
+
+    def __init__(self, df=None, base_currency=BASE_CURRENCY):
+        self.base_currency = base_currency
+        self.flows = to_flows(df, base_currency)
+
+    def update(self, new_df):
+        """
+        Fold newly added transactions into the history
+
+        Args:
+            new_df: DataFrame of new transactions only
+        """
+        new_flows = to_flows(new_df, self.base_currency)
+        if new_flows.empty:
+            return
+        merchants = pd.Categorical(np.concatenate([self.flows['Merchant'].astype(str).to_numpy(),
+                                                   new_flows['Merchant'].astype(str).to_numpy()]))
+        self.flows = pd.concat([self.flows, new_flows], ignore_index=True)
+        self.flows['Merchant'] = merchants
+
+    @timed('stage.forecast')
+    def forecast(self, patterns, horizon=30, today=None, history_days=HISTORY_DAYS):
+        """
+        Recent and projected daily balance
+
+        The balance is the running net of recorded transactions. Projected
+        discretionary spend is the recent level (LEVEL_DAYS, deseasonalized)
+        times the weekday and month-of-year factors of the target day; the
+        band widens with the square root of the days ahead.
+
+        Args:
+            patterns: RecurringDetector.patterns for the same transactions
+            horizon: Days to project after today
+            today: Reference date (defaults to today)
+            history_days: Recorded days included before the projection
+
+        Returns:
+            pd.DataFrame: FORECAST_COLUMNS, one row per day; Projected is
+                          False for recorded days (whose band is the balance)
+        """
+        today = int(_days(pd.Timestamp(today or pd.Timestamp.now()).normalize().to_datetime64()))
+        first_day, net, discretionary = daily_flows(self.flows, patterns, today)
+
+        balance = np.cumsum(net)
+        history_start = max(first_day, today - history_days + 1)
+        history = balance[history_start - first_day:]
+        history_dates = np.arange(history_start, today + 1, dtype=np.int64)
+
+        days = np.arange(today + 1, today + 1 + horizon, dtype=np.int64)
+        weekday_factors, month_factors = seasonal_profile(first_day, discretionary, today + 1)
+
+        level_start = max(first_day, today + 1 - LEVEL_DAYS)
+        level_days = np.arange(level_start, today + 1, dtype=np.int64)
+        level_spend = discretionary[level_start - first_day:]
+        expected = weekday_factors[_weekday(level_days)] * month_factors[_month(level_days)]
+        level = level_spend.sum() / expected.sum()
+        sigma = (level_spend - level * expected).std() if len(level_spend) > 1 else 0.0
+
+        projected_spend = level * weekday_factors[_weekday(days)] * month_factors[_month(days)]
+        projected_recurring = recurring_schedule(patterns, today + 1, horizon)
+        projected = balance[-1] + np.cumsum(projected_recurring + projected_spend)
+        band = BAND_Z * sigma * np.sqrt(np.arange(1, horizon + 1))
+
+        return pd.DataFrame({
+            'Date': np.concatenate([history_dates, days]).astype('datetime64[D]').astype('datetime64[ns]'),
+            'Recurring': np.concatenate([np.zeros(len(history)), projected_recurring]).round(2),
+            'Discretionary': np.concatenate([np.zeros(len(history)), projected_spend]).round(2),
+            'Balance': np.concatenate([history, projected]).round(2),
+            'Lower': np.concatenate([history, projected - band]).round(2),
+            'Upper': np.concatenate([history, projected + band]).round(2),
+            'Projected': np.concatenate([np.zeros(len(history), dtype=bool), np.ones(horizon, dtype=bool)])
+        }, columns=FORECAST_COLUMNS)
+
+
+def synthetic_history(years=5, per_day=10, seed=0):
+    """
+    Transaction history with salary, rent, subscriptions and daily spend
+
+    Returns:
+        pd.DataFrame: Transactions ending today
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.now().normalize()
+    days = pd.date_range(end - pd.DateOffset(years=years), end, freq='D')
+    month_starts = days[days.day == 1]
+
+    spend_dates = np.repeat(days.to_numpy(), rng.poisson(per_day, len(days)))
+    merchants = np.array(['SWIGGY', 'ZOMATO', 'UBER', 'AMAZON', 'DMART', 'BIGBASKET', 'OLA', 'CAFE COFFEE DAY'])
+    frames = [
+        pd.DataFrame({'Date': spend_dates,
+                      'Particulars': 'UPI/' + rng.choice(merchants, len(spend_dates)) + '/' +
+                                     rng.integers(10**8, 10**9, len(spend_dates)).astype(str),
+                      'Amount': -rng.gamma(2.0, 250.0, len(spend_dates)).round(2), 'Category': 'Food'}),
+        pd.DataFrame({'Date': month_starts, 'Particulars': 'NEFT SALARY TECH CORP', 'Amount': 150000.0,
+                      'Category': 'Income'}),
+        pd.DataFrame({'Date': month_starts + pd.Timedelta(days=4), 'Particulars': 'RENT LODHA', 'Amount': -45000.0,
+                      'Category': 'Rent'}),
+        pd.DataFrame({'Date': month_starts + pd.Timedelta(days=9), 'Particulars': 'NETFLIX SUBSCRIPTION',
+                      'Amount': -649.0, 'Category': 'Entertainment'})
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    df['Currency'] = BASE_CURRENCY
+    return df[df['Date'] <= end].sort_values('Date').reset_index(drop=True)
+
+
+def benchmark(years=5, per_day=10, horizon=90, repeats=20):
+    """
+    Time CashFlowModel.forecast() on a synthetic history
+
+    The model and recurring patterns are built once beforehand, as the
+    app keeps both cached per user.
+
+    Returns:
+        dict: rows, patterns and median/max milliseconds per forecast
+    """
+    from recurring import RecurringDetector
+    df = synthetic_history(years, per_day)
+    patterns = RecurringDetector(df).patterns
+    model = CashFlowModel(df)
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.forecast(patterns, horizon)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {'rows': len(df), 'patterns': len(patterns),
+            'median_ms': float(np.median(timings)), 'max_ms': float(np.max(timings))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cash-flow forecast benchmark")
+    parser.add_argument('--benchmark', action='store_true', help="Time forecasts on a synthetic history")
+    parser.add_argument('--years', type=int, default=5, help="Years of synthetic history")
+    parser.add_argument('--per-day', type=int, default=10, help="Average transactions per day")
+    parser.add_argument('--horizon', type=int, default=90, help="Days to forecast")
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        parser.print_help()
+        return 0
+
+    result = benchmark(args.years, args.per_day, args.horizon)
+    print(f"{result['rows']} transaction(s), {result['patterns']} recurring pattern(s), "
+          f"{args.horizon}-day forecast: median {result['median_ms']:.1f} ms, max {result['max_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import pandas as pd
+from currency import BASE_CURRENCY, convert_to_base
+
+# Rule types a goal can be linked to
+RULE_TYPES = {
+    'manual': 'Manual',
+    'category': 'Category',
+    'keyword': 'Keyword',
+    'account': 'Savings Account'
+}
+
+# Window used to measure recent savings velocity
+VELOCITY_WINDOW_DAYS = 90
+
+
+def match_rule(rule, df):
+    """
+    Vectorized mask of transactions that count towards a goal
+
+    Args:
+        rule: dict with 'type' (see RULE_TYPES) and 'value'
+        df: Transaction DataFrame
+
+    Returns:
+        pd.Series: Boolean mask aligned with df.index
+    """
+    rule = rule or {}
+    rule_type = rule.get('type', 'manual')
+    value = str(rule.get('value') or '').strip()
+
+    if df.empty or rule_type == 'manual' or not value:
+        return pd.Series(False, index=df.index)
+
+    if rule_type == 'category':
+        return df['Category'].fillna('').str.lower() == value.lower()
+
+    # Keywords and savings accounts (name or number) are matched in Particulars
+    return df['Particulars'].fillna('').astype(str).str.contains(value, case=False, regex=False)
+
+
+def contributions(rule, df, amounts):
+    """
+    Daily contributions to a goal from matching transactions
+
+    Money moving out to the goal (debits) counts as a contribution;
+    matching credits count as withdrawals.
+
+    Args:
+        rule: Goal rule dict
+        df: Transaction DataFrame
+        amounts: Amounts in the base currency, aligned with df.index
+
+    Returns:
+        pd.Series: Contribution totals indexed by day
+    """
+    if df is None or df.empty:
+        return pd.Series(dtype=float)
+
+    mask = match_rule(rule, df)
+    if not mask.any():
+        return pd.Series(dtype=float)
+
+    days = pd.to_datetime(df.loc[mask, 'Date'], errors='coerce').dt.normalize()
+    return (-amounts[mask]).groupby(days).sum()
+
+
+class GoalTracker:
+    """
+    Running per-goal contribution aggregates
+
+    Each tracked goal keeps a daily contribution series and a running
+    total, so progress is read in O(1) and new transactions only touch
+    the new rows.
+    """
+
+    def __init__(self, goals, df=None, base_currency=BASE_CURRENCY):
+        self.base_currency = base_currency
+        self.daily = {}
+        self.totals = {}
+        amounts = convert_to_base(df, base_currency) if df is not None and not df.empty else None
+        for goal in goals:
+            self._track(goal, df, amounts)
+
+    def _track(self, goal, df, amounts):
+        daily = contributions(goal.get('rule'), df, amounts) if amounts is not None else pd.Series(dtype=float)
+        self.daily[goal['id']] = daily
+        self.totals[goal['id']] = float(daily.sum())
+
+    def track(self, goal, df):
+        """
+        Start tracking a goal, scanning existing history once
+
+        Args:
+            goal: Goal dict
+            df: Transaction DataFrame of existing history
+        """
+        amounts = convert_to_base(df, self.base_currency) if df is not None and not df.empty else None
+        self._track(goal, df, amounts)
+
+    def untrack(self, goal_id):
+        """Stop tracking a goal"""
+        self.daily.pop(goal_id, None)
+        self.totals.pop(goal_id, None)
+
+    def update(self, goals, new_df):
+        """
+        Fold newly added transactions into every tracked goal
+
+        Args:
+            goals: List of goal dicts
+            new_df: DataFrame of new transactions only
+        """
+        if new_df is None or new_df.empty:
+            return
+        amounts = convert_to_base(new_df, self.base_currency)
+        for goal in goals:
+            new_daily = contributions(goal.get('rule'), new_df, amounts)
+            if new_daily.empty:
+                continue
+            daily = self.daily.get(goal['id'], pd.Series(dtype=float))
+            self.daily[goal['id']] = daily.add(new_daily, fill_value=0) if not daily.empty else new_daily
+            self.totals[goal['id']] = self.totals.get(goal['id'], 0.0) + float(new_daily.sum())
+
+    def progress(self, goal, today=None, window_days=VELOCITY_WINDOW_DAYS):
+        """
+        Current progress, savings velocity and projected completion date
+
+        Args:
+            goal: Goal dict with 'id', 'target' and optional 'start_amount'
+            today: Reference date (defaults to today)
+            window_days: Days of history used for the velocity estimate
+
+        Returns:
+            dict: current, target, pct, velocity (per day), projected_date
+        """
+        today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        target = float(goal.get('target', 0))
+        current = float(goal.get('start_amount', 0)) + self.totals.get(goal['id'], 0.0)
+
+        daily = self.daily.get(goal['id'], pd.Series(dtype=float))
+        window_start = today - pd.Timedelta(days=window_days)
+        recent = daily[daily.index > window_start].sum() if not daily.empty else 0.0
+        velocity = float(recent) / window_days
+
+        remaining = target - current
+        if remaining <= 0:
+            projected_date = today
+        elif velocity > 0:
+            projected_date = today + pd.Timedelta(days=int(-(-remaining // velocity)))
+        else:
+            projected_date = None
+
+        return {
+            'current': round(current, 2),
+            'target': target,
+            'pct': (current / target) * 100 if target > 0 else 0,
+            'velocity': round(velocity, 2),
+            'projected_date': projected_date
+        }
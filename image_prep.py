@@ -0,0 +1,179 @@
+import io
+import numpy as np
+from lazy_imports import load_module
+from metrics import timed
+
+# Long side of a screenshot after downsizing; receipt text stays legible
+MAX_DIMENSION = 1600
+# Portrait shots taller than this aspect ratio are treated as phone
+# screenshots and lose their status bar
+PHONE_ASPECT_RATIO = 1.6
+STATUS_BAR_FRACTION = 0.035
+# Grey levels a pixel may differ from the background and still count as blank
+WHITESPACE_TOLERANCE = 12
+WHITESPACE_PADDING = 8
+JPEG_QUALITY = 85
+# Shots are compared over the box holding all but ALIGN_QUANTILE of their
+# ink on each side, found to a fraction of a pixel, so a re-encoded or
+# resized copy (whose crop starts on a different pixel) still lines up.
+# Ink is any pixel INK_TOLERANCE grey levels away from the background.
+ALIGN_QUANTILE = 0.02
+INK_TOLERANCE = 24
+# 16x16 difference hash (256 bits); shots within this many differing bits
+# are duplicate candidates
+HASH_SIZE = 16
+DUPLICATE_DISTANCE = 12
+# Candidates are confirmed block by block at the smaller shot's scale, so
+# screenshots of different payments with the same layout (only the amount
+# differs) are kept
+VERIFY_BLOCK = 4
+VERIFY_TOLERANCE = 72
+
+
+def _crop_whitespace(image):
+    """Trim uniform borders, using the top-left pixel as the background"""
+    image_chops = load_module('PIL.ImageChops')
+    background = load_module('PIL.Image').new('L', image.size, image.getpixel((0, 0)))
+    diff = image_chops.difference(image, background).point(lambda v: 255 if v > WHITESPACE_TOLERANCE else 0)
+    bbox = diff.getbbox()
+    if bbox is None:
+        return image
+    left, top, right, bottom = bbox
+    return image.crop((max(0, left - WHITESPACE_PADDING), max(0, top - WHITESPACE_PADDING),
+                       min(image.width, right + WHITESPACE_PADDING), min(image.height, bottom + WHITESPACE_PADDING)))
+
+
+def _encode(image):
+    """Re-encode as PNG or JPEG, whichever is smaller, and reopen it"""
+    image_module = load_module('PIL.Image')
+    png, jpeg = io.BytesIO(), io.BytesIO()
+    image.save(png, format='PNG', optimize=True)
+    image.save(jpeg, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    best = min(png, jpeg, key=lambda buffer: buffer.tell())
+    best.seek(0)
+    return image_module.open(best), best.getbuffer().nbytes
+
+
+@timed('stage.image_prep')
+def preprocess_image(source):
+    """
+    Shrink a screenshot before it is sent to the model
+
+    Converts to grayscale, crops the phone status bar and blank margins,
+    downsizes to MAX_DIMENSION and re-encodes compactly.
+
+    Args:
+        source: File-like object or PIL image
+
+    Returns:
+        tuple: (image, size_in_bytes) of the re-encoded PIL image
+    """
+    image_module = load_module('PIL.Image')
+    image = source if isinstance(source, image_module.Image) else image_module.open(source)
+    image = load_module('PIL.ImageOps').exif_transpose(image).convert('L')
+
+    if image.height / max(image.width, 1) >= PHONE_ASPECT_RATIO:
+        image = image.crop((0, int(image.height * STATUS_BAR_FRACTION), image.width, image.height))
+    image = _crop_whitespace(image)
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), image_module.LANCZOS)
+    return _encode(image)
+
+
+def _ink_box(image):
+    """
+    Box around the bulk of an image's ink, to a fraction of a pixel
+
+    Each edge is where ALIGN_QUANTILE of the ink lies beyond it, so the
+    box follows the content rather than where a crop happened to start.
+    The background is the most common grey level, so dark mode works too.
+
+    Args:
+        image: PIL image in mode 'L'
+
+    Returns:
+        tuple: (left, top, right, bottom); the whole image if it is blank
+    """
+    grey = np.asarray(image, dtype=np.int16)
+    background = np.bincount(grey.ravel(), minlength=256).argmax()
+    ink = np.clip(np.abs(grey - background) - INK_TOLERANCE, 0, None).astype(np.float64)
+    if not ink.any():
+        return 0, 0, image.width, image.height
+
+    def edges(profile):
+        share = np.cumsum(profile) / profile.sum()
+        centers = np.arange(len(profile)) + 0.5
+        low, high = np.interp([ALIGN_QUANTILE, 1 - ALIGN_QUANTILE], share, centers)
+        # At least a pixel wide, and inside the image
+        middle = (low + high) / 2
+        low, high = min(low, middle - 0.5), max(high, middle + 0.5)
+        return max(0.0, low), min(float(len(profile)), high)
+
+    left, right = edges(ink.sum(axis=0))
+    top, bottom = edges(ink.sum(axis=1))
+    return left, top, right, bottom
+
+
+def perceptual_hash(image):
+    """
+    Difference hash of an image's content (see _ink_box)
+
+    Args:
+        image: PIL image
+
+    Returns:
+        int: HASH_SIZE * HASH_SIZE bit hash; similar images differ in few bits
+    """
+    image_module = load_module('PIL.Image')
+    image = image.convert('L')
+    small = image.resize((HASH_SIZE + 1, HASH_SIZE), image_module.LANCZOS, box=_ink_box(image))
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def hash_distance(a, b):
+    """Number of differing bits between two perceptual hashes"""
+    return bin(a ^ b).count('1')
+
+
+def same_content(a, b):
+    """
+    Whether two images match in every block, not just on average
+
+    Both are resampled over their ink boxes to the smaller one's scale.
+    Re-encoding and resizing noise is spread thin; a changed digit
+    concentrates in a few blocks, so the largest block-mean difference
+    tells them apart.
+    """
+    image_module = load_module('PIL.Image')
+    small, large = sorted((a.convert('L'), b.convert('L')), key=lambda image: image.width * image.height)
+    small_box, large_box = _ink_box(small), _ink_box(large)
+    size = (max(VERIFY_BLOCK, round(small_box[2] - small_box[0])),
+            max(VERIFY_BLOCK, round(small_box[3] - small_box[1])))
+    a = small.resize(size, image_module.LANCZOS, box=small_box)
+    b = large.resize(size, image_module.LANCZOS, box=large_box)
+    diff = load_module('PIL.ImageChops').difference(a, b).reduce(VERIFY_BLOCK)
+    return diff.getextrema()[1] <= VERIFY_TOLERANCE
+
+
+def find_duplicate(image, image_hash, seen, max_distance=DUPLICATE_DISTANCE):
+    """
+    Index of the first earlier image that is near-identical to image
+
+    Args:
+        image: The new (preprocessed) PIL image
+        image_hash: perceptual_hash(image)
+        seen: List of (index, hash, image) tuples of earlier images
+        max_distance: Largest bit distance counted as a candidate
+
+    Returns:
+        int or None: Index of the matching earlier image
+    """
+    for index, seen_hash, seen_image in seen:
+        if hash_distance(image_hash, seen_hash) <= max_distance and same_content(image, seen_image):
+            return index
+    return None
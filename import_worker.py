@@ -0,0 +1,208 @@
+# Import workers for uploaded statements:
+#
+#     python import_worker.py --workers 4
+#
+# The app queues every "Analyze" click as an import job on the shared job
+# queue (see state.py) instead of parsing in the web process. Workers claim
+# jobs, run the Upload tab's pipeline (AI extraction for PDFs and
+# screenshots, streaming for large CSV exports), dedup against the user's
+# store under the user's write lock and append the new rows; app replicas
+# pick them up on their next sync. Run with the same STATE_BACKEND (and
+# REDIS_URL) as the app, and GEMINI_API_KEY set. With the local backend the
+# app also runs EMBEDDED_IMPORT_WORKERS (default 1) worker threads itself.
+import io
+import os
+import sys
+import time
+import base64
+import socket
+import argparse
+import threading
+from multiprocessing import Process
+
+import processor
+import state
+from ai_client import AIError
+from metrics import timed
+from storage import DedupIndex
+
+JOB_KIND = 'import'
+# Seconds a worker waits for a job before checking whether to stop
+CLAIM_SECONDS = 5
+EMBEDDED_WORKERS = int(os.environ.get('EMBEDDED_IMPORT_WORKERS', 0 if state.is_networked() else 1))
+
+
+class JobFile(io.BytesIO):
+    """An uploaded file carried by a job, shaped like a Streamlit UploadedFile"""
+
+    def __init__(self, name, type, data):
+        super().__init__(data)
+        self.name = name
+        self.type = type
+        self.size = len(data)
+
+
+def submit_import(email, uploaded_files, currency=processor.BASE_CURRENCY):
+    """
+    Queue uploaded files for import into a user's store
+
+    Args:
+        email: Authenticated email of the store's owner
+        uploaded_files: Streamlit uploaded file objects
+        currency: Currency assumed for rows without one
+
+    Returns:
+        str: Job id
+    """
+    files = [{'name': f.name, 'type': f.type, 'data': base64.b64encode(f.getvalue()).decode('ascii')}
+             for f in uploaded_files]
+    return state.job_queue().enqueue(JOB_KIND, {'user': email, 'currency': currency, 'files': files})
+
+
+def _entry(uploaded_file, streamed):
+    return {'file': uploaded_file.name, 'streamed': streamed, 'status': 'ok', 'rows': 0, 'written': 0,
+            'duplicates': 0, 'invalid': 0, 'error': None}
+
+
+@timed('stage.import_job')
+def run_import(payload, api_key=None, store=None):
+    """
+    Import the files of one job into the user's store
+
+    Args:
+        payload: Job payload built by submit_import
+        api_key: Gemini API key for files that need the model
+        store: TransactionStore to write to (defaults to the configured one)
+
+    Returns:
+        list: Stats dict per file, in upload order (file, streamed, status,
+              rows, written, duplicates, invalid, error)
+    """
+    store = store or state.transaction_store()
+    email, currency = payload['user'], payload.get('currency', processor.BASE_CURRENCY)
+    files = [JobFile(f['name'], f['type'], base64.b64decode(f['data'])) for f in payload['files']]
+    # Large structured CSV exports skip the AI and stream straight into the store
+    streamed = [f for f in files if processor.is_streamable_csv(f)]
+    ai_files = [f for f in files if f not in streamed]
+    entries = {id(f): _entry(f, f in streamed) for f in files}
+
+    # Extraction is the slow part and needs no lock
+    parsed = []
+    if ai_files and not api_key:
+        parsed = [AIError("Gemini API key not configured. Set GEMINI_API_KEY in secrets or the environment.")]
+        parsed *= len(ai_files)
+    elif ai_files:
+        parsed = processor.ai_parse_files(ai_files, api_key)
+
+    with store.lock(email):
+        store_path = store.path(email)
+        writer = lambda rows, index: store.append(email, rows, index)
+        for uploaded_file in streamed:
+            entry = entries[id(uploaded_file)]
+            try:
+                stats = processor.process_csv_chunked(uploaded_file, store_path, currency, writer=writer,
+                                                      email=email)
+                entry.update(rows=stats['rows_read'] - stats['invalid'], written=stats['rows_written'],
+                             duplicates=stats['duplicates'], invalid=stats['invalid'])
+            except Exception as e:
+                entry.update(status='error', error=str(e))
+
+        with DedupIndex(store_path) as index:
+            for uploaded_file, csv_text in zip(ai_files, parsed):
+                entry = entries[id(uploaded_file)]
+                if isinstance(csv_text, AIError):
+                    entry.update(status='error', error=str(csv_text))
+                    continue
+                df = processor.process_data(csv_text, currency=currency, email=email)
+                if df.empty:
+                    continue
+                new_rows = df[~index.contains(df)]
+                written = store.append(email, new_rows, index)
+                entry.update(rows=len(df), written=len(written), duplicates=len(df) - len(new_rows))
+
+    return [entries[id(f)] for f in files]
+
+
+def work(name=None, api_key=None, stop=None):
+    """
+    Claim and run import jobs until stop is set
+
+    Args:
+        name: Worker name recorded on claimed jobs
+        api_key: Gemini API key, or a zero-argument callable returning it
+        stop: threading.Event ending the loop (runs forever if omitted)
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    queue = state.job_queue()
+    while stop is None or not stop.is_set():
+        try:
+            job = queue.claim(name, CLAIM_SECONDS)
+        except Exception as e:
+            print(f"Error claiming job: {str(e)}")
+            time.sleep(CLAIM_SECONDS)
+            continue
+        if job is None:
+            continue
+        try:
+            if job['kind'] != JOB_KIND:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            key = api_key() if callable(api_key) else api_key
+            queue.finish(job['id'], result=run_import(job['payload'], key))
+        except Exception as e:
+            print(f"Error running job {job['id']}: {str(e)}")
+            try:
+                queue.finish(job['id'], error=str(e))
+            except Exception as e:
+                print(f"Error finishing job {job['id']}: {str(e)}")
+
+
+# Shared by every session in this process
+_embedded_threads = []
+_embedded_lock = threading.Lock()
+
+
+def start_embedded(count=EMBEDDED_WORKERS, api_key=None):
+    """
+    Run import workers as daemon threads of this process
+
+    For single-machine setups without dedicated workers. Safe to call on
+    every script run; workers are started once.
+
+    Args:
+        count: Worker threads
+        api_key: Gemini API key, or a zero-argument callable returning it
+    """
+    with _embedded_lock:
+        while len(_embedded_threads) < count:
+            thread = threading.Thread(target=work, kwargs={'api_key': api_key},
+                                      name=f"import-worker-{len(_embedded_threads)}", daemon=True)
+            thread.start()
+            _embedded_threads.append(thread)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run PennyWyse import workers")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes (default: 1)")
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get('GEMINI_API_KEY')
+    print(f"{args.workers} import worker(s) on the {state.STATE_BACKEND} backend", flush=True)
+    if args.workers <= 1:
+        work(api_key=api_key)
+        return 0
+
+    processes = [Process(target=work, kwargs={'api_key': api_key}, name=f"import-worker-{i}")
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
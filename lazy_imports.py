@@ -0,0 +1,77 @@
+import time
+import importlib
+import threading
+
+# Modules loaded through this cache, and how long their first import took
+_modules = {}
+_import_times = {}
+_lock = threading.Lock()
+
+
+def load_module(name):
+    """
+    Import a module once, on first need, and keep it in a module-level cache
+
+    Args:
+        name: Dotted module name (e.g. 'plotly.graph_objects')
+
+    Returns:
+        module: The imported module
+
+    Raises:
+        ImportError: If the module is not installed
+    """
+    module = _modules.get(name)
+    if module is not None:
+        return module
+
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(name)
+            _import_times[name] = time.perf_counter() - started
+            _modules[name] = module
+    return module
+
+
+class LazyModule:
+    """
+    Stand-in for a module that imports it on first attribute access
+
+    Lets app.py keep module-style call sites (pd.DataFrame, go.Figure)
+    while deferring the import until a page actually needs it.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attr):
+        return getattr(load_module(self._name), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._name in _modules else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    """
+    Create a lazy stand-in for a module
+
+    Args:
+        name: Dotted module name
+
+    Returns:
+        LazyModule: Proxy that imports the module on first use
+    """
+    return LazyModule(name)
+
+
+def import_timings():
+    """
+    First-import durations of lazily loaded modules (the startup profile)
+
+    Returns:
+        dict: Module name -> seconds, slowest first
+    """
+    return dict(sorted(_import_times.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,235 @@
+import time
+import bisect
+import threading
+import functools
+from collections import OrderedDict
+
+# Histogram buckets grow geometrically from 0.1 ms to about 20 minutes,
+# so percentiles are within ~12% anywhere in that range at a fixed cost
+HISTOGRAM_START = 0.0001
+HISTOGRAM_FACTOR = 1.25
+HISTOGRAM_BUCKETS = 74
+PERCENTILES = (0.5, 0.95, 0.99)
+
+_BOUNDS = [HISTOGRAM_START * HISTOGRAM_FACTOR ** i for i in range(HISTOGRAM_BUCKETS)]
+
+
+class Counter:
+    """Monotonic count"""
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """
+    Current level, either set by its owner or read from a callable
+
+    Args:
+        name: Metric name
+        function: Optional zero-argument callable returning the value
+    """
+
+    def __init__(self, name, function=None):
+        self.name = name
+        self.function = function
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        if self.function is None:
+            return self._value
+        try:
+            return self.function()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {str(e)}")
+            return None
+
+
+class Histogram:
+    """
+    Distribution of observed values (seconds) in fixed log-spaced buckets
+
+    Observing is a bisect and an increment; percentiles are interpolated
+    within their bucket.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.buckets = [0] * (HISTOGRAM_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(_BOUNDS, value)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q):
+        """
+        Approximate q-quantile of the observations
+
+        Returns:
+            float or None: None if nothing was observed
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.buckets):
+                if count and seen + count >= rank:
+                    low = _BOUNDS[index - 1] if index else 0.0
+                    high = _BOUNDS[index] if index < HISTOGRAM_BUCKETS else self.max
+                    return min(low + (high - low) * (rank - seen) / count, self.max)
+                seen += count
+            return self.max
+
+    def summary(self):
+        """
+        Count, mean, max and PERCENTILES
+
+        Returns:
+            dict: name, count, total, mean, max, p50, p95, p99
+        """
+        summary = {'name': self.name, 'count': self.count, 'total': self.total,
+                   'mean': self.total / self.count if self.count else None, 'max': self.max if self.count else None}
+        for q in PERCENTILES:
+            summary[f"p{int(q * 100)}"] = self.percentile(q)
+        return summary
+
+
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms of this process
+
+    Metrics are created on first use, so instrumented modules don't need
+    to declare them up front.
+    """
+
+    def __init__(self):
+        self.counters = OrderedDict()
+        self.gauges = OrderedDict()
+        self.histograms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, table, name, factory):
+        metric = table.get(name)
+        if metric is None:
+            with self._lock:
+                metric = table.get(name)
+                if metric is None:
+                    metric = table[name] = factory()
+        return metric
+
+    def counter(self, name):
+        return self._get(self.counters, name, lambda: Counter(name))
+
+    def gauge(self, name, function=None):
+        """Gauge by name; passing function (re)binds it to a callable"""
+        gauge = self._get(self.gauges, name, lambda: Gauge(name))
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name):
+        return self._get(self.histograms, name, lambda: Histogram(name))
+
+    def snapshot(self, prefix=''):
+        """
+        Current values of metrics whose name starts with prefix
+
+        Returns:
+            dict: counters (name -> value), gauges (name -> value) and
+                  histograms (list of Histogram.summary() dicts)
+        """
+        with self._lock:
+            counters = [c for n, c in self.counters.items() if n.startswith(prefix)]
+            gauges = [g for n, g in self.gauges.items() if n.startswith(prefix)]
+            histograms = [h for n, h in self.histograms.items() if n.startswith(prefix)]
+        return {'counters': {c.name: c.value for c in counters},
+                'gauges': {g.name: g.value for g in gauges},
+                'histograms': [h.summary() for h in histograms]}
+
+
+# Shared by every session in this process
+registry = MetricsRegistry()
+
+
+class timed:
+    """
+    Record the duration of a block or function in a histogram
+
+        with timed('stage.dedup'):
+            ...
+
+        @timed('stage.parse')
+        def process_data(...):
+            ...
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.histogram(self.name).observe(time.perf_counter() - self.started)
+        return False
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                registry.histogram(self.name).observe(time.perf_counter() - started)
+        return wrapper
+
+
+class tracked:
+    """Count a block or function call as in progress on a gauge while it runs"""
+
+    def __init__(self, name):
+        self.gauge = registry.gauge(name)
+
+    def __enter__(self):
+        self.gauge.inc()
+        return self
+
+    def __exit__(self, *exc):
+        self.gauge.dec()
+        return False
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+        return wrapper
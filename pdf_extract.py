@@ -0,0 +1,177 @@
+import io
+import os
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from caching import BoundedCache
+from lazy_imports import load_module
+from metrics import timed
+
+# Pages are fanned out to worker processes in contiguous runs, so each
+# worker opens the document once per run instead of once per page
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', min(4, os.cpu_count() or 1)))
+PAGES_PER_TASK = 4
+# Documents with fewer pages are extracted in-process; a pool round trip
+# costs more than it saves on short statements
+MIN_PARALLEL_PAGES = 8
+# Extracted pages kept across calls: (file hash, page number) -> text
+PAGE_CACHE_SIZE = 2000
+PAGE_CACHE_BYTES = 64 * 1024 * 1024
+
+_page_cache = BoundedCache('pdf_pages', max_items=PAGE_CACHE_SIZE, max_bytes=PAGE_CACHE_BYTES)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _format_table(table):
+    """Render an extracted table as pipe-separated rows"""
+    rows = []
+    for row in table:
+        cells = ['' if cell is None else ' '.join(str(cell).split()) for cell in row]
+        if any(cells):
+            rows.append(' | '.join(cells))
+    return '\n'.join(rows)
+
+
+def _extract_page(page):
+    """Text of one pdfplumber page followed by its tables"""
+    parts = [page.extract_text() or '']
+    for table in page.extract_tables():
+        formatted = _format_table(table)
+        if formatted:
+            parts.append(formatted)
+    return '\n'.join(part for part in parts if part)
+
+
+def _extract_pages(source, page_numbers):
+    """
+    Extract a run of pages (runs in a worker process)
+
+    Args:
+        source: PDF file bytes, or the path of a PDF file
+        page_numbers: Zero-based page numbers to extract
+
+    Returns:
+        list: (page_number, text) tuples
+    """
+    pdfplumber = load_module('pdfplumber')
+    with pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source) as pdf:
+        return [(number, _extract_page(pdf.pages[number])) for number in page_numbers]
+
+
+def _unreadable(error):
+    """
+    ValueError describing why a PDF couldn't be read
+
+    Args:
+        error: Exception raised by pdfplumber (usually wrapping pdfminer's)
+
+    Returns:
+        ValueError: Error to raise instead
+    """
+    reason = error.args[0] if error.args and isinstance(error.args[0], Exception) else error
+    if 'Password' in type(reason).__name__ or 'Encryption' in type(reason).__name__:
+        return ValueError("PDF is password-protected")
+    return ValueError(f"Unreadable PDF: {str(reason) or type(reason).__name__}")
+
+
+def _get_pool():
+    """
+    Shared process pool, started on first parallel extraction
+
+    Workers come from a fork server (or are spawned where that's not
+    available), never forked from this process: the app and import
+    workers are multi-threaded, and a forked child can inherit locks
+    held by other threads and deadlock.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def _reset_pool():
+    """Drop a pool whose worker died, so the next extraction starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def extract_pdf_pages(data):
+    """
+    Extract text and tables from every page of a PDF, in page order
+
+    Pages already extracted for the same file content are served from
+    the page cache; the rest are split into runs and extracted in the
+    process pool (or in-process for short documents).
+
+    Args:
+        data: PDF file bytes
+
+    Returns:
+        list: Text per page, first page first
+
+    Raises:
+        ValueError: If the PDF is damaged, password-protected or not a PDF
+    """
+    pdfplumber = load_module('pdfplumber')
+    file_hash = hashlib.sha256(data).hexdigest()
+    try:
+        with pdfplumber.open(io.BytesIO(data)) as pdf:
+            page_count = len(pdf.pages)
+    except Exception as e:
+        raise _unreadable(e) from e
+
+    pages = [_page_cache.get((file_hash, number)) for number in range(page_count)]
+    missing = [number for number, text in enumerate(pages) if text is None]
+    if not missing:
+        return pages
+
+    if len(missing) < MIN_PARALLEL_PAGES or PDF_WORKERS < 2:
+        try:
+            results = [_extract_pages(data, missing)]
+        except Exception as e:
+            raise _unreadable(e) from e
+    else:
+        runs = [missing[i:i + PAGES_PER_TASK] for i in range(0, len(missing), PAGES_PER_TASK)]
+        # Workers open the document from disk, so it is written once
+        # instead of being pickled into every task
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(data)
+        try:
+            results = list(_get_pool().map(_extract_pages, [f.name] * len(runs), runs))
+        except BrokenProcessPool as e:
+            _reset_pool()
+            raise ValueError(f"PDF extraction worker stopped: {str(e)}") from e
+        except Exception as e:
+            raise _unreadable(e) from e
+        finally:
+            os.remove(f.name)
+
+    for run in results:
+        for number, text in run:
+            pages[number] = text
+            _page_cache.put((file_hash, number), text)
+    return pages
+
+
+@timed('stage.pdf_extract')
+def extract_pdf_text(data):
+    """
+    Extract a PDF as one text document
+
+    Args:
+        data: PDF file bytes
+
+    Returns:
+        str: Page texts joined in page order
+    """
+    return '\n'.join(extract_pdf_pages(data))
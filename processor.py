@@ -1,9 +1,117 @@
 import pandas as pd
 import re
+import hashlib
+from functools import lru_cache
 from io import StringIO
+from caching import BoundedCache, LruCacheCounters
+from currency import BASE_CURRENCY, convert_to_base, parse_currency_code
+from classifier import get_model, MIN_CONFIDENCE
+from ai_client import get_ai_client, AIError, AIRequestError, AIResponseError
+from metrics import timed, tracked
+from pdf_extract import extract_pdf_text
+from image_prep import preprocess_image, perceptual_hash, find_duplicate
+from storage import TRANSACTIONS_PATH, DedupIndex, append_transactions
+from state import shared_cache
+from dedup import duplicate_mask
+
+# Comprehensive prompt for financial document parsing
+EXTRACTION_PROMPT = """
+        Analyze this financial document (bank statement, payment screenshot, or transaction record).
+        
+        Extract ALL transactions and format them as a CSV with these exact columns:
+        Date, Particulars, Category, Amount, Currency, Transaction_ID
+        
+        Instructions:
+        - Date: Format as DD-MM-YYYY
+        - Particulars: Full description of the transaction
+        - Category: Classify as one of: Income, Rent, EMI, Food, Shopping, Transport, Utilities, Entertainment, Healthcare, Other
+        - Amount: Use negative for expenses/debits (e.g., -1500.00), positive for income/credits (e.g., +50000.00)
+        - Currency: ISO code of the amount (INR, USD, EUR or AED); use INR if not shown
+        - Transaction_ID: Extract any reference/transaction number (12-digit or UPI ID)
+        
+        Return ONLY the CSV data, no explanations or markdown formatting.
+        Start directly with the header row.
+        """
+
+# Extra instructions when several documents share one request
+BATCH_PROMPT = EXTRACTION_PROMPT + """
+        You will receive several documents. Each one is preceded by a line "FILE <number>: <name>".
+        Add a first column named File holding that number for every transaction, so the
+        header becomes: File, Date, Particulars, Category, Amount, Currency, Transaction_ID
+        """
+
+# Request packing limits for ai_parse_files
+MAX_FILES_PER_REQUEST = 8
+MAX_REQUEST_BYTES = 15 * 1024 * 1024
+
+IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png']
+
+# Extraction results by model input, so re-uploading a statement (or the
+# same screenshot in another batch) doesn't spend another request. Misses
+# fall through to the shared cache, so other replicas and import workers
+# reuse each other's results.
+AI_CACHE_BYTES = 32 * 1024 * 1024
+AI_CACHE_SECONDS = 24 * 3600
+_response_cache = BoundedCache('ai_responses', max_bytes=AI_CACHE_BYTES, ttl=AI_CACHE_SECONDS)
+
+
+def _file_content(uploaded_file):
+    """
+    Turn an uploaded file into a model input part
+    
+    Args:
+        uploaded_file: Streamlit uploaded file object
+        
+    Returns:
+        tuple: (content, size_in_bytes) where content is a PIL image or text
+    """
+    # Handle different file types
+    if uploaded_file.type in IMAGE_TYPES:
+        # For images (screenshots): grayscale, cropped, downsized and re-encoded
+        return preprocess_image(uploaded_file)
+    
+    if uploaded_file.type == 'application/pdf':
+        # For PDFs: pages (text and tables) are extracted in parallel and cached
+        text = extract_pdf_text(uploaded_file.getvalue())
+    else:
+        # For CSV or other text formats
+        text = uploaded_file.read().decode('utf-8')
+    
+    return text, len(text.encode('utf-8'))
+
+
+def _content_key(content):
+    """Digest of a model input part (text or PIL image) and the prompt"""
+    digest = hashlib.sha256(EXTRACTION_PROMPT.encode('utf-8'))
+    if isinstance(content, str):
+        digest.update(content.encode('utf-8'))
+    else:
+        digest.update(f"{content.mode}{content.size}".encode('utf-8'))
+        digest.update(content.tobytes())
+    return digest.hexdigest()
+
+
+def _cached_response(key):
+    """Extraction result cached in this process or the shared cache, or None"""
+    cached = _response_cache.get(key)
+    if cached is None:
+        try:
+            cached = shared_cache().get('ai', key)
+        except Exception as e:
+            print(f"Error reading shared cache: {str(e)}")
+        if cached is not None:
+            _response_cache.put(key, cached)
+    return cached
+
+
+def _cache_response(key, csv_text):
+    """Remember an extraction result in both cache tiers"""
+    try:
+        shared_cache().put('ai', key, csv_text, AI_CACHE_SECONDS)
+    except Exception as e:
+        print(f"Error writing shared cache: {str(e)}")
+    return _response_cache.put(key, csv_text)
 
-# Note: google.generativeai import moved to conditional usage
-# to prevent ModuleNotFoundError if API key not configured
 
 def ai_parse_file(uploaded_file, api_key):
     """
@@ -15,57 +123,292 @@ def ai_parse_file(uploaded_file, api_key):
         
     Returns:
         str: CSV-formatted text of extracted transactions
+        
+    Raises:
+        AIError: If the file can't be read or the AI call fails
     """
+    client = get_ai_client(api_key)
     try:
-        import google.generativeai as genai
+        content, _ = _file_content(uploaded_file)
+    except Exception as e:
+        raise AIRequestError(f"Error processing file: {str(e)}")
+    return _parse_content(client, _content_key(content), content)
+
+
+def _parse_content(client, key, content):
+    """
+    Extract one file's transactions in a request of its own
+    
+    Args:
+        client: AIClient to call
+        key: _content_key of content
+        content: Model input part (text or PIL image)
         
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+    Returns:
+        str: CSV-formatted text, from the response cache when possible
+    """
+    cached = _cached_response(key)
+    if cached is not None:
+        return cached
+    return _cache_response(key, client.generate([EXTRACTION_PROMPT, content]))
+
+
+def _pack_requests(items):
+    """
+    Group file parts into requests within the per-request limits
+    
+    Args:
+        items: List of (index, name, content, size) tuples
         
-        # Comprehensive prompt for financial document parsing
-        prompt = """
-        Analyze this financial document (bank statement, payment screenshot, or transaction record).
+    Returns:
+        list: Lists of items, one list per request
+    """
+    batches, current, current_bytes = [], [], 0
+    for item in items:
+        size = item[3]
+        if current and (len(current) >= MAX_FILES_PER_REQUEST or current_bytes + size > MAX_REQUEST_BYTES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(item)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _split_batch_response(csv_text, file_count):
+    """
+    Demultiplex a batched CSV response back into one CSV per file
+    
+    Args:
+        csv_text: CSV text with a leading File column
+        file_count: Number of files in the request
         
-        Extract ALL transactions and format them as a CSV with these exact columns:
-        Date, Particulars, Category, Amount, Transaction_ID
+    Returns:
+        tuple or None: (CSV text per file, positions of the files with no
+                       rows), or None if the response can't be split
+                       reliably. Files with no rows get a header-only CSV.
+    """
+    csv_text = csv_text.strip()
+    if csv_text.startswith('```'):
+        csv_text = '\n'.join(csv_text.split('\n')[1:-1])
+    
+    try:
+        batch_df = pd.read_csv(StringIO(csv_text), dtype=str, skipinitialspace=True)
+    except Exception:
+        return None
+    
+    batch_df.columns = [col.strip() for col in batch_df.columns]
+    if 'File' not in batch_df.columns:
+        return None
+    
+    file_numbers = pd.to_numeric(batch_df['File'].str.extract(r'(\d+)')[0], errors='coerce')
+    if file_numbers.isna().any() or not file_numbers.between(1, file_count).all():
+        return None
+    
+    rows = batch_df.drop(columns=['File'])
+    texts = [rows[file_numbers == n].to_csv(index=False) for n in range(1, file_count + 1)]
+    missing = [n - 1 for n in range(1, file_count + 1) if not (file_numbers == n).any()]
+    return texts, missing
+
+
+@tracked('imports.active')
+def ai_parse_files(uploaded_files, api_key):
+    """
+    Parse many uploaded documents with one configured model, packing
+    small files into shared requests
+    
+    Args:
+        uploaded_files: List of Streamlit uploaded file objects
+        api_key: Google Gemini API key
         
-        Instructions:
-        - Date: Format as DD-MM-YYYY
-        - Particulars: Full description of the transaction
-        - Category: Classify as one of: Income, Rent, EMI, Food, Shopping, Transport, Utilities, Entertainment, Healthcare, Other
-        - Amount: Use negative for expenses/debits (e.g., -1500.00), positive for income/credits (e.g., +50000.00)
-        - Transaction_ID: Extract any reference/transaction number (12-digit or UPI ID)
+    Returns:
+        list: Per file, in input order, either the CSV-formatted text or
+              the AIError that prevented extraction. Near-identical
+              screenshots are parsed once and share the first one's result.
+    """
+    results = [None] * len(uploaded_files)
+    duplicates = {}
+    seen_images = []
+    keys = {}
+    
+    try:
+        client = get_ai_client(api_key)
+    except AIError as e:
+        return [e] * len(uploaded_files)
+    
+    items = []
+    for i, uploaded_file in enumerate(uploaded_files):
+        try:
+            content, size = _file_content(uploaded_file)
+        except Exception as e:
+            results[i] = AIRequestError(f"Error processing file: {str(e)}")
+            continue
         
-        Return ONLY the CSV data, no explanations or markdown formatting.
-        Start directly with the header row.
-        """
+        if uploaded_file.type in IMAGE_TYPES:
+            image_hash = perceptual_hash(content)
+            original = find_duplicate(content, image_hash, seen_images)
+            if original is not None:
+                duplicates[i] = original
+                continue
+            seen_images.append((i, image_hash, content))
         
-        # Handle different file types
-        if uploaded_file.type in ['image/jpeg', 'image/jpg', 'image/png']:
-            # For images (screenshots)
-            from PIL import Image
-            image = Image.open(uploaded_file)
-            response = model.generate_content([prompt, image])
-        else:
-            # For PDFs or text files
-            if uploaded_file.type == 'application/pdf':
-                import pdfplumber
-                with pdfplumber.open(uploaded_file) as pdf:
-                    text = ""
-                    for page in pdf.pages:
-                        text += page.extract_text() or ""
-                response = model.generate_content([prompt, text])
-            else:
-                # For CSV or other text formats
-                text = uploaded_file.read().decode('utf-8')
-                response = model.generate_content([prompt, text])
-        
-        return response.text
-        
-    except ImportError:
-        return "Error: google-generativeai library not installed. Please add it to requirements.txt"
-    except Exception as e:
-        return f"Error processing file: {str(e)}"
+        keys[i] = _content_key(content)
+        cached = _cached_response(keys[i])
+        if cached is not None:
+            results[i] = cached
+            continue
+        items.append((i, uploaded_file.name, content, size))
+    
+    for batch in _pack_requests(items):
+        split = None
+        if len(batch) > 1:
+            parts = [BATCH_PROMPT]
+            for number, (_, name, content, _) in enumerate(batch, start=1):
+                parts += [f"FILE {number}: {name}", content]
+            try:
+                split = _split_batch_response(client.generate(parts), len(batch))
+            except AIResponseError as e:
+                print(f"Batched extraction failed, retrying per file: {str(e)}")
+            except AIError as e:
+                # Quota/service failures already exhausted their retries;
+                # fanning out per file would only add load
+                for i, _, _, _ in batch:
+                    results[i] = e
+                continue
+        
+        retry = batch
+        if split is not None:
+            texts, missing = split
+            for position, ((i, _, _, _), csv_text) in enumerate(zip(batch, texts)):
+                if position not in missing:
+                    results[i] = _cache_response(keys[i], csv_text)
+            # The model may have skipped a file rather than found it empty
+            retry = [batch[position] for position in missing]
+        
+        # Single file, a batch that couldn't be demultiplexed, or files
+        # the batched response had no rows for
+        for i, _, content, _ in retry:
+            try:
+                results[i] = _parse_content(client, keys[i], content)
+            except AIError as e:
+                results[i] = e
+    
+    for i, original in duplicates.items():
+        results[i] = results[original]
+    
+    return results
+
+
+# Known merchants and the aliases they show up under in statements
+MERCHANT_ALIASES = {
+    'Swiggy': ['swiggy', 'bundl'],
+    'Zomato': ['zomato'],
+    'Amazon': ['amazon', 'amzn'],
+    'Flipkart': ['flipkart', 'fkrt'],
+    'Myntra': ['myntra'],
+    'BigBasket': ['bigbasket', 'supermarket grocery supplies'],
+    'Blinkit': ['blinkit', 'grofers'],
+    'Uber': ['uber'],
+    'Ola': ['ola', 'olacabs', 'ani technologies'],
+    'Rapido': ['rapido', 'roppen'],
+    'Netflix': ['netflix'],
+    'Spotify': ['spotify'],
+    'Hotstar': ['hotstar', 'novi digital'],
+    'Airtel': ['airtel', 'bharti'],
+    'Jio': ['jio', 'reliance jio'],
+    'Paytm': ['paytm', 'one97'],
+    'IRCTC': ['irctc'],
+    'Bajaj Finserv': ['bajaj finserv', 'bajaj fin']
+}
+
+# Statement boilerplate that never names the counterparty
+MERCHANT_NOISE_WORDS = {
+    'upi', 'neft', 'imps', 'rtgs', 'ach', 'nach', 'ecs', 'pos', 'atm', 'mmt', 'bil', 'bbps',
+    'dr', 'cr', 'p2a', 'p2m', 'to', 'from', 'by', 'via', 'for', 'the',
+    'payment', 'paid', 'pay', 'transfer', 'trf', 'txn', 'ref', 'reference', 'inward', 'outward',
+    'debit', 'credit', 'card', 'purchase', 'collect', 'request', 'mandate', 'autopay', 'si',
+    'yesb', 'sbin', 'icic', 'utib', 'kkbk', 'barb', 'punb', 'ybl',
+    'okaxis', 'oksbi', 'okhdfcbank', 'okicici', 'paytmqr', 'ibl', 'apl', 'axl'
+}
+MERCHANT_SUFFIXES = {'ltd', 'limited', 'pvt', 'private', 'llp', 'inc', 'co', 'india', 'in', 'technologies', 'services'}
+
+MERCHANT_CACHE_SIZE = 50000
+
+_ALIAS_PATTERNS = [
+    (canonical, re.compile(r'\b(?:' + '|'.join(re.escape(alias) for alias in aliases) + r')\b'))
+    for canonical, aliases in MERCHANT_ALIASES.items()
+]
+
+
+@lru_cache(maxsize=MERCHANT_CACHE_SIZE)
+def canonical_merchant(particulars):
+    """
+    Canonical merchant name for a raw transaction description
+    
+    Strips UPI/NEFT/IMPS boilerplate, VPAs, IFSC codes and reference
+    numbers, then maps known aliases to one name. Results are memoized in
+    a bounded LRU keyed on the raw string, since the same descriptions
+    repeat across months and users.
+    
+    Args:
+        particulars: Raw transaction description
+        
+    Returns:
+        str: Canonical merchant name ('' if nothing usable remains)
+    """
+    text = str(particulars).lower()
+    
+    # VPA handles (swiggy@ybl) keep their name part, bank part is dropped
+    text = re.sub(r'([a-z0-9._-]+)@[a-z0-9.]+', lambda m: ' ' + re.sub(r'[^a-z]+', ' ', m.group(1)) + ' ', text)
+    # IFSC codes, then anything carrying digits (reference/account numbers)
+    text = re.sub(r'\b[a-z]{4}0[a-z0-9]{6}\b', ' ', text)
+    text = re.sub(r'\b\w*\d\w*\b', ' ', text)
+    
+    cleaned = ' '.join(re.sub(r'[^a-z&]+', ' ', text).split())
+    for canonical, pattern in _ALIAS_PATTERNS:
+        if pattern.search(cleaned):
+            return canonical
+    
+    # Otherwise take the first segment that still names someone
+    for segment in re.split(r'[/|:*\-]+|\s{2,}', text):
+        words = [w for w in re.sub(r'[^a-z&]+', ' ', segment).split() if w not in MERCHANT_NOISE_WORDS]
+        while words and words[-1] in MERCHANT_SUFFIXES:
+            words.pop()
+        if words and len(''.join(words)) > 1:
+            return ' '.join(words[:4]).title()
+    
+    return ''
+
+
+def canonical_merchants(particulars):
+    """
+    Canonical merchant names for a Series of descriptions
+    
+    Args:
+        particulars: Series of raw transaction descriptions
+        
+    Returns:
+        pd.Series: Canonical names aligned with particulars.index
+    """
+    return particulars.fillna('').astype(str).map(canonical_merchant)
+
+
+_merchant_cache_counters = LruCacheCounters('merchant_names', canonical_merchant)
+
+
+# Category mapping with keywords
+CATEGORY_KEYWORDS = {
+    'Income': ['salary', 'income', 'credit', 'refund', 'cashback'],
+    'Rent': ['rent', 'lodha', 'housing', 'lease'],
+    'EMI': ['emi', 'loan', 'sbi', 'hdfc loan', 'bajaj finserv'],
+    'Food': ['swiggy', 'zomato', 'food', 'restaurant', 'cafe', 'dining', 'grocery', 'bigbasket'],
+    'Shopping': ['amazon', 'flipkart', 'myntra', 'shopping', 'mall', 'store'],
+    'Transport': ['uber', 'ola', 'rapido', 'fuel', 'petrol', 'metro', 'transport'],
+    'Utilities': ['electricity', 'water', 'gas', 'mobile', 'internet', 'broadband', 'recharge'],
+    'Entertainment': ['netflix', 'amazon prime', 'hotstar', 'movie', 'spotify', 'game'],
+    'Healthcare': ['hospital', 'pharmacy', 'doctor', 'medical', 'health', 'medicine']
+}
 
 
 def categorize_transaction(particulars):
@@ -80,32 +423,59 @@ def categorize_transaction(particulars):
     """
     particulars_lower = str(particulars).lower()
     
-    # Category mapping with keywords
-    categories = {
-        'Income': ['salary', 'income', 'credit', 'refund', 'cashback'],
-        'Rent': ['rent', 'lodha', 'housing', 'lease'],
-        'EMI': ['emi', 'loan', 'sbi', 'hdfc loan', 'bajaj finserv'],
-        'Food': ['swiggy', 'zomato', 'food', 'restaurant', 'cafe', 'dining', 'grocery', 'bigbasket'],
-        'Shopping': ['amazon', 'flipkart', 'myntra', 'shopping', 'mall', 'store'],
-        'Transport': ['uber', 'ola', 'rapido', 'fuel', 'petrol', 'metro', 'transport'],
-        'Utilities': ['electricity', 'water', 'gas', 'mobile', 'internet', 'broadband', 'recharge'],
-        'Entertainment': ['netflix', 'amazon prime', 'hotstar', 'movie', 'spotify', 'game'],
-        'Healthcare': ['hospital', 'pharmacy', 'doctor', 'medical', 'health', 'medicine']
-    }
-    
-    for category, keywords in categories.items():
+    for category, keywords in CATEGORY_KEYWORDS.items():
         if any(keyword in particulars_lower for keyword in keywords):
             return category
     
     return 'Other'
 
 
-def get_financial_summary(df):
+@timed('stage.categorize')
+def categorize_transactions(particulars, use_model=True, email=None):
+    """
+    Batch-categorize transactions: keyword matching first, then the
+    user's local classifier for anything still unmatched
+    
+    Args:
+        particulars: Series of transaction descriptions
+        use_model: Whether to run the local classifier as a second tier
+        email: User whose classifier to use (None for the legacy shared store)
+        
+    Returns:
+        pd.Series: Category names aligned with particulars.index
+    """
+    particulars_lower = particulars.fillna('').astype(str).str.lower()
+    result = pd.Series('Other', index=particulars.index, dtype=object)
+    unmatched = pd.Series(True, index=particulars.index)
+    
+    # Tier 1: keywords, first matching category wins (same order as categorize_transaction)
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        pattern = '|'.join(re.escape(keyword) for keyword in keywords)
+        hits = unmatched & particulars_lower.str.contains(pattern, regex=True)
+        result[hits] = category
+        unmatched &= ~hits
+    
+    # Tier 2: local classifier on the canonical merchant, only where it is confident
+    if use_model and unmatched.any():
+        model = get_model(email)
+        if model is not None:
+            labels, confidence = model.predict(canonical_merchants(particulars[unmatched]).tolist())
+            confident = confidence >= MIN_CONFIDENCE
+            result[unmatched[unmatched].index[confident]] = labels[confident]
+    
+    return result
+
+
+def get_financial_summary(df, base_currency=BASE_CURRENCY):
     """
     Generate financial summary from transaction DataFrame
     
+    Amounts in other currencies are converted to base_currency first,
+    so mixed-currency histories are summarized in a single pass.
+    
     Args:
         df: Transaction DataFrame
+        base_currency: Currency code the summary is reported in
         
     Returns:
         dict: Financial summary metrics
@@ -118,13 +488,16 @@ def get_financial_summary(df):
             'top_category': 'N/A'
         }
     
-    income = df[df['Amount'] > 0]['Amount'].sum()
-    expenses = abs(df[df['Amount'] < 0]['Amount'].sum())
+    amounts = convert_to_base(df, base_currency)
+    is_expense = amounts < 0
+    
+    income = amounts[amounts > 0].sum()
+    expenses = abs(amounts[is_expense].sum())
     net = income - expenses
     
     # Get top expense category
     if 'Category' in df.columns:
-        expense_by_cat = df[df['Amount'] < 0].groupby('Category')['Amount'].sum().abs()
+        expense_by_cat = amounts[is_expense].groupby(df.loc[is_expense, 'Category']).sum().abs()
         top_cat = expense_by_cat.idxmax() if not expense_by_cat.empty else 'N/A'
     else:
         top_cat = 'N/A'
@@ -137,17 +510,72 @@ def get_financial_summary(df):
     }
 
 
-def process_data(csv_text, existing_df=None):
+REQUIRED_COLUMNS = ['Date', 'Particulars', 'Amount']
+
+# Rows per chunk in process_csv_chunked; bounds peak memory on huge exports
+CHUNK_SIZE = 50000
+# CSV uploads at least this large are streamed instead of sent to the AI
+STREAMING_THRESHOLD_BYTES = 10 * 1024 * 1024
+
+
+def _clean_transactions(new_df, currency=BASE_CURRENCY, date_format='%d-%m-%Y', email=None):
+    """
+    Normalize and categorize raw transaction rows
+    
+    Args:
+        new_df: DataFrame with at least REQUIRED_COLUMNS
+        currency: Currency assumed for rows without a Currency value
+        date_format: strptime format of the Date column
+        email: User whose classifier categorizes the rows
+        
+    Returns:
+        pd.DataFrame: Rows with parsed Date/Amount, Currency, Category and Transaction_ID
+    """
+    # Extract transaction IDs from Particulars using regex
+    # Looks for 12-digit numbers or UPI transaction IDs
+    if 'Transaction_ID' not in new_df.columns:
+        new_df['Transaction_ID'] = new_df['Particulars'].astype(str).str.extract(r'(\d{12}|\w{16,})')[0]
+    
+    # Clean and standardize data
+    new_df['Date'] = pd.to_datetime(new_df['Date'], format=date_format, errors='coerce')
+    new_df['Amount'] = new_df['Amount'].astype(str).str.replace(',', '').str.replace('₹', '').str.replace('+', '')
+    new_df['Amount'] = pd.to_numeric(new_df['Amount'], errors='coerce')
+    
+    # Keep the original currency per row; conversion happens at summary time
+    default_currency = parse_currency_code(currency)
+    if 'Currency' not in new_df.columns:
+        new_df['Currency'] = default_currency
+    new_df['Currency'] = new_df['Currency'].fillna(default_currency).astype(str).str.strip().str.upper()
+    
+    # Add Category if missing, and try to resolve 'Other' locally
+    if 'Category' not in new_df.columns:
+        new_df['Category'] = 'Other'
+    uncategorized = new_df['Category'].isna() | (new_df['Category'] == 'Other')
+    if uncategorized.any():
+        new_df.loc[uncategorized, 'Category'] = categorize_transactions(new_df.loc[uncategorized, 'Particulars'],
+                                                                        email=email)
+    
+    return new_df
+
+
+@timed('stage.parse')
+def process_data(csv_text, existing_df=None, currency=BASE_CURRENCY, email=None):
     """
     Process AI-extracted transaction data and handle deduplication
     
     Args:
         csv_text: CSV-formatted text from AI parser
         existing_df: DataFrame of existing transactions (optional)
+        currency: Currency assumed for rows without a Currency value
+        email: User the rows are for (selects their classifier)
         
     Returns:
         pd.DataFrame: Cleaned and deduplicated transaction data
     """
+    # Failed AI extractions raise AIRequestError instead of returning text
+    if not isinstance(csv_text, str):
+        return pd.DataFrame()
+    
     try:
         # Clean the CSV text (remove markdown code blocks if present)
         csv_text = csv_text.strip()
@@ -158,35 +586,17 @@ def process_data(csv_text, existing_df=None):
         new_df = pd.read_csv(StringIO(csv_text))
         
         # Ensure required columns exist
-        required_cols = ['Date', 'Particulars', 'Amount']
-        if not all(col in new_df.columns for col in required_cols):
+        if not all(col in new_df.columns for col in REQUIRED_COLUMNS):
             return pd.DataFrame()  # Return empty if format is invalid
         
-        # Extract transaction IDs from Particulars using regex
-        # Looks for 12-digit numbers or UPI transaction IDs
-        if 'Transaction_ID' not in new_df.columns:
-            new_df['Transaction_ID'] = new_df['Particulars'].str.extract(r'(\d{12}|\w{16,})')
-        
-        # Clean and standardize data
-        new_df['Date'] = pd.to_datetime(new_df['Date'], format='%d-%m-%Y', errors='coerce')
-        new_df['Amount'] = new_df['Amount'].astype(str).str.replace(',', '').str.replace('₹', '').str.replace('+', '')
-        new_df['Amount'] = pd.to_numeric(new_df['Amount'], errors='coerce')
-        
-        # Add Category if missing
-        if 'Category' not in new_df.columns:
-            new_df['Category'] = 'Other'
+        new_df = _clean_transactions(new_df, currency, email=email)
         
         # Deduplication Logic
+        # Same Transaction_ID, or same amount within a day and a similar
+        # merchant; matches are one-to-one, so genuine repeats survive
         if existing_df is not None and not existing_df.empty:
-            # Remove duplicates based on Transaction_ID
-            if 'Transaction_ID' in existing_df.columns:
-                new_df = new_df[~new_df['Transaction_ID'].isin(existing_df['Transaction_ID'])]
-            
-            # Also check for duplicate amounts on same date (secondary check)
-            if 'Date' in existing_df.columns and 'Amount' in existing_df.columns:
-                existing_combo = existing_df[['Date', 'Amount']].apply(tuple, axis=1)
-                new_combo = new_df[['Date', 'Amount']].apply(tuple, axis=1)
-                new_df = new_df[~new_combo.isin(existing_combo)]
+            with timed('stage.dedup'):
+                new_df = new_df[~duplicate_mask(new_df, existing_df)]
         
         # Remove rows with missing critical data
         new_df = new_df.dropna(subset=['Date', 'Amount'])
@@ -199,3 +609,86 @@ def process_data(csv_text, existing_df=None):
     except Exception as e:
         print(f"Error in process_data: {str(e)}")
         return pd.DataFrame()
+
+
+def is_streamable_csv(uploaded_file, threshold=STREAMING_THRESHOLD_BYTES):
+    """
+    Whether an upload is a large, already-structured CSV export
+    
+    Args:
+        uploaded_file: Streamlit UploadedFile object
+        threshold: Minimum size in bytes
+        
+    Returns:
+        bool: True if the file is a CSV above threshold with REQUIRED_COLUMNS
+    """
+    if not uploaded_file.name.lower().endswith('.csv') or uploaded_file.size < threshold:
+        return False
+    try:
+        header = uploaded_file.readline().decode('utf-8-sig', errors='ignore')
+    finally:
+        uploaded_file.seek(0)
+    columns = [col.strip().strip('"') for col in header.split(',')]
+    return all(col in columns for col in REQUIRED_COLUMNS)
+
+
+@tracked('imports.active')
+def process_csv_chunked(source, store_path=TRANSACTIONS_PATH, currency=BASE_CURRENCY,
+                        chunksize=CHUNK_SIZE, date_format='%d-%m-%Y', on_chunk=None, writer=None, email=None):
+    """
+    Stream a large CSV export into the transaction store chunk by chunk
+    
+    Each chunk is normalized, categorized and checked against the store's
+    persistent dedup index, then appended straight to the store. Peak
+    memory is bounded by chunksize rather than by the file size.
+    
+    Chunks are only checked against the rows the store held before the
+    import, each stored row matching at most one row of the file, so
+    repeats within the file (two identical purchases on one day) are
+    kept wherever the chunk boundaries fall, as in process_data.
+    
+    Args:
+        source: Path or file-like object of the CSV export
+        store_path: Transaction store to write to
+        currency: Currency assumed for rows without a Currency value
+        chunksize: Rows per chunk
+        date_format: strptime format of the Date column
+        on_chunk: Optional callback receiving each chunk's new rows
+        writer: Optional callable (rows, index) storing new rows and
+                returning them as written (defaults to appending to
+                store_path, e.g. TransactionStore.append for a user)
+        email: User the rows are for (selects their classifier)
+        
+    Returns:
+        dict: rows_read, rows_written, duplicates, invalid, chunks
+    """
+    stats = {'rows_read': 0, 'rows_written': 0, 'duplicates': 0, 'invalid': 0, 'chunks': 0}
+    if writer is None:
+        writer = lambda rows, index: append_transactions(rows, store_path, index)
+    
+    with DedupIndex(store_path) as index:
+        before_import, matched = index.last_row(), set()
+        reader = pd.read_csv(source, chunksize=chunksize, dtype={'Transaction_ID': str}, skipinitialspace=True)
+        for chunk in reader:
+            stats['chunks'] += 1
+            stats['rows_read'] += len(chunk)
+            
+            if not all(col in chunk.columns for col in REQUIRED_COLUMNS):
+                raise ValueError(f"CSV is missing required columns: {', '.join(REQUIRED_COLUMNS)}")
+            
+            chunk = _clean_transactions(chunk, currency, date_format, email)
+            valid = chunk.dropna(subset=['Date', 'Amount'])
+            stats['invalid'] += len(chunk) - len(valid)
+            
+            found = index.matches(valid, up_to=before_import, exclude=matched)
+            matched.update(found['Existing_Index'])
+            new_rows = valid[~valid.index.isin(found['New_Index'])]
+            stats['duplicates'] += len(valid) - len(new_rows)
+            
+            written = writer(new_rows, index)
+            stats['rows_written'] += len(written)
+            
+            if on_chunk is not None and not written.empty:
+                on_chunk(written)
+    
+    return stats
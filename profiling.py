@@ -0,0 +1,163 @@
+import os
+import re
+import sys
+import glob
+import time
+import cProfile
+import threading
+from collections import Counter
+
+# One file per profiled script run, grouped by session:
+#   data/profiles/<session>/<page>-<timestamp>.folded  (sampled stacks)
+#   data/profiles/<session>/<page>-<timestamp>.prof    (cProfile stats)
+# .folded files are collapsed stacks ("a;b;c <count>" lines) that
+# flamegraph.pl and speedscope load directly; .prof files open in pstats
+# or snakeviz.
+PROFILES_DIR = 'data/profiles'
+PROFILE_LIMIT = 200
+SAMPLE_INTERVAL_SECONDS = 0.005
+MODES = {'sample': 'folded', 'cprofile': 'prof'}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval
+
+    Runs in a daemon thread and only reads the target's frames, so the
+    profiled code runs unmodified; the cost is one stack walk per sample.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _safe(name):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(name))[:48] or 'unknown'
+
+
+def profile_path(session_id, page, mode):
+    """
+    File a profile of one run is stored in
+
+    Returns:
+        str: Path under PROFILES_DIR (directories created)
+    """
+    directory = os.path.join(PROFILES_DIR, _safe(session_id))
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S') + f"-{int(time.time() * 1000) % 1000:03d}"
+    return os.path.join(directory, f"{_safe(page)}-{stamp}.{MODES[mode]}")
+
+
+class profiled:
+    """
+    Profile the enclosed block (one script run) and store the result
+
+        with profiled(session_id, 'Dashboard', 'sample'):
+            run_page()
+
+    The profile is written even when the block ends in an exception,
+    such as Streamlit's rerun and stop signals.
+
+    Args:
+        session_id: Session the run belongs to
+        page: Page being rendered
+        mode: 'sample' (collapsed stacks) or 'cprofile'
+    """
+
+    def __init__(self, session_id, page, mode='sample'):
+        self.session_id = session_id
+        self.page = page
+        self.mode = mode if mode in MODES else 'sample'
+        self.path = None
+
+    def __enter__(self):
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(threading.get_ident())
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self.mode == 'cprofile':
+                self.profiler.disable()
+            else:
+                self.profiler.stop()
+            self.path = profile_path(self.session_id, self.page, self.mode)
+            if self.mode == 'cprofile':
+                self.profiler.dump_stats(self.path)
+            else:
+                self.profiler.write(self.path)
+            _prune()
+        except Exception as e:
+            print(f"Error saving profile: {str(e)}")
+        return False
+
+
+def _prune():
+    files = sorted(glob.glob(os.path.join(PROFILES_DIR, '*', '*.*')), key=os.path.getmtime)
+    for path in files[:-PROFILE_LIMIT]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def list_profiles(session_id=None):
+    """
+    Stored profiles, newest first
+
+    Args:
+        session_id: Only this session's profiles (default: all)
+
+    Returns:
+        list: dicts with session, page, mode, created (epoch seconds),
+              bytes and path
+    """
+    pattern = os.path.join(PROFILES_DIR, _safe(session_id) if session_id else '*', '*.*')
+    profiles = []
+    for path in glob.glob(pattern):
+        name, ext = os.path.splitext(os.path.basename(path))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        profiles.append({'session': os.path.basename(os.path.dirname(path)), 'page': name.rsplit('-', 3)[0],
+                         'mode': 'cprofile' if ext == '.prof' else 'sample', 'created': stat.st_mtime,
+                         'bytes': stat.st_size, 'path': path})
+    return sorted(profiles, key=lambda p: p['created'], reverse=True)
@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+from currency import BASE_CURRENCY, convert_to_base
+from processor import canonical_merchants
+
+# Named periods and their nominal length in days
+PERIODS = {
+    'Weekly': 7,
+    'Monthly': 30,
+    'Quarterly': 91,
+    'Yearly': 365
+}
+
+MIN_OCCURRENCES = 3
+AMOUNT_TOLERANCE = 0.15     # relative deviation from the typical amount
+INTERVAL_TOLERANCE = 0.2    # relative deviation from the typical interval
+MIN_REGULAR_SHARE = 0.7     # share of rows that must respect both tolerances
+HISTORY_PER_MERCHANT = 24   # occurrences kept per merchant for incremental updates
+
+PATTERN_COLUMNS = ['Merchant', 'Direction', 'Category', 'Period', 'Interval_Days', 'Amount',
+                   'Occurrences', 'Last_Date', 'Next_Date', 'Confidence']
+
+
+def to_events(df, base_currency=BASE_CURRENCY):
+    """
+    Reduce transactions to one event per (Merchant, Direction, Day)
+
+    Args:
+        df: Transaction DataFrame
+        base_currency: Currency amounts are reported in
+
+    Returns:
+        pd.DataFrame: Merchant, Direction, Date, Amount, Category
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['Merchant', 'Direction', 'Date', 'Amount', 'Category'])
+
+    amounts = convert_to_base(df, base_currency)
+    events = pd.DataFrame({
+        'Merchant': canonical_merchants(df['Particulars']),
+        'Direction': (amounts > 0).map({True: 'credit', False: 'debit'}),
+        'Date': pd.to_datetime(df['Date'], errors='coerce').dt.normalize(),
+        'Amount': amounts,
+        'Category': df['Category'].fillna('Other') if 'Category' in df.columns else 'Other'
+    })
+    events = events[(events['Merchant'] != '') & events['Date'].notna() & events['Amount'].notna()]
+    return (events.groupby(['Merchant', 'Direction', 'Date'], as_index=False)
+            .agg(Amount=('Amount', 'sum'), Category=('Category', 'last')))
+
+
+def _concat(*frames):
+    """Concatenate frames, skipping empty ones (keeps dtypes stable)"""
+    non_empty = [frame for frame in frames if not frame.empty]
+    if not non_empty:
+        return frames[0].iloc[0:0]
+    return pd.concat(non_empty, ignore_index=True)
+
+
+def _period_name(interval_days):
+    """Closest named period for a typical interval"""
+    return min(PERIODS, key=lambda name: abs(PERIODS[name] - interval_days) / PERIODS[name])
+
+
+def detect_recurring(events, min_occurrences=MIN_OCCURRENCES,
+                     amount_tolerance=AMOUNT_TOLERANCE, interval_tolerance=INTERVAL_TOLERANCE):
+    """
+    Find periodic patterns with one sort and grouped diffs
+
+    Args:
+        events: Output of to_events()
+        min_occurrences: Minimum events for a pattern
+        amount_tolerance: Allowed relative deviation from the median amount
+        interval_tolerance: Allowed relative deviation from the median interval
+
+    Returns:
+        pd.DataFrame: One row per recurring pattern (PATTERN_COLUMNS)
+    """
+    if events.empty:
+        return pd.DataFrame(columns=PATTERN_COLUMNS)
+
+    keys = ['Merchant', 'Direction']
+    ev = events.sort_values(keys + ['Date']).reset_index(drop=True)
+    groups = ev.groupby(keys, sort=False)
+
+    ev['Interval'] = groups['Date'].diff().dt.days
+    ev['Median_Interval'] = groups['Interval'].transform('median')
+    ev['Median_Amount'] = groups['Amount'].transform('median')
+
+    ev['Amount_OK'] = (ev['Amount'] - ev['Median_Amount']).abs() <= amount_tolerance * ev['Median_Amount'].abs()
+    # The first event of each group has no interval, so it only needs the amount check
+    ev['Interval_OK'] = (ev['Interval'].isna() |
+                         ((ev['Interval'] - ev['Median_Interval']).abs() <= interval_tolerance * ev['Median_Interval']))
+    ev['Regular'] = ev['Amount_OK'] & ev['Interval_OK']
+
+    stats = ev.groupby(keys, sort=False).agg(
+        Occurrences=('Date', 'size'),
+        Last_Date=('Date', 'max'),
+        Amount=('Median_Amount', 'first'),
+        Interval_Days=('Median_Interval', 'first'),
+        Category=('Category', 'last'),
+        Regular_Share=('Regular', 'mean')
+    )
+
+    stats = stats[(stats['Occurrences'] >= min_occurrences) &
+                  (stats['Interval_Days'] >= PERIODS['Weekly'] * (1 - interval_tolerance)) &
+                  (stats['Regular_Share'] >= MIN_REGULAR_SHARE)]
+    if stats.empty:
+        return pd.DataFrame(columns=PATTERN_COLUMNS)
+
+    stats = stats.reset_index()
+    stats['Period'] = stats['Interval_Days'].map(_period_name)
+    stats['Next_Date'] = stats['Last_Date'] + pd.to_timedelta(stats['Interval_Days'].round(), unit='D')
+    stats['Confidence'] = (stats['Regular_Share'] * (stats['Occurrences'] / 6).clip(upper=1.0)).round(2)
+    stats['Amount'] = stats['Amount'].round(2)
+    return stats[PATTERN_COLUMNS].sort_values('Next_Date').reset_index(drop=True)
+
+
+class RecurringDetector:
+    """
+    Incremental recurring transaction detector
+
+    Keeps the most recent events per merchant; new rows only re-evaluate
+    the merchants they touch.
+    """
+
+    def __init__(self, df=None, base_currency=BASE_CURRENCY):
+        self.base_currency = base_currency
+        self.history = self._trim(to_events(df, base_currency))
+        self.patterns = detect_recurring(self.history)
+
+    @staticmethod
+    def _trim(events):
+        if events.empty:
+            return events
+        events = events.sort_values(['Merchant', 'Direction', 'Date'])
+        return events.groupby(['Merchant', 'Direction'], sort=False).tail(HISTORY_PER_MERCHANT).reset_index(drop=True)
+
+    def update(self, new_df):
+        """
+        Fold newly added transactions into the detector
+
+        Args:
+            new_df: DataFrame of new transactions only
+        """
+        new_events = to_events(new_df, self.base_currency)
+        if new_events.empty:
+            return
+
+        touched = pd.MultiIndex.from_frame(new_events[['Merchant', 'Direction']].drop_duplicates())
+
+        is_touched = self._keys(self.history).isin(touched)
+        affected = _concat(self.history[is_touched], new_events)
+        affected = (affected.groupby(['Merchant', 'Direction', 'Date'], as_index=False)
+                    .agg(Amount=('Amount', 'sum'), Category=('Category', 'last')))
+        affected = self._trim(affected)
+        self.history = _concat(self.history[~is_touched], affected)
+
+        kept = self.patterns[~self._keys(self.patterns).isin(touched)]
+        self.patterns = _concat(kept, detect_recurring(affected))
+        self.patterns = self.patterns.sort_values('Next_Date').reset_index(drop=True)
+
+    @staticmethod
+    def _keys(df):
+        return pd.MultiIndex.from_arrays([df['Merchant'], df['Direction']])
+
+    def upcoming(self, days=30, today=None, direction='debit'):
+        """
+        Expected recurring transactions in the next few days
+
+        Patterns that have missed more than two cycles are treated as
+        cancelled and skipped.
+
+        Args:
+            days: Look-ahead window
+            today: Reference date (defaults to today)
+            direction: 'debit', 'credit' or None for both
+
+        Returns:
+            pd.DataFrame: Matching patterns with Next_Date rolled forward
+        """
+        today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        patterns = self.patterns
+        if direction:
+            patterns = patterns[patterns['Direction'] == direction]
+        if patterns.empty:
+            return patterns
+
+        interval = pd.to_timedelta(patterns['Interval_Days'].round(), unit='D')
+        active = patterns['Last_Date'] + 2 * interval >= today
+        patterns = patterns[active].copy()
+        interval = interval[active]
+
+        # Roll overdue expectations forward to the next cycle after today
+        behind = np.ceil(((today - patterns['Next_Date']) / interval).clip(lower=0))
+        patterns['Next_Date'] = patterns['Next_Date'] + interval * behind
+
+        window = patterns['Next_Date'] <= today + pd.Timedelta(days=days)
+        return patterns[window].sort_values('Next_Date').reset_index(drop=True)
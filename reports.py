@@ -0,0 +1,537 @@
+import os
+import csv
+import glob
+import time
+import hashlib
+import tempfile
+import threading
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from caching import CacheCounters
+from compaction import read_chunks
+from currency import BASE_CURRENCY, convert_to_base
+from lazy_imports import load_module
+from metrics import registry, timed
+from storage import TRANSACTIONS_PATH, data_version
+
+REPORTS_DIR = 'data/reports'
+FORMATS = {'csv': 'text/csv',
+           'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+           'pdf': 'application/pdf'}
+# Store rows read per pass; the CSV and XLSX writers stream, so memory
+# stays flat on long ranges (PDF keeps its compressed pages until saved)
+REPORT_CHUNK_SIZE = 50000
+# Ranges longer than this are generated as background jobs
+BACKGROUND_RANGE_DAYS = 92
+REPORT_WORKERS = 2
+REPORT_CACHE_LIMIT = 200
+# Finished background jobs are forgotten after this long; their reports
+# stay in the cache
+REPORT_JOB_RETENTION_SECONDS = 3600
+
+# PDF fonts tried in order (regular, bold) after REPORT_FONT /
+# REPORT_FONT_BOLD; reportlab's bundled Vera is the last resort
+FONT_CANDIDATES = [
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf', '/usr/share/fonts/truetype/noto/NotoSans-Bold.ttf'),
+    ('/usr/share/fonts/noto/NotoSans-Regular.ttf', '/usr/share/fonts/noto/NotoSans-Bold.ttf'),
+    ('/System/Library/Fonts/Supplemental/Arial Unicode.ttf', None),
+    ('C:/Windows/Fonts/Nirmala.ttf', 'C:/Windows/Fonts/NirmalaB.ttf'),
+]
+# Spelled out when the PDF font has no glyph for them
+FALLBACK_TEXT = {'₹': 'Rs.', '€': 'EUR', '£': 'GBP', '¥': 'JPY'}
+
+TRANSACTION_HEADER = ['Date', 'Particulars', 'Category', 'Amount', 'Currency', 'Amount (base)']
+
+
+class CsvReportWriter:
+    """Sections one after another, separated by a blank line"""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.sections = 0
+
+    def section(self, title, header):
+        if self.sections:
+            self.writer.writerow([])
+        self.writer.writerow([title])
+        self.writer.writerow(header)
+        self.sections += 1
+
+    def row(self, values):
+        self.writer.writerow(values)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxReportWriter:
+    """
+    XLSX report, one worksheet per section
+
+    xlsxwriter's constant_memory mode writes each row out once the next
+    one starts, so memory doesn't grow with rows (rows must arrive in
+    order, which they do). Dates are written as date cells.
+    """
+
+    def __init__(self, path):
+        self.workbook = load_module('xlsxwriter').Workbook(path, {'constant_memory': True})
+        self.bold = self.workbook.add_format({'bold': True})
+        self.date = self.workbook.add_format({'num_format': 'yyyy-mm-dd'})
+        self.money = self.workbook.add_format({'num_format': '#,##0.00'})
+        self.sheet = None
+        self.row_number = 0
+
+    def section(self, title, header):
+        self.sheet = self.workbook.add_worksheet(title[:31])
+        self.sheet.write_row(0, 0, header, self.bold)
+        self.row_number = 1
+
+    def row(self, values):
+        for col, value in enumerate(values):
+            if value is None or (isinstance(value, float) and pd.isna(value)):
+                continue
+            if isinstance(value, date):
+                self.sheet.write_datetime(self.row_number, col, value, self.date)
+            elif isinstance(value, float):
+                self.sheet.write_number(self.row_number, col, value, self.money)
+            elif isinstance(value, int) and not isinstance(value, bool):
+                self.sheet.write_number(self.row_number, col, value)
+            else:
+                # Never as a formula, whatever the text starts with
+                self.sheet.write_string(self.row_number, col, str(value))
+        self.row_number += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+class ReportFont:
+    """A TrueType font registered with reportlab, and the characters it has"""
+
+    def __init__(self, name, path):
+        ttfonts = load_module('reportlab.pdfbase.ttfonts')
+        font = ttfonts.TTFont(name, path)
+        load_module('reportlab.pdfbase.pdfmetrics').registerFont(font)
+        self.name = name
+        self.glyphs = set(font.face.charToGlyph)
+
+    def covers(self, text):
+        return all(ord(char) in self.glyphs for char in text)
+
+    def printable(self, text):
+        """Text with characters missing from the font spelled out or replaced"""
+        # Every text font has ASCII; skips a lookup per character
+        if text.isascii() or self.covers(text):
+            return text
+        return ''.join(char if ord(char) in self.glyphs else FALLBACK_TEXT.get(char, '?') for char in text)
+
+
+def _font_candidates():
+    """(regular, bold) TTF paths to try, in order of preference"""
+    candidates = []
+    if os.environ.get('REPORT_FONT'):
+        candidates.append((os.environ['REPORT_FONT'], os.environ.get('REPORT_FONT_BOLD')))
+    candidates.extend(FONT_CANDIDATES)
+    fonts_dir = os.path.join(os.path.dirname(load_module('reportlab').__file__), 'fonts')
+    candidates.append((os.path.join(fonts_dir, 'Vera.ttf'), os.path.join(fonts_dir, 'VeraBd.ttf')))
+    return candidates
+
+
+# Shared by every session in this process
+_report_fonts = None
+_report_fonts_lock = threading.Lock()
+
+
+def report_fonts():
+    """
+    Regular and bold fonts for PDF reports
+
+    The first candidate with the rupee sign wins; failing that, the first
+    one that loads (reportlab's bundled Vera, at worst), with characters
+    it lacks spelled out.
+
+    Returns:
+        tuple: (regular ReportFont, bold ReportFont)
+    """
+    global _report_fonts
+    with _report_fonts_lock:
+        if _report_fonts is None:
+            loaded = []
+            for regular, bold in _font_candidates():
+                if not os.path.exists(regular):
+                    continue
+                try:
+                    font = ReportFont(f"Report-{len(loaded)}", regular)
+                    bold_font = (ReportFont(f"Report-{len(loaded)}-Bold", bold)
+                                 if bold and os.path.exists(bold) else font)
+                except Exception as e:
+                    print(f"Error loading report font {regular}: {str(e)}")
+                    continue
+                loaded.append((font, bold_font))
+                if font.covers('₹'):
+                    break
+            _report_fonts = next((fonts for fonts in loaded if fonts[0].covers('₹')), loaded[0])
+    return _report_fonts
+
+
+class PdfReportWriter:
+    """
+    Tabular PDF report drawn with reportlab
+
+    Each page is compressed as soon as it fills up. Text uses a Unicode
+    TrueType font (see report_fonts), so merchant names and currency
+    signs render as written.
+    """
+
+    PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+    MARGIN = 40
+    FONT_SIZE = 8
+    LEADING = 12
+
+    def __init__(self, path, title=''):
+        canvas = load_module('reportlab.pdfgen.canvas')
+        self.regular, self.bold = report_fonts()
+        self.canvas = canvas.Canvas(path, pagesize=(self.PAGE_WIDTH, self.PAGE_HEIGHT), pageCompression=1)
+        self.canvas.setTitle(title)
+        self.y = None
+        self.columns = []
+        self.header = None
+        self.title = title
+
+    def _text(self, x, text, bold=False, size=None):
+        font = self.bold if bold else self.regular
+        self.canvas.setFont(font.name, size or self.FONT_SIZE)
+        self.canvas.drawString(x, self.y, font.printable(str(text)))
+
+    def _new_page(self):
+        if self.y is not None:
+            self.canvas.showPage()
+        self.y = self.PAGE_HEIGHT - self.MARGIN
+        if self.title:
+            self._text(self.MARGIN, self.title, bold=True, size=7)
+            self.y -= self.LEADING * 1.5
+
+    def _ensure_space(self, lines=1):
+        if self.y is None or self.y - self.LEADING * lines < self.MARGIN:
+            self._new_page()
+            if self.header is not None and lines == 1:
+                self._cells(self.header, bold=True)
+
+    def _fit(self, font, text, width):
+        """Text cut short with '~' to fit a column"""
+        # No glyph is wider than the font size, so short text needs no measuring
+        if len(text) * self.FONT_SIZE <= width:
+            return text
+        string_width = load_module('reportlab.pdfbase.pdfmetrics').stringWidth
+        if string_width(text, font.name, self.FONT_SIZE) <= width:
+            return text
+        while len(text) > 1 and string_width(text + '~', font.name, self.FONT_SIZE) > width:
+            text = text[:-1]
+        return text + '~'
+
+    def _cells(self, values, bold=False):
+        # One text object per row; a drawString per cell costs several times more
+        font = self.bold if bold else self.regular
+        text_object = self.canvas.beginText()
+        text_object.setFont(font.name, self.FONT_SIZE)
+        for (x, width), value in zip(self.columns, values):
+            if isinstance(value, float):
+                value = f"{value:,.2f}"
+            text = '' if value is None else font.printable(str(value))
+            if text:
+                text_object.setTextOrigin(x, self.y)
+                text_object.textOut(self._fit(font, text, width - 2))
+        self.canvas.drawText(text_object)
+        self.y -= self.LEADING
+
+    def section(self, title, header, widths=None):
+        self.header = None
+        self._ensure_space(4)
+        if self.y < self.PAGE_HEIGHT - self.MARGIN - self.LEADING * 2:
+            self.y -= self.LEADING
+        self._text(self.MARGIN, title, bold=True, size=11)
+        self.y -= self.LEADING * 1.5
+        usable = self.PAGE_WIDTH - 2 * self.MARGIN
+        widths = widths or [1] * len(header)
+        x = self.MARGIN
+        self.columns = []
+        for weight in widths:
+            width = usable * weight / sum(widths)
+            self.columns.append((x, width))
+            x += width
+        self._cells(header, bold=True)
+        self.header = header
+
+    def row(self, values):
+        self._ensure_space()
+        self._cells(values)
+
+    def close(self):
+        if self.y is None:
+            self._new_page()
+        self.canvas.save()
+
+
+def _partition_by_month(store_path, start, end, base_currency, workdir):
+    """
+    Stream the store once: filter the range, total it, spill rows per month
+
+    Compacted months outside the range aren't read at all.
+
+    Returns:
+        tuple: (category -> totals dict, month -> totals dict, sorted months)
+    """
+    category_totals = {}
+    month_totals = {}
+    months = set()
+    for chunk in read_chunks(store_path, start, end, REPORT_CHUNK_SIZE):
+        chunk['Date'] = pd.to_datetime(chunk['Date'], errors='coerce')
+        chunk['Amount'] = pd.to_numeric(chunk['Amount'], errors='coerce')
+        chunk = chunk[(chunk['Date'] >= start) & (chunk['Date'] <= end) & chunk['Amount'].notna()]
+        if chunk.empty:
+            continue
+        chunk = chunk.assign(Base_Amount=convert_to_base(chunk, base_currency).round(2),
+                             Month=chunk['Date'].dt.strftime('%Y-%m'),
+                             Category=chunk['Category'].fillna('Other'))
+        chunk['Direction'] = (chunk['Base_Amount'] > 0).map({True: 'Income', False: 'Spend'})
+
+        for (category, direction), total in chunk.groupby(['Category', 'Direction'])['Base_Amount'].sum().items():
+            totals = category_totals.setdefault(category, {'Spend': 0.0, 'Income': 0.0, 'Count': 0})
+            totals[direction] += abs(total)
+        for category, count in chunk.groupby('Category').size().items():
+            category_totals[category]['Count'] += int(count)
+        for (month, direction), total in chunk.groupby(['Month', 'Direction'])['Base_Amount'].sum().items():
+            totals = month_totals.setdefault(month, {'Spend': 0.0, 'Income': 0.0})
+            totals[direction] += abs(total)
+
+        for month, rows in chunk.groupby('Month'):
+            path = os.path.join(workdir, f"{month}.csv")
+            rows[['Date', 'Particulars', 'Category', 'Amount', 'Currency', 'Base_Amount']].to_csv(
+                path, mode='a', header=not os.path.exists(path), index=False, date_format='%Y-%m-%d')
+            months.add(month)
+
+    return category_totals, month_totals, sorted(months)
+
+
+@timed('stage.report')
+def write_report(path, fmt, store_path, user, start, end, base_currency=BASE_CURRENCY):
+    """
+    Write a statement for a date range
+
+    Sections: spend and income per category, per month, then every
+    transaction in date order. Rows are partitioned by month in a
+    temporary directory, so at most one month is held in memory.
+
+    Args:
+        path: Output file
+        fmt: 'csv', 'xlsx' or 'pdf'
+        store_path: Transaction store to read
+        user: User the report is for (shown in the title)
+        start: First day of the range (inclusive)
+        end: Last day of the range (inclusive)
+        base_currency: Currency totals are reported in
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    title = f"PennyWyse statement for {user}: {start:%d %b %Y} to {end:%d %b %Y} ({base_currency})"
+    if fmt == 'csv':
+        writer = CsvReportWriter(path)
+    elif fmt == 'xlsx':
+        writer = XlsxReportWriter(path)
+    elif fmt == 'pdf':
+        writer = PdfReportWriter(path, title)
+    else:
+        raise ValueError(f"Unsupported report format: {fmt}")
+
+    pdf = fmt == 'pdf'
+    with tempfile.TemporaryDirectory() as workdir:
+        category_totals, month_totals, months = _partition_by_month(store_path, start, end, base_currency, workdir)
+        try:
+            header = ['Category', f'Spend ({base_currency})', f'Income ({base_currency})', 'Transactions']
+            if pdf:
+                writer.section('Summary by category', header, widths=[3, 2, 2, 1])
+            else:
+                writer.section('Summary by category', header)
+            ranked = sorted(category_totals.items(), key=lambda item: item[1]['Spend'], reverse=True)
+            for category, totals in ranked:
+                writer.row([category, round(totals['Spend'], 2), round(totals['Income'], 2), totals['Count']])
+
+            writer.section('Summary by month', ['Month', f'Spend ({base_currency})', f'Income ({base_currency})',
+                                                f'Net ({base_currency})'])
+            for month in sorted(month_totals):
+                totals = month_totals[month]
+                writer.row([month, round(totals['Spend'], 2), round(totals['Income'], 2),
+                            round(totals['Income'] - totals['Spend'], 2)])
+
+            header = TRANSACTION_HEADER[:-1] + [f'Amount ({base_currency})']
+            if pdf:
+                writer.section('Transactions', header, widths=[1.3, 4, 1.6, 1.3, 0.9, 1.4])
+            else:
+                writer.section('Transactions', header)
+            for month in months:
+                rows = pd.read_csv(os.path.join(workdir, f"{month}.csv"), keep_default_na=False)
+                rows = rows.sort_values('Date', kind='stable')
+                for values in rows.itertuples(index=False, name=None):
+                    day, particulars, category, amount, row_currency, base_amount = values
+                    writer.row([pd.Timestamp(day).date(), particulars, category, float(amount), row_currency,
+                                float(base_amount)])
+        finally:
+            writer.close()
+
+
+def report_cache_path(user, start, end, fmt, base_currency, store_path=TRANSACTIONS_PATH):
+    """
+    Cache file of a report; changes whenever the store's data version does
+
+    Returns:
+        str: Path under REPORTS_DIR
+    """
+    key = '|'.join([user, str(pd.Timestamp(start).date()), str(pd.Timestamp(end).date()),
+                    fmt, base_currency, data_version(store_path)])
+    return os.path.join(REPORTS_DIR, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}.{fmt}")
+
+
+def _cached_files():
+    return [path for path in glob.glob(os.path.join(REPORTS_DIR, '*.*')) if not path.endswith('.part')]
+
+
+def _cache_usage():
+    files = _cached_files()
+    return len(files), sum(os.path.getsize(path) for path in files if os.path.exists(path))
+
+
+_report_cache = CacheCounters('reports', usage=_cache_usage)
+
+
+def _prune_cache():
+    files = sorted(_cached_files(), key=os.path.getmtime)
+    for path in files[:-REPORT_CACHE_LIMIT]:
+        try:
+            os.remove(path)
+            _report_cache.evicted()
+        except OSError:
+            pass
+
+
+def generate_report(user, start, end, fmt='csv', base_currency=BASE_CURRENCY, store_path=TRANSACTIONS_PATH):
+    """
+    Cached report for (user, range, format, data version)
+
+    Returns:
+        str: Path of the generated (or previously cached) report
+    """
+    path = report_cache_path(user, start, end, fmt, base_currency, store_path)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    partial = f"{path}.{threading.get_ident()}.part"
+    try:
+        write_report(partial, fmt, store_path, user, start, end, base_currency)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    _prune_cache()
+    return path
+
+
+class ReportJobs:
+    """
+    Background report generation
+
+    Jobs are keyed by their cache path, so requesting a report that is
+    already being generated joins the running job. Finished jobs are
+    pruned retention seconds after they finish.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS, retention=REPORT_JOB_RETENTION_SECONDS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report')
+        self.retention = retention
+        self.jobs = {}
+        self.finished = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now=None):
+        """Forget jobs that finished more than retention seconds ago (lock held)"""
+        now = now if now is not None else time.monotonic()
+        for job_id, finished in list(self.finished.items()):
+            if now - finished > self.retention:
+                del self.finished[job_id]
+                self.jobs.pop(job_id, None)
+
+    def submit(self, user, start, end, fmt, base_currency=BASE_CURRENCY, store_path=TRANSACTIONS_PATH):
+        """
+        Start (or join) generation of a report
+
+        Returns:
+            str: Job id for status()
+        """
+        job_id = report_cache_path(user, start, end, fmt, base_currency, store_path)
+        with self._lock:
+            self._prune()
+            future = self.jobs.get(job_id)
+            if future is not None and not (future.done() and future.exception() is not None):
+                return job_id
+            self.finished.pop(job_id, None)
+            future = self.jobs[job_id] = self.executor.submit(
+                generate_report, user, start, end, fmt, base_currency, store_path)
+        # Outside the lock: runs right away if the job already finished
+        future.add_done_callback(lambda done: self._finished(job_id, done))
+        return job_id
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            if self.jobs.get(job_id) is future:
+                self.finished[job_id] = time.monotonic()
+
+    def status(self, job_id):
+        """
+        State of a job
+
+        Returns:
+            tuple: ('running', None), ('done', path) or ('error', message)
+        """
+        future = self.jobs.get(job_id)
+        if future is None:
+            # Pruned; the report itself may still be cached
+            if os.path.exists(job_id):
+                return ('done', job_id)
+            return ('error', 'Unknown report job')
+        if not future.done():
+            return ('running', None)
+        if future.exception() is not None:
+            return ('error', str(future.exception()))
+        return ('done', future.result())
+
+    def pending(self):
+        """Number of reports still being generated"""
+        with self._lock:
+            self._prune()
+            return sum(1 for future in self.jobs.values() if not future.done())
+
+
+# Shared by every session in this process
+report_jobs = ReportJobs()
+registry.gauge('reports.pending', report_jobs.pending)
+
+
+def request_report(user, start, end, fmt='csv', base_currency=BASE_CURRENCY, store_path=TRANSACTIONS_PATH):
+    """
+    Get a report now, or start it in the background if it's a long range
+
+    Returns:
+        tuple: ('done', path) when cached or generated inline, otherwise
+               ('running', job_id)
+    """
+    path = report_cache_path(user, start, end, fmt, base_currency, store_path)
+    if os.path.exists(path):
+        _report_cache.hit()
+        return ('done', path)
+    _report_cache.miss()
+    if (pd.Timestamp(end) - pd.Timestamp(start)).days > BACKGROUND_RANGE_DAYS:
+        return ('running', report_jobs.submit(user, start, end, fmt, base_currency, store_path))
+    return ('done', generate_report(user, start, end, fmt, base_currency, store_path))
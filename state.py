@@ -0,0 +1,918 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from io import BytesIO
+from contextlib import closing, contextmanager
+import pandas as pd
+from caching import CacheCounters
+from compaction import read_transactions, request_compaction
+from lazy_imports import load_module
+from metrics import registry, timed
+from storage import (TRANSACTION_COLUMNS, _normalize_transactions, append_transactions, data_version, read_rows,
+                     row_end, user_key, user_paths, user_shard, write_transactions)
+
+# Where state shared between processes lives. 'local' keeps it in data/
+# files and SQLite databases, so the app and its import workers must share
+# one disk; 'redis' keeps it on a Redis-compatible server at REDIS_URL, so
+# any number of app replicas and workers on any machine can serve any user
+# (needs the redis package; rediss:// URLs connect over TLS).
+# Workspaces, metrics and generated reports stay per process either way:
+# they are rebuilt from this shared state.
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'local')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+# Connections found dead after this long idle are reopened before use
+REDIS_HEALTH_CHECK_SECONDS = 30
+# Prefix of every key written, so several deployments can share a server
+KEY_PREFIX = os.environ.get('STATE_KEY_PREFIX', 'pennywyse')
+
+JOBS_PATH = 'data/jobs.sqlite'
+SHARED_CACHE_PATH = 'data/shared_cache.sqlite'
+# Replica-local copies of networked transaction logs; safe to delete
+MIRROR_DIR = 'data/mirror'
+
+# Networked values are kept small: the server copies a value while every
+# other client waits. Appends are split into batches of at most BATCH_ROWS
+# rows (under 1 MB), mirrors fetch MIRROR_FETCH_BATCHES at a time and job
+# payloads are stored as chunks of PAYLOAD_CHUNK_BYTES.
+BATCH_ROWS = 10000
+MIRROR_FETCH_BATCHES = 4
+PAYLOAD_CHUNK_BYTES = 1024 * 1024
+
+JOB_POLL_SECONDS = 0.5
+# Finished jobs (and their results) are kept this long for status checks
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Per-user write locks: waiters give up after LOCK_WAIT_SECONDS. Networked
+# locks are leases of LOCK_LEASE_SECONDS, renewed while held, so a crashed
+# holder can't block a user for longer than that.
+LOCK_WAIT_SECONDS = 600
+LOCK_LEASE_SECONDS = 60
+LOCK_POLL_SECONDS = 0.1
+# Jobs are leased to the worker that claimed them the same way; jobs whose
+# lease has lapsed this long are put back on the queue
+JOB_LEASE_SECONDS = 60
+
+# Run atomically on the server, so a lease is only renewed or removed
+# while it still holds the caller's token. A GET followed by PEXPIRE/DEL
+# could act on a lease that expired and was taken by someone else between
+# the two round trips.
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+# Moves claimed jobs without a lease back to the head of the queue once
+# they have been seen without one for longer than the grace period (a
+# claim sets its lease one round trip after taking the job).
+# KEYS: processing list, queue, suspects hash
+# ARGV: lease key prefix, now, grace seconds
+REQUEUE_STALE_SCRIPT = """
+local requeued = {}
+for _, id in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    if redis.call('EXISTS', ARGV[1] .. id) == 1 then
+        redis.call('HDEL', KEYS[3], id)
+    else
+        local seen = redis.call('HGET', KEYS[3], id)
+        if not seen then
+            redis.call('HSET', KEYS[3], id, ARGV[2])
+        elseif tonumber(ARGV[2]) - tonumber(seen) > tonumber(ARGV[3]) then
+            redis.call('LREM', KEYS[1], 1, id)
+            redis.call('LPUSH', KEYS[2], id)
+            redis.call('HDEL', KEYS[3], id)
+            table.insert(requeued, id)
+        end
+    end
+end
+return requeued
+"""
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _keep_lease(renew, key, token, lease_seconds, name):
+    """
+    Renew a networked lease from a daemon thread
+
+    Args:
+        renew: Registered RENEW_LEASE_SCRIPT, or a callable taking the
+               same keys and args
+        key: Lease key
+        token: Value the lease was taken with
+        lease_seconds: Lease length; renewed every third of it
+        name: Thread name
+
+    Returns:
+        threading.Event: Set it to stop renewing
+    """
+    stop = threading.Event()
+    lease_ms = int(lease_seconds * 1000)
+
+    def run():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                if not renew(keys=[key], args=[token, lease_ms]):
+                    print(f"Error renewing lease {key}: it expired")
+                    return
+            except Exception as e:
+                print(f"Error renewing lease: {str(e)}")
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return stop
+
+
+# --- USER STORE ---
+
+class UserStore:
+    """
+    Per-user settings documents (budgets, goals), stored as JSON
+
+    Implementations provide get() and put(); the typed helpers keep the
+    documents in the shape the app expects.
+    """
+
+    def get(self, email, name, default=None):
+        raise NotImplementedError
+
+    def put(self, email, name, value):
+        raise NotImplementedError
+
+    def load_budgets(self, email):
+        """
+        Monthly budgets per category
+
+        Returns:
+            dict: Category name -> monthly budget amount
+        """
+        try:
+            return {name: float(amount) for name, amount in self.get(email, 'budgets', {}).items()}
+        except (AttributeError, TypeError, ValueError):
+            return {}
+
+    def save_budgets(self, email, budgets):
+        self.put(email, 'budgets', {name: float(amount) for name, amount in budgets.items() if amount and amount > 0})
+
+    def load_goals(self, email):
+        """
+        Saved financial goals
+
+        Returns:
+            list: Goal dicts
+        """
+        goals = self.get(email, 'goals', [])
+        return goals if isinstance(goals, list) else []
+
+    def save_goals(self, email, goals):
+        self.put(email, 'goals', goals)
+
+
+class LocalUserStore(UserStore):
+    """User documents as JSON files in the user's shard (see storage.user_paths)"""
+
+    def _path(self, email, name):
+        paths = user_paths(email)
+        return paths.get(name) or os.path.join(os.path.dirname(paths['budgets']), f"{name}.json")
+
+    def get(self, email, name, default=None):
+        try:
+            with open(self._path(email, name), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def put(self, email, name, value):
+        path = self._path(email, name)
+        # Written aside and renamed, so readers in other processes never
+        # see a half-written document
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(value, f, indent=2, default=str)
+        os.replace(temp_path, path)
+
+
+class RedisUserStore(UserStore):
+    """User documents as JSON strings on a Redis-compatible server"""
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, email, name):
+        return f"{self.prefix}:user:{user_key(email)}:{name}"
+
+    def get(self, email, name, default=None):
+        value = self.client.get(self._key(email, name))
+        if value is None:
+            return default
+        try:
+            return json.loads(value)
+        except ValueError:
+            return default
+
+    def put(self, email, name, value):
+        self.client.set(self._key(email, name), json.dumps(value, default=str))
+
+
+# --- TRANSACTION STORE ---
+
+class TransactionStore:
+    """
+    A user's transactions, readable and writable from any process
+
+    Every implementation keeps an up-to-date CSV of the store on local
+    disk (path()), so the dedup index and streaming readers work the same
+    way on either backend. Each process remembers how far it has read each
+    user's store: load() returns that snapshot, and sync() the rows added
+    since (by this or any other process), so in-memory aggregates can be
+    updated instead of rebuilt.
+    """
+
+    def __init__(self):
+        # email -> bytes of the user's store file this process has read
+        self._seen = {}
+        self._seen_lock = threading.Lock()
+        self._held = threading.local()
+
+    def path(self, email):
+        """
+        Local CSV file of a user's store, brought up to date
+
+        Args:
+            email: Authenticated email (None for the legacy shared store)
+
+        Returns:
+            str: Path of the file
+        """
+        raise NotImplementedError
+
+    def append(self, email, df, index=None):
+        """
+        Add transactions to a user's store
+
+        Rows are not checked for duplicates; callers doing so should hold
+        lock(email) across the check and the append.
+
+        Args:
+            email: Authenticated email
+            df: DataFrame of new transactions
+            index: Open DedupIndex of path(email) to update (opened if omitted)
+
+        Returns:
+            pd.DataFrame: The rows as written (normalized)
+        """
+        raise NotImplementedError
+
+    def _acquire(self, email):
+        """Take the user's write lock; returns a callable releasing it"""
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self, email):
+        """
+        Hold a user's write lock, across processes and machines
+
+        Re-entrant within a thread, so locked sections can call append().
+        """
+        held = self._held.__dict__.setdefault('users', {})
+        key = user_key(email)
+        if held.get(key):
+            held[key] += 1
+            try:
+                yield
+            finally:
+                held[key] -= 1
+            return
+        release = self._acquire(email)
+        held[key] = 1
+        try:
+            yield
+        finally:
+            del held[key]
+            release()
+
+    def load(self, email):
+        """
+        All of a user's transactions, as of this process's last sync
+
+        Read from the store's compacted months plus the log after them
+        (see compaction), so rows aren't in the order they were stored.
+
+        Returns:
+            pd.DataFrame: Stored transactions (empty if none yet)
+        """
+        path = self.path(email)
+        request_compaction(path)
+        with self._seen_lock:
+            end = self._seen.get(email)
+        if end is None:
+            df, end = read_transactions(path)
+            with self._seen_lock:
+                self._seen.setdefault(email, end)
+            return df
+        return read_transactions(path, end)[0]
+
+    @timed('stage.sync')
+    def sync(self, email):
+        """
+        Transactions added to a user's store since this process last read it
+
+        Returns:
+            pd.DataFrame: New rows in the order they were stored (empty if
+                          none, or if the store wasn't read yet)
+        """
+        path = self.path(email)
+        with self._seen_lock:
+            start = self._seen.get(email)
+            if start is None:
+                self._seen[email] = row_end(path)
+                return _normalize_transactions(pd.DataFrame(columns=TRANSACTION_COLUMNS))
+            df, self._seen[email] = read_rows(path, start, _size(path))
+        return df
+
+    def version(self, email):
+        """Version tag of a user's store, changing whenever rows are added"""
+        return data_version(self.path(email))
+
+
+class _SQLiteLock:
+    """
+    Cross-process lock backed by an exclusive SQLite transaction
+
+    Portable where fcntl/msvcrt locks are not, and released by the OS if
+    the holder dies.
+    """
+
+    def __init__(self, path, timeout=LOCK_WAIT_SECONDS):
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        try:
+            self.conn.execute('BEGIN EXCLUSIVE')
+        except sqlite3.OperationalError:
+            self.conn.close()
+            raise TimeoutError(f"Timed out waiting for the lock on {path}")
+
+    def release(self):
+        self.conn.execute('ROLLBACK')
+        self.conn.close()
+
+
+class LocalTransactionStore(TransactionStore):
+    """Transactions in the user's CSV shard (see storage.user_paths)"""
+
+    def path(self, email):
+        return user_paths(email)['transactions']
+
+    def append(self, email, df, index=None):
+        with self.lock(email):
+            rows = append_transactions(df, self.path(email), index)
+        request_compaction(self.path(email))
+        return rows
+
+    def _acquire(self, email):
+        return _SQLiteLock(os.path.splitext(self.path(email))[0] + '.lock').release
+
+
+class RedisTransactionStore(TransactionStore):
+    """
+    Transactions as a per-user log of CSV batches on a Redis-compatible server
+
+    Appends push their rows as batches; each machine mirrors the log into a
+    local CSV under MIRROR_DIR, fetching only the batches it doesn't have
+    yet. A sidecar records how many batches and bytes the
+    mirror holds, so a write cut short by a crash is rolled back and
+    fetched again.
+    """
+
+    def __init__(self, client, prefix=KEY_PREFIX, mirror_dir=MIRROR_DIR):
+        super().__init__()
+        self.client = client
+        self._renew = client.register_script(RENEW_LEASE_SCRIPT)
+        self._release = client.register_script(RELEASE_LEASE_SCRIPT)
+        self.prefix = prefix
+        self.mirror_dir = mirror_dir
+
+    def _key(self, email, kind='tx'):
+        return f"{self.prefix}:{kind}:{user_key(email)}"
+
+    def _mirror_path(self, email):
+        if not email:
+            os.makedirs(self.mirror_dir, exist_ok=True)
+            return os.path.join(self.mirror_dir, 'transactions.csv')
+        return os.path.join(user_shard(email, self.mirror_dir), 'transactions.csv')
+
+    def path(self, email):
+        path = self._mirror_path(email)
+        self._refresh(email, path)
+        return path
+
+    def _refresh(self, email, path, index=None):
+        """Append log batches the mirror doesn't hold yet"""
+        length = self.client.llen(self._key(email))
+        conn = sqlite3.connect(os.path.splitext(path)[0] + '.mirror.sqlite', timeout=LOCK_WAIT_SECONDS,
+                               isolation_level=None)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS mirror (batches INTEGER, bytes INTEGER)")
+            row = conn.execute("SELECT batches, bytes FROM mirror").fetchone()
+            if row is not None and row[0] >= length:
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT batches, bytes FROM mirror").fetchone()
+            batches, nbytes = row if row is not None else (0, 0)
+            if batches >= length:
+                conn.execute('ROLLBACK')
+                return
+            if _size(path) != nbytes:
+                with open(path, 'ab') as f:
+                    f.truncate(nbytes)
+
+            while batches < length:
+                blobs = self.client.lrange(self._key(email), batches,
+                                           min(batches + MIRROR_FETCH_BATCHES, length) - 1)
+                rows = pd.concat([pd.read_csv(BytesIO(blob), header=None, names=TRANSACTION_COLUMNS,
+                                              dtype={'Transaction_ID': str}) for blob in blobs], ignore_index=True)
+                # Replicas that never dedup don't pay for the index; it
+                # catches up when opened (see DedupIndex)
+                if index is not None:
+                    append_transactions(rows, path, index)
+                else:
+                    write_transactions(rows, path)
+                batches += len(blobs)
+            conn.execute("DELETE FROM mirror")
+            conn.execute("INSERT INTO mirror VALUES (?, ?)", (batches, _size(path)))
+            conn.execute('COMMIT')
+        finally:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            conn.close()
+
+    def append(self, email, df, index=None):
+        rows = _normalize_transactions(df)
+        if rows.empty:
+            return rows
+        batches = [rows.iloc[start:start + BATCH_ROWS].to_csv(header=False, index=False, date_format='%Y-%m-%d')
+                   for start in range(0, len(rows), BATCH_ROWS)]
+        # One command, so a user's batches from one append stay contiguous
+        self.client.rpush(self._key(email), *(batch.encode('utf-8') for batch in batches))
+        self._refresh(email, self._mirror_path(email), index)
+        request_compaction(self._mirror_path(email))
+        return rows
+
+    def _acquire(self, email):
+        key, token = self._key(email, 'lock'), uuid.uuid4().hex
+        lease_ms = int(LOCK_LEASE_SECONDS * 1000)
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while not self.client.set(key, token, nx=True, px=lease_ms):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for the lock on {key}")
+            time.sleep(LOCK_POLL_SECONDS)
+
+        renewing = _keep_lease(self._renew, key, token, LOCK_LEASE_SECONDS, 'lock-renewal')
+
+        def release():
+            renewing.set()
+            # Only remove our own lease; an expired one may belong to someone else now
+            self._release(keys=[key], args=[token])
+        return release
+
+
+# --- JOB QUEUE ---
+
+class JobQueue:
+    """
+    Jobs handed from app replicas to worker processes
+
+    A job is a kind and a JSON-serializable payload. Workers claim the
+    oldest queued job and finish it with a result or an error; status()
+    reports it as queued, running, done or failed until it is pruned
+    JOB_RETENTION_SECONDS after finishing.
+    """
+
+    def enqueue(self, kind, payload):
+        """
+        Queue a job
+
+        Returns:
+            str: Job id
+        """
+        raise NotImplementedError
+
+    def claim(self, worker, timeout=JOB_POLL_SECONDS):
+        """
+        Take the oldest queued job, waiting up to timeout seconds for one
+
+        Returns:
+            dict or None: id, kind and payload
+        """
+        raise NotImplementedError
+
+    def finish(self, job_id, result=None, error=None):
+        """Record a claimed job's result, or the error it failed with"""
+        raise NotImplementedError
+
+    def status(self, job_id):
+        """
+        Current state of a job
+
+        Returns:
+            dict or None: id, kind, status, result, error, worker, created,
+                          started, finished (None if unknown or pruned)
+        """
+        raise NotImplementedError
+
+    def pending(self):
+        """Number of queued jobs"""
+        raise NotImplementedError
+
+    def wait(self, job_id, timeout):
+        """
+        Poll a job until it finishes or timeout seconds pass
+
+        Returns:
+            dict or None: Its last status
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.status(job_id)
+            if job is None or job['status'] in ('done', 'failed') or time.monotonic() >= deadline:
+                return job
+            time.sleep(JOB_POLL_SECONDS)
+
+
+class LocalJobQueue(JobQueue):
+    """
+    Jobs in a SQLite database shared by the processes of one machine
+
+    A claimed job holds a lease (a deadline and a token) that is renewed
+    until the job is finished. claim() puts running jobs whose lease has
+    lapsed back on the queue, so a job whose worker died or whose app was
+    restarted mid-job is picked up again.
+    """
+
+    def __init__(self, path=JOBS_PATH, lease_seconds=JOB_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # job id -> event stopping its lease renewal, for jobs claimed here
+        self._leases = {}
+        self._leases_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, status TEXT, "
+                         "payload TEXT, result TEXT, error TEXT, worker TEXT, created REAL, started REAL, "
+                         "finished REAL, lease_until REAL, lease_token TEXT)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (('lease_until', 'REAL'), ('lease_token', 'TEXT')):
+                if column not in columns:  # Databases from before leases
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT INTO jobs (id, kind, status, payload, created) VALUES (?, ?, 'queued', ?, ?)",
+                         (job_id, kind, json.dumps(payload), time.time()))
+        return job_id
+
+    def _renew(self, keys, args):
+        """Push a job's lease deadline back if it still holds our token"""
+        (job_id,), (token, lease_ms) = keys, args
+        with closing(self._connect()) as conn:
+            return conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' "
+                                "AND lease_token = ?", (time.time() + lease_ms / 1000, job_id, token)).rowcount
+
+    def claim(self, worker, timeout=JOB_POLL_SECONDS):
+        deadline = time.monotonic() + timeout
+        while True:
+            now, token = time.time(), uuid.uuid4().hex
+            with closing(self._connect()) as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                # Requeued jobs keep their created time, so they go first
+                requeued = conn.execute("SELECT id FROM jobs WHERE status = 'running' AND "
+                                        "(lease_until IS NULL OR lease_until < ?)", (now,)).fetchall()
+                for (job_id,) in requeued:
+                    conn.execute("UPDATE jobs SET status = 'queued', lease_until = NULL, lease_token = NULL "
+                                 "WHERE id = ?", (job_id,))
+                row = conn.execute("SELECT id, kind, payload FROM jobs WHERE status = 'queued' "
+                                   "ORDER BY created LIMIT 1").fetchone()
+                if row is not None:
+                    conn.execute("UPDATE jobs SET status = 'running', worker = ?, started = ?, lease_until = ?, "
+                                 "lease_token = ? WHERE id = ?",
+                                 (worker, now, now + self.lease_seconds, token, row[0]))
+                conn.execute('COMMIT')
+            for (job_id,) in requeued:
+                print(f"Requeued job {job_id}: its worker stopped renewing the lease")
+            if row is not None:
+                renewing = _keep_lease(self._renew, row[0], token, self.lease_seconds, 'job-lease')
+                with self._leases_lock:
+                    self._leases[row[0]] = renewing
+                return {'id': row[0], 'kind': row[1], 'payload': json.loads(row[2])}
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(JOB_POLL_SECONDS)
+
+    def finish(self, job_id, result=None, error=None):
+        with self._leases_lock:
+            renewing = self._leases.pop(job_id, None)
+        if renewing is not None:
+            renewing.set()
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, payload = NULL, "
+                         "lease_until = NULL, lease_token = NULL WHERE id = ?",
+                         ('failed' if error else 'done', json.dumps(result), error, now, job_id))
+            conn.execute("DELETE FROM jobs WHERE finished < ?", (now - JOB_RETENTION_SECONDS,))
+
+    def status(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT id, kind, status, result, error, worker, created, started, finished "
+                               "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(['id', 'kind', 'status', 'result', 'error', 'worker', 'created', 'started', 'finished'], row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def pending(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Jobs on a Redis-compatible server: a list of queued ids, plus a JSON
+    record and a chunked JSON payload per job
+
+    Claiming moves a job's id to a processing list and takes a lease on
+    it, renewed until the job is finished. A job whose worker dies is put
+    back at the head of the queue once its lease lapses; until another
+    worker claims it, its record still shows the old worker.
+    """
+
+    def __init__(self, client, prefix=KEY_PREFIX, lease_seconds=JOB_LEASE_SECONDS):
+        self.client = client
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.queue_key = f"{prefix}:jobs:queue"
+        self.processing_key = f"{prefix}:jobs:processing"
+        self.suspects_key = f"{prefix}:jobs:suspects"
+        self._renew = client.register_script(RENEW_LEASE_SCRIPT)
+        self._requeue_stale = client.register_script(REQUEUE_STALE_SCRIPT)
+        # job id -> event stopping its lease renewal, for jobs claimed here
+        self._leases = {}
+        self._leases_lock = threading.Lock()
+        self._next_sweep = 0
+
+    def _key(self, job_id, part='job'):
+        return f"{self.prefix}:{part}:{job_id}"
+
+    def _save(self, job, client=None):
+        (client or self.client).set(self._key(job['id']), json.dumps(job), ex=JOB_RETENTION_SECONDS)
+
+    def _load_payload(self, job_id):
+        chunks = self.client.lrange(self._key(job_id, 'payload'), 0, -1)
+        return json.loads(b''.join(chunks)) if chunks else None
+
+    def enqueue(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        data = json.dumps(payload).encode('utf-8')
+        key = self._key(job_id, 'payload')
+        # One round trip, applied as a whole: a worker never sees the id
+        # before the payload and record it points to
+        with self.client.pipeline() as pipe:
+            pipe.rpush(key, *(data[start:start + PAYLOAD_CHUNK_BYTES]
+                              for start in range(0, len(data), PAYLOAD_CHUNK_BYTES)))
+            pipe.expire(key, JOB_RETENTION_SECONDS)
+            self._save({'id': job_id, 'kind': kind, 'status': 'queued', 'result': None, 'error': None,
+                        'worker': None, 'created': time.time(), 'started': None, 'finished': None}, pipe)
+            pipe.rpush(self.queue_key, job_id)
+            pipe.execute()
+        return job_id
+
+    def requeue_stale(self):
+        """
+        Put claimed jobs whose lease lapsed back on the queue
+
+        Called from claim() at most every third of a lease.
+
+        Returns:
+            list: Ids of the jobs requeued
+        """
+        requeued = self._requeue_stale(keys=[self.processing_key, self.queue_key, self.suspects_key],
+                                       args=[self._key('', 'lease'), time.time(), self.lease_seconds])
+        return [job_id.decode('utf-8') for job_id in requeued]
+
+    def _unclaim(self, job_id, requeue=False, pipe=None):
+        """
+        Drop a job from the processing list, optionally back to the head
+        of the queue (queued on pipe if given, else sent right away)
+        """
+        with self._leases_lock:
+            renewing = self._leases.pop(job_id, None)
+        if renewing is not None:
+            renewing.set()
+        commands = pipe if pipe is not None else self.client.pipeline()
+        commands.lrem(self.processing_key, 1, job_id)
+        if requeue:
+            commands.lpush(self.queue_key, job_id)
+        commands.delete(self._key(job_id, 'lease'))
+        commands.hdel(self.suspects_key, job_id)
+        if pipe is None:
+            commands.execute()
+
+    def claim(self, worker, timeout=JOB_POLL_SECONDS):
+        deadline = time.monotonic() + timeout
+        while True:
+            if time.monotonic() >= self._next_sweep:
+                self._next_sweep = time.monotonic() + self.lease_seconds / 3
+                for job_id in self.requeue_stale():
+                    print(f"Requeued job {job_id}: its worker stopped renewing the lease")
+
+            wait = max(1, int(deadline - time.monotonic() + 0.999))
+            job_id = self.client.blmove(self.queue_key, self.processing_key, wait, 'LEFT', 'RIGHT')
+            if job_id is None:
+                return None
+            job_id = job_id.decode('utf-8')
+            lease_key, token = self._key(job_id, 'lease'), uuid.uuid4().hex
+            self.client.set(lease_key, token, px=int(self.lease_seconds * 1000))
+            try:
+                job, payload = self.status(job_id), self._load_payload(job_id)
+            except Exception:
+                # Back to the head of the queue for the next attempt
+                self._unclaim(job_id, requeue=True)
+                raise
+            if job is None or payload is None:
+                self._unclaim(job_id)
+                if time.monotonic() >= deadline:
+                    return None
+                continue  # Expired while queued
+            job.update(status='running', worker=worker, started=time.time())
+            self._save(job)
+            renewing = _keep_lease(self._renew, lease_key, token, self.lease_seconds, 'job-lease')
+            with self._leases_lock:
+                self._leases[job_id] = renewing
+            return {'id': job_id, 'kind': job['kind'], 'payload': payload}
+
+    def finish(self, job_id, result=None, error=None):
+        job = self.status(job_id) or {'id': job_id, 'kind': None, 'worker': None, 'created': None, 'started': None}
+        job.update(status='failed' if error else 'done', result=result, error=error, finished=time.time())
+        with self.client.pipeline() as pipe:
+            self._save(job, pipe)
+            pipe.delete(self._key(job_id, 'payload'))
+            self._unclaim(job_id, pipe=pipe)
+            pipe.execute()
+
+    def status(self, job_id):
+        value = self.client.get(self._key(job_id))
+        return json.loads(value) if value is not None else None
+
+    def pending(self):
+        return self.client.llen(self.queue_key)
+
+
+# --- SHARED CACHE ---
+
+class SharedCache:
+    """
+    Text values shared by every process, with expiry
+
+    A second tier behind the in-process BoundedCaches for results that are
+    expensive to recompute anywhere, such as AI extractions.
+    """
+
+    def __init__(self):
+        self.counters = CacheCounters('shared_cache')
+
+    def get(self, namespace, key):
+        """
+        Cached text, or None on a miss
+        """
+        value = self._get(f"{namespace}:{key}")
+        if value is None:
+            self.counters.miss()
+        else:
+            self.counters.hit()
+        return value
+
+    def put(self, namespace, key, value, ttl=None):
+        """
+        Store text for ttl seconds (None for no expiry)
+
+        Returns:
+            str: value
+        """
+        self._put(f"{namespace}:{key}", value, ttl)
+        return value
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _put(self, key, value, ttl):
+        raise NotImplementedError
+
+
+class LocalSharedCache(SharedCache):
+    """Shared cache in a SQLite database on this machine"""
+
+    def __init__(self, path=SHARED_CACHE_PATH):
+        super().__init__()
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _get(self, key):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                               (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def _put(self, key, value, ttl):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                         (key, value, now + ttl if ttl is not None else None))
+            conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+
+
+class RedisSharedCache(SharedCache):
+    """Shared cache on a Redis-compatible server (bounded by its eviction policy)"""
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    def _get(self, key):
+        value = self.client.get(f"{self.prefix}:cache:{key}")
+        return value.decode('utf-8') if value is not None else None
+
+    def _put(self, key, value, ttl):
+        self.client.set(f"{self.prefix}:cache:{key}", value, ex=max(1, int(ttl)) if ttl is not None else None)
+
+
+# --- BACKENDS ---
+
+# Shared by every session in this process
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def _backend(name):
+    with _backends_lock:
+        if not _backends:
+            if STATE_BACKEND == 'redis':
+                client = load_module('redis').Redis.from_url(REDIS_URL,
+                                                             health_check_interval=REDIS_HEALTH_CHECK_SECONDS)
+                _backends.update(users=RedisUserStore(client), transactions=RedisTransactionStore(client),
+                                 jobs=RedisJobQueue(client), cache=RedisSharedCache(client))
+            elif STATE_BACKEND == 'local':
+                _backends.update(users=LocalUserStore(), transactions=LocalTransactionStore(),
+                                 jobs=LocalJobQueue(), cache=LocalSharedCache())
+            else:
+                raise ValueError(f"Unknown STATE_BACKEND: {STATE_BACKEND}")
+            registry.gauge('jobs.pending', _backends['jobs'].pending)
+        return _backends[name]
+
+
+def is_networked():
+    """Whether state lives on a server shared by several machines"""
+    return STATE_BACKEND != 'local'
+
+
+def user_store():
+    """The configured UserStore"""
+    return _backend('users')
+
+
+def transaction_store():
+    """The configured TransactionStore"""
+    return _backend('transactions')
+
+
+def job_queue():
+    """The configured JobQueue"""
+    return _backend('jobs')
+
+
+def shared_cache():
+    """The configured SharedCache"""
+    return _backend('cache')
@@ -0,0 +1,423 @@
+import os
+import hashlib
+import sqlite3
+from io import BytesIO
+import pandas as pd
+from dedup import DATE_WINDOW_DAYS, MATCH_COLUMNS, match_duplicates, match_frame
+from metrics import timed
+
+TRANSACTIONS_PATH = 'data/transactions.csv'
+BUDGETS_PATH = 'data/budgets.json'
+GOALS_PATH = 'data/goals.json'
+# Per-user shards: data/users/<2-char prefix>/<email hash>/
+USERS_DIR = 'data/users'
+
+TRANSACTION_COLUMNS = ['Date', 'Particulars', 'Category', 'Amount', 'Currency', 'Transaction_ID']
+
+# Rows read per pass when (re)building the dedup index from the store
+INDEX_BUILD_CHUNK_SIZE = 100000
+# SQLite's default limit on bound parameters is 999
+INDEX_QUERY_BATCH = 900
+# (day, cents) blocks are packed as day * factor + cents + factor // 2
+BLOCK_DAY_FACTOR = 2 ** 40
+INDEX_VERSION = 2
+
+
+def user_key(email):
+    """
+    Stable identifier of a user, derived from their lower-cased email
+
+    Args:
+        email: Authenticated email (None for the legacy shared store)
+
+    Returns:
+        str: 24 hex digits ('shared' for None)
+    """
+    if not email:
+        return 'shared'
+    return hashlib.sha256(email.strip().lower().encode('utf-8')).hexdigest()[:24]
+
+
+def user_shard(email, root=USERS_DIR):
+    """
+    Directory holding one user's data
+
+    Users are keyed by a hash of their lower-cased email, fanned out over
+    prefix directories so no single directory grows with the user count.
+
+    Args:
+        email: Authenticated email
+        root: Root of the user shards
+
+    Returns:
+        str: Shard directory (created if missing)
+    """
+    digest = user_key(email)
+    path = os.path.join(root, digest[:2], digest)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def user_paths(email=None):
+    """
+    Store paths of a user
+
+    Args:
+        email: Authenticated email; None for the legacy shared files
+
+    Returns:
+        dict: 'transactions', 'budgets' and 'goals' paths
+    """
+    if not email:
+        return {'transactions': TRANSACTIONS_PATH, 'budgets': BUDGETS_PATH, 'goals': GOALS_PATH}
+    shard = user_shard(email)
+    return {
+        'transactions': os.path.join(shard, os.path.basename(TRANSACTIONS_PATH)),
+        'budgets': os.path.join(shard, os.path.basename(BUDGETS_PATH)),
+        'goals': os.path.join(shard, os.path.basename(GOALS_PATH))
+    }
+
+
+def _normalize_transactions(df):
+    """
+    Coerce a transaction DataFrame to the store's column layout and dtypes
+
+    Args:
+        df: Transaction DataFrame
+
+    Returns:
+        pd.DataFrame: DataFrame with TRANSACTION_COLUMNS in order
+    """
+    df = df.copy()
+    for col in TRANSACTION_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
+    return df[TRANSACTION_COLUMNS]
+
+
+def load_transactions(path=TRANSACTIONS_PATH):
+    """
+    Load all stored transactions
+
+    Args:
+        path: CSV file of the transaction store
+
+    Returns:
+        pd.DataFrame: Stored transactions (empty if none yet)
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return _normalize_transactions(pd.DataFrame(columns=TRANSACTION_COLUMNS))
+
+    try:
+        df = pd.read_csv(path, dtype={'Transaction_ID': str})
+        return _normalize_transactions(df)
+    except Exception as e:
+        print(f"Error loading transactions: {str(e)}")
+        return _normalize_transactions(pd.DataFrame(columns=TRANSACTION_COLUMNS))
+
+
+def row_end(path):
+    """Offset just past the last complete row of a store file"""
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if not size:
+        return 0
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+    return size - len(tail) + tail.rfind(b'\n') + 1
+
+
+def read_rows(path, start, end):
+    """
+    Transactions stored in a byte range of a store file
+
+    A row still being written by another process is left out; the range
+    read is returned so the caller resumes from there.
+
+    Returns:
+        tuple: (DataFrame of rows, end offset actually read)
+    """
+    data = b''
+    if end > start:
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        data = data[:data.rfind(b'\n') + 1]
+    if not data.strip():
+        return _normalize_transactions(pd.DataFrame(columns=TRANSACTION_COLUMNS)), start + len(data)
+    if start == 0:
+        df = pd.read_csv(BytesIO(data), dtype={'Transaction_ID': str})
+    else:
+        df = pd.read_csv(BytesIO(data), header=None, names=TRANSACTION_COLUMNS, dtype={'Transaction_ID': str})
+    return _normalize_transactions(df), start + len(data)
+
+
+@timed('stage.store')
+def append_transactions(new_df, path=TRANSACTIONS_PATH, index=None):
+    """
+    Append new transactions to the store without rewriting existing rows
+
+    Args:
+        new_df: DataFrame of new transactions
+        path: CSV file of the transaction store
+        index: Open DedupIndex of the store to update (opened if omitted)
+
+    Returns:
+        pd.DataFrame: The rows as written (normalized)
+    """
+    rows = _normalize_transactions(new_df)
+    if rows.empty:
+        return rows
+
+    # Opened before writing, so it doesn't index the new rows on its own
+    own_index = index is None
+    if own_index:
+        index = DedupIndex(path)
+    try:
+        write_transactions(rows, path)
+        index.add(rows)
+    finally:
+        if own_index:
+            index.close()
+    return rows
+
+
+def write_transactions(new_df, path=TRANSACTIONS_PATH):
+    """
+    Append transactions to the store file only
+
+    The store's dedup index catches up with them when it is next opened.
+
+    Args:
+        new_df: DataFrame of new transactions
+        path: CSV file of the transaction store
+
+    Returns:
+        pd.DataFrame: The rows as written (normalized)
+    """
+    rows = _normalize_transactions(new_df)
+    if not rows.empty:
+        write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+        rows.to_csv(path, mode='a', header=write_header, index=False, date_format='%Y-%m-%d')
+    return rows
+
+
+def data_version(path=TRANSACTIONS_PATH):
+    """
+    Version tag of a transaction store, changing whenever rows are written
+
+    Args:
+        path: CSV file of the transaction store
+
+    Returns:
+        str: Size and modification time of the store ('0' if it doesn't exist)
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return '0'
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def index_path(path=TRANSACTIONS_PATH):
+    """SQLite sidecar file holding the dedup index of a transaction store"""
+    return os.path.splitext(path)[0] + '.index.sqlite'
+
+
+def _block_keys(days, cents):
+    """Pack (day, amount in cents) pairs into the index's integer block key"""
+    return days * BLOCK_DAY_FACTOR + cents + BLOCK_DAY_FACTOR // 2
+
+
+class DedupIndex:
+    """
+    Persistent index of the transactions in a store, for duplicate checks
+
+    Holds the fields dedup.match_duplicates compares (day, amount,
+    currency, canonical merchant, Transaction_ID), keyed by (day, amount)
+    so imports fetch only candidate rows instead of loading the whole
+    store. The index records the store size it last saw; as the store is
+    append-only, rows written without it are indexed from that offset on
+    when it is next opened. A store that shrank is re-indexed in full.
+    """
+
+    def __init__(self, store_path=TRANSACTIONS_PATH):
+        self.store_path = store_path
+        self.conn = sqlite3.connect(index_path(store_path))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        if self._meta('version') != str(INDEX_VERSION):
+            with self.conn:
+                self.conn.execute("DROP TABLE IF EXISTS ids")
+                self.conn.execute("DROP TABLE IF EXISTS combos")
+                self.conn.execute("DROP TABLE IF EXISTS rows")
+                self.conn.execute("CREATE TABLE rows (block INTEGER, day INTEGER, cents INTEGER, "
+                                  "currency TEXT, merchant TEXT, tid TEXT)")
+                self.conn.execute("CREATE INDEX rows_block ON rows (block)")
+                self.conn.execute("CREATE INDEX rows_tid ON rows (tid)")
+                self.conn.execute("DELETE FROM meta")
+                self.conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+        synced, size = self._meta('store_size'), self._store_size()
+        if synced != str(size):
+            if synced is not None and 0 < int(synced) < size:
+                self.catch_up(int(synced))
+            else:
+                self.rebuild()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _store_size(self):
+        return os.path.getsize(self.store_path) if os.path.exists(self.store_path) else 0
+
+    def _meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _mark_synced(self, size=None):
+        size = self._store_size() if size is None else size
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('store_size', ?)", (str(size),))
+
+    def rebuild(self):
+        """Re-read the store chunk by chunk and index every row"""
+        with self.conn:
+            self.conn.execute("DELETE FROM rows")
+            if self._store_size() > 0:
+                for chunk in pd.read_csv(self.store_path, dtype={'Transaction_ID': str},
+                                         chunksize=INDEX_BUILD_CHUNK_SIZE):
+                    self._insert(chunk)
+            self._mark_synced()
+
+    def catch_up(self, offset):
+        """
+        Index rows appended to the store after byte offset
+
+        A row another process is still writing is left for the next open.
+        """
+        with open(self.store_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        data = data[:data.rfind(b'\n') + 1]
+        with self.conn:
+            if data.strip():
+                for chunk in pd.read_csv(BytesIO(data), header=None, names=TRANSACTION_COLUMNS,
+                                         dtype={'Transaction_ID': str}, chunksize=INDEX_BUILD_CHUNK_SIZE):
+                    self._insert(chunk)
+            self._mark_synced(offset + len(data))
+
+    def _insert(self, df):
+        rows = match_frame(df)
+        self.conn.executemany(
+            "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?)",
+            zip(_block_keys(rows['Day'], rows['Cents']).tolist(), rows['Day'].tolist(), rows['Cents'].tolist(),
+                rows['Currency'].tolist(), rows['Merchant'].tolist(), rows['Transaction_ID'].tolist()))
+
+    def add(self, df):
+        """
+        Record rows that were just written to the store
+
+        Args:
+            df: Transaction DataFrame
+        """
+        with self.conn:
+            self._insert(df)
+            self._mark_synced()
+
+    def last_row(self):
+        """
+        Row id of the newest indexed transaction
+
+        Row ids only grow while the index is open, so this marks what the
+        store held at a point in time (see matches).
+
+        Returns:
+            int: Highest row id (0 if the index is empty)
+        """
+        return self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM rows").fetchone()[0]
+
+    def _fetch(self, column, keys):
+        rows = []
+        keys = list(keys)
+        for start in range(0, len(keys), INDEX_QUERY_BATCH):
+            batch = keys[start:start + INDEX_QUERY_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            rows += self.conn.execute(
+                f"SELECT rowid, day, cents, currency, merchant, tid FROM rows WHERE {column} IN ({placeholders})",
+                batch).fetchall()
+        return rows
+
+    def candidates(self, df, date_window=DATE_WINDOW_DAYS, up_to=None, exclude=()):
+        """
+        Stored transactions that could duplicate rows of df
+
+        Args:
+            df: Transaction DataFrame
+            date_window: Date shift, in days, to fetch candidates for
+            up_to: Only consider rows up to this row id (see last_row)
+            exclude: Row ids to leave out
+
+        Returns:
+            pd.DataFrame: Date, Amount, Currency, Merchant, Transaction_ID
+                          indexed by index row id
+        """
+        rows = match_frame(df)
+        blocks = pd.concat([_block_keys(rows['Day'] + shift, rows['Cents'])
+                            for shift in range(-date_window, date_window + 1)]).unique()
+        fetched = self._fetch('block', (int(key) for key in blocks))
+        fetched += self._fetch('tid', rows['Transaction_ID'].dropna().unique())
+
+        found = pd.DataFrame(fetched, columns=['Row', 'Day', 'Cents', 'Currency', 'Merchant', 'Transaction_ID'])
+        found = found.drop_duplicates('Row').set_index('Row')
+        if up_to is not None:
+            found = found[found.index <= up_to]
+        if exclude:
+            found = found[~found.index.isin(exclude)]
+        return pd.DataFrame({
+            'Date': pd.Timestamp('1970-01-01') + pd.to_timedelta(found['Day'], unit='D'),
+            'Amount': found['Cents'] / 100,
+            'Currency': found['Currency'],
+            'Merchant': found['Merchant'],
+            'Transaction_ID': found['Transaction_ID']
+        }, index=found.index)
+
+    @timed('stage.dedup')
+    def matches(self, df, up_to=None, exclude=()):
+        """
+        Pair rows with the stored transactions they duplicate
+
+        Uses the same fuzzy, one-to-one matching as processor.process_data
+        (see dedup.match_duplicates), against candidates fetched from the
+        index.
+
+        Args:
+            df: Transaction DataFrame
+            up_to: Only match rows up to this row id, e.g. last_row() from
+                   before an import, so the import's own rows don't count
+            exclude: Row ids already matched, e.g. by earlier chunks
+
+        Returns:
+            pd.DataFrame: One row per match (dedup.MATCH_COLUMNS);
+                          Existing_Index holds index row ids
+        """
+        if df.empty:
+            return pd.DataFrame(columns=MATCH_COLUMNS)
+        return match_duplicates(df, self.candidates(df, up_to=up_to, exclude=exclude))
+
+    def contains(self, df):
+        """
+        Which rows already exist in the store
+
+        Args:
+            df: Transaction DataFrame
+
+        Returns:
+            pd.Series: Boolean mask aligned with df
+        """
+        return pd.Series(df.index.isin(self.matches(df)['New_Index']), index=df.index)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run from an empty directory, since data/ paths are relative"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data', exist_ok=True)
+    return tmp_path
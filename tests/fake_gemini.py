@@ -0,0 +1,98 @@
+# A stand-in for Gemini's generateContent REST endpoint, for tests and for
+# running the app offline:
+#
+#     python tests/fake_gemini.py --port 8080
+#     GEMINI_API_BASE_URL=http://localhost:8080 streamlit run app.py
+#
+# Replies are scripted: each request takes the next queued reply, and the
+# default reply (an empty CSV) once the script runs out.
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TEXT = 'Date,Particulars,Amount\n'
+# How often the server thread checks for stop(); tests start one per test
+POLL_SECONDS = 0.05
+
+
+def text_reply(text):
+    """Body of a successful generateContent response"""
+    return {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+
+
+class FakeGemini:
+    """
+    Fake Gemini server on a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+    """
+
+    def __init__(self, port=0):
+        self.replies = []
+        self.requests = []
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with fake._lock:
+                    fake.requests.append({'path': self.path, 'body': json.loads(body or b'null')})
+                    reply = fake.replies.pop(0) if fake.replies else (200, text_reply(DEFAULT_TEXT), {}, 0)
+                status, payload, headers, delay = reply
+                if delay:
+                    time.sleep(delay)
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    pass  # The client gave up waiting
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(POLL_SECONDS,),
+                                       name='fake-gemini', daemon=True)
+
+    def reply(self, status=200, payload=None, headers=None, delay=0):
+        """
+        Queue a reply
+
+        Args:
+            status: HTTP status
+            payload: JSON-serializable body or raw bytes (default: DEFAULT_TEXT)
+            headers: Extra response headers
+            delay: Seconds to wait before answering
+        """
+        with self._lock:
+            self.replies.append((status, text_reply(DEFAULT_TEXT) if payload is None else payload,
+                                 headers or {}, delay))
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini generateContent endpoint")
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    fake = FakeGemini(args.port)
+    print(f"Fake Gemini listening on {fake.url}")
+    fake.server.serve_forever()
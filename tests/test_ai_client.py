@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+import ai_client
+from fake_gemini import FakeGemini, text_reply
+
+
+@pytest.fixture
+def gemini():
+    fake = FakeGemini().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(ai_client, 'BASE_BACKOFF_SECONDS', 0.01)
+
+
+def _client(gemini, limiter=None, **kwargs):
+    return ai_client.AIClient('test-key', base_url=gemini.url, limiter=limiter or ai_client.TokenBucket(6000),
+                              concurrency=threading.BoundedSemaphore(2), **kwargs)
+
+
+def test_returns_response_text(gemini):
+    gemini.reply(payload=text_reply('Date,Particulars,Amount\n01-01-2024,SWIGGY,-100\n'))
+
+    assert _client(gemini).generate(['Extract', 'these']).endswith('SWIGGY,-100\n')
+    request, = gemini.requests
+    assert request['path'].endswith(":generateContent?key=test-key")
+    assert request['body']['contents'][0]['parts'] == [{'text': 'Extract'}, {'text': 'these'}]
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_retries_quota_and_server_errors(gemini, status):
+    gemini.reply(status, {'error': 'busy'})
+    gemini.reply(payload=text_reply('ok'))
+
+    assert _client(gemini).generate(['x']) == 'ok'
+    assert len(gemini.requests) == 2
+
+
+def test_waits_for_retry_after(gemini):
+    gemini.reply(429, {'error': 'quota'}, headers={'Retry-After': '0.3'})
+    gemini.reply(payload=text_reply('ok'))
+
+    started = time.monotonic()
+    assert _client(gemini).generate(['x']) == 'ok'
+    assert time.monotonic() - started >= 0.3
+
+
+def test_retries_timeouts(gemini):
+    gemini.reply(delay=0.5)
+    gemini.reply(payload=text_reply('ok'))
+
+    assert _client(gemini, request_timeout=0.2).generate(['x']) == 'ok'
+    assert len(gemini.requests) == 2
+
+
+def test_gives_up_after_max_retries(gemini):
+    for _ in range(3):
+        gemini.reply(503, {'error': 'down'})
+
+    with pytest.raises(ai_client.AIServiceError, match='HTTP 503'):
+        _client(gemini, max_retries=2).generate(['x'])
+    assert len(gemini.requests) == 3
+
+
+def test_timeouts_exhausted_raise_timeout_error(gemini):
+    gemini.reply(delay=0.5)
+    gemini.reply(delay=0.5)
+
+    with pytest.raises(ai_client.AITimeoutError):
+        _client(gemini, max_retries=1, request_timeout=0.2).generate(['x'])
+
+
+def test_bad_request_is_not_retried(gemini):
+    gemini.reply(400, {'error': 'bad image'})
+
+    with pytest.raises(ai_client.AIRequestError) as error:
+        _client(gemini).generate(['x'])
+    assert not error.value.retryable
+    assert len(gemini.requests) == 1
+
+
+@pytest.mark.parametrize('payload', [{'candidates': []}, text_reply('  '), b'not json'])
+def test_unusable_response_is_a_response_error(gemini, payload):
+    gemini.reply(payload=payload)
+
+    with pytest.raises(ai_client.AIResponseError):
+        _client(gemini).generate(['x'])
+    assert len(gemini.requests) == 1
+
+
+def test_missing_key_is_a_configuration_error(gemini):
+    with pytest.raises(ai_client.AIConfigurationError):
+        ai_client.AIClient('', base_url=gemini.url)
+
+
+def test_token_bucket_waits_for_a_refill():
+    bucket = ai_client.TokenBucket(600, capacity=1)  # One token per 0.1s
+    assert bucket.acquire(timeout=0)
+
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert 0.05 <= time.monotonic() - started < 0.5
+    assert not bucket.acquire(timeout=0.01)
+
+
+def test_requests_queue_behind_the_rate_limit(gemini):
+    client = _client(gemini, limiter=ai_client.TokenBucket(600, capacity=1))
+
+    started = time.monotonic()
+    for _ in range(3):
+        client.generate(['x'])
+    assert time.monotonic() - started >= 0.15
+    assert len(gemini.requests) == 3
+
+
+def test_no_quota_within_queue_timeout_is_queue_full(gemini):
+    limiter = ai_client.TokenBucket(1, capacity=1)
+    limiter.acquire()
+
+    with pytest.raises(ai_client.AIQueueFullError):
+        _client(gemini, limiter=limiter, queue_timeout=0.05).generate(['x'])
+    assert gemini.requests == []
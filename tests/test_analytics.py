@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from analytics import MetricsCube
+
+TODAY = pd.Timestamp('2024-04-10')
+
+
+def _rows(*items):
+    return pd.DataFrame([{'Date': pd.Timestamp(day), 'Particulars': category.upper(), 'Category': category,
+                          'Amount': amount, 'Currency': 'INR'} for day, category, amount in items])
+
+
+HISTORY = _rows(('2024-02-01', 'Salary', 50000.0), ('2024-02-03', 'Food', -2000.0), ('2024-02-10', 'Travel', -3000.0),
+                ('2024-03-01', 'Salary', 60000.0), ('2024-03-05', 'Food', -6000.0), ('2024-03-20', 'Food', -3000.0),
+                ('2024-03-21', 'Travel', -1000.0))
+LATER = _rows(('2024-03-25', 'Travel', -12000.0), ('2024-04-02', 'Food', -500.0), ('2024-04-03', 'Salary', 1000.0))
+
+
+@pytest.fixture(autouse=True)
+def no_rates(workdir):
+    """Every row is in INR; no exchange rate file"""
+
+
+def test_month_rollups():
+    cube = MetricsCube(HISTORY)
+
+    assert cube.months() == ['2024-02', '2024-03']
+    metrics = cube.month_metrics('2024-03', today=TODAY)
+    assert (metrics['income'], metrics['spend']) == (60000.0, 10000.0)
+    assert metrics['avg_daily_spend'] == pytest.approx(10000 / 31)
+    assert (metrics['top_category'], metrics['top_share']) == ('Food', 0.9)
+    assert metrics['savings_rate'] == pytest.approx(50000 / 60000)
+    assert cube.category_breakdown('2024-03').to_dict() == {'Food': 9000.0, 'Travel': 1000.0}
+    assert cube.category_trend('Food').to_dict() == {'2024-02': 2000.0, '2024-03': 9000.0}
+
+
+def test_current_month_counts_elapsed_days_only():
+    cube = MetricsCube(_rows(('2024-04-02', 'Food', -1000.0)))
+
+    assert cube.month_metrics('2024-04', today=TODAY)['avg_daily_spend'] == 100.0
+    assert cube.month_metrics('2024-05', today=TODAY)['top_category'] == 'N/A'
+
+
+def test_month_over_month_deltas():
+    cube = MetricsCube(HISTORY)
+
+    deltas = cube.month_over_month('2024-03', today=TODAY)['deltas']
+    assert deltas['avg_daily_spend'] == pytest.approx((10000 / 31 - 5000 / 29) / (5000 / 29))
+    assert deltas['top_share'] == pytest.approx((0.9 - 0.6) / 0.6)
+    assert deltas['savings_rate'] == pytest.approx(50000 / 60000 - 45000 / 50000)
+    # No previous month
+    assert cube.month_over_month('2024-02', today=TODAY)['deltas'] == {
+        'avg_daily_spend': None, 'top_share': None, 'savings_rate': None}
+
+
+def _assert_same_cube(updated, rebuilt):
+    pd.testing.assert_frame_equal(updated.cells.sort_index(), rebuilt.cells.sort_index())
+    assert updated.rollups.keys() == rebuilt.rollups.keys()
+    for key, rollup in rebuilt.rollups.items():
+        assert updated.rollups[key]['top_category'] == rollup['top_category']
+        assert {name: value for name, value in updated.rollups[key].items() if name != 'top_category'} == \
+            pytest.approx({name: value for name, value in rollup.items() if name != 'top_category'})
+
+
+def test_update_matches_a_full_rebuild():
+    updated = MetricsCube(HISTORY)
+    # Changes March's top category, adds a month
+    updated.update(LATER)
+
+    _assert_same_cube(updated, MetricsCube(pd.concat([HISTORY, LATER], ignore_index=True)))
+    assert updated.month_metrics('2024-03', today=TODAY)['top_category'] == 'Travel'
+
+
+def test_update_of_an_empty_cube_and_with_nothing_new():
+    updated = MetricsCube()
+    updated.update(HISTORY)
+    updated.update(_rows())
+
+    _assert_same_cube(updated, MetricsCube(HISTORY))
+
+
+def test_users_are_kept_apart():
+    cube = MetricsCube(HISTORY, user='a@b.com')
+    cube.update(LATER, user='c@d.com')
+
+    assert cube.months('a@b.com') == ['2024-02', '2024-03']
+    assert cube.months('c@d.com') == ['2024-03', '2024-04']
+    assert cube.month_metrics('2024-03', user='a@b.com', today=TODAY)['spend'] == 10000.0
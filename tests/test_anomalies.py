@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomalies import AnomalyDetector, QuantileSketch, RunningStats, SKETCH_ACCURACY, to_debits
+
+TODAY = pd.Timestamp('2024-06-30')
+
+
+def _history(days=120, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=TODAY - pd.Timedelta(days=40), periods=days, freq='D')
+    return pd.DataFrame({'Date': dates, 'Particulars': 'SWIGGY ORDER', 'Category': 'Food',
+                         'Amount': -rng.uniform(250, 550, days).round(2), 'Currency': 'INR'})
+
+
+def _debit(day, particulars, amount, category='Food'):
+    return pd.DataFrame({'Date': [pd.Timestamp(day)], 'Particulars': [particulars], 'Category': [category],
+                         'Amount': [-amount], 'Currency': ['INR']})
+
+
+def test_unusual_debit_at_a_known_merchant():
+    detector = AnomalyDetector(_history(), 'INR', today=TODAY)
+
+    assert detector.update(_debit('2024-06-28', 'SWIGGY ORDER', 480)) == []
+    alert, = [a for a in detector.update(_debit('2024-06-29', 'SWIGGY ORDER', 6000)) if a['kind'] == 'merchant']
+    assert (alert['amount'], alert['category']) == (6000.0, 'Food')
+    assert 250 < alert['typical'] < 550 and alert['score'] >= 3
+
+
+def test_new_merchant_is_judged_against_its_category():
+    detector = AnomalyDetector(_history(), 'INR', today=TODAY)
+
+    kinds = [a['kind'] for a in detector.update(_debit('2024-06-29', 'FANCY RESTAURANT', 7000))]
+    assert 'category' in kinds
+    assert detector.update(_debit('2024-06-29', 'CORNER CAFE', 400)) == []
+
+
+def test_no_alerts_without_enough_history():
+    detector = AnomalyDetector(_history(days=5), 'INR', today=TODAY)
+    assert detector.update(_debit('2024-06-29', 'SWIGGY ORDER', 6000)) == []
+
+
+def test_category_spike_is_raised_once_per_day():
+    detector = AnomalyDetector(_history(), 'INR', today=TODAY)
+
+    spikes = []
+    for _ in range(6):
+        spikes += [a for a in detector.update(_debit('2024-06-29', 'CORNER CAFE', 500)) if a['kind'] == 'category_spike']
+    assert len(spikes) == 1
+    assert spikes[0]['category'] == 'Food' and spikes[0]['amount'] >= 3 * spikes[0]['typical']
+
+
+def test_build_replays_recent_rows_for_their_alerts():
+    df = pd.concat([_history(), _debit('2024-06-20', 'SWIGGY ORDER', 6000)], ignore_index=True)
+    detector = AnomalyDetector(df, 'INR', today=TODAY)
+
+    recent = detector.recent_alerts(today=TODAY)
+    # The debit alone also makes the day's Food total spike
+    assert sorted((a['date'], a['kind']) for a in recent) == [(pd.Timestamp('2024-06-20'), 'category_spike'),
+                                                              (pd.Timestamp('2024-06-20'), 'merchant')]
+    assert detector.recent_alerts(days=5, today=TODAY) == []
+
+
+def test_grouped_build_matches_streaming_statistics():
+    history = _history()
+    built = AnomalyDetector(history, 'INR', today=TODAY + pd.Timedelta(days=365))
+    streamed = AnomalyDetector(None, 'INR', today=TODAY)
+    streamed.update(history)
+
+    merchant = to_debits(history)['Merchant'].iloc[0]
+    pairs = [(built.merchants[merchant], streamed.merchants[merchant]),
+             (built.categories['Food'], streamed.categories['Food'])]
+    for grouped, incremental in pairs:
+        assert grouped.moments.n == incremental.moments.n
+        assert grouped.moments.mean == pytest.approx(incremental.moments.mean)
+        assert grouped.moments.std() == pytest.approx(incremental.moments.std())
+        assert grouped.sketch.bins == incremental.sketch.bins
+
+
+def test_quantile_sketch_accuracy():
+    values = np.random.default_rng(3).lognormal(6, 1, 5000)
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(float(value))
+
+    for q in (0.1, 0.5, 0.9, 0.99):
+        exact = np.quantile(values, q, method='lower')
+        assert abs(sketch.quantile(q) - exact) <= SKETCH_ACCURACY * exact * 1.01
+
+
+def test_running_stats():
+    stats = RunningStats()
+    for x in [2.0, 4.0, 4.0, 4.0, 5.0, 5.0, 7.0, 9.0]:
+        stats.add(x)
+    assert (stats.n, stats.mean, stats.std()) == (8, 5.0, 2.0)
+    assert stats.z(9.0) == 2.0
+
+    constant = RunningStats()
+    constant.add(1.0)
+    constant.add(1.0)
+    assert constant.z(2.0) == math.inf and constant.z(1.0) == 0.0
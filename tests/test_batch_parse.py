@@ -0,0 +1,68 @@
+import threading
+import uuid
+
+import pytest
+
+import ai_client
+import processor
+from fake_gemini import FakeGemini, text_reply
+
+
+class Upload:
+    """Just enough of a Streamlit upload for a CSV statement"""
+
+    def __init__(self, name, text):
+        self.name, self.type, self._data = name, 'text/csv', text.encode('utf-8')
+        self.size = len(self._data)
+
+    def read(self):
+        return self._data
+
+
+@pytest.fixture
+def gemini(workdir, monkeypatch):
+    fake = FakeGemini().start()
+    client = ai_client.AIClient('test-key', base_url=fake.url, limiter=ai_client.TokenBucket(6000),
+                                concurrency=threading.BoundedSemaphore(2))
+    monkeypatch.setattr(processor, 'get_ai_client', lambda api_key: client)
+    yield fake
+    fake.stop()
+
+
+def _uploads(count):
+    # Unique contents, so nothing comes from the response cache
+    return [Upload(f"statement-{n}.csv", f"statement {n} {uuid.uuid4().hex}") for n in range(1, count + 1)]
+
+
+def test_batched_response_is_split_per_file(gemini):
+    gemini.reply(payload=text_reply("File,Date,Particulars,Amount\n"
+                                    "1,01-03-2024,SWIGGY,-450\n2,02-03-2024,UBER,-230\n"))
+
+    first, second = processor.ai_parse_files(_uploads(2), 'test-key')
+    assert 'SWIGGY' in first and 'UBER' not in first
+    assert 'UBER' in second
+    assert len(gemini.requests) == 1
+
+
+def test_file_left_out_of_a_batched_response_is_parsed_on_its_own(gemini):
+    gemini.reply(payload=text_reply("File,Date,Particulars,Amount\n1,01-03-2024,SWIGGY,-450\n"))
+    gemini.reply(payload=text_reply("Date,Particulars,Amount\n02-03-2024,UBER,-230\n"))
+
+    first, second = processor.ai_parse_files(_uploads(2), 'test-key')
+    assert 'SWIGGY' in first
+    assert 'UBER' in second
+    assert len(gemini.requests) == 2
+    # The retry asks for the left-out file alone
+    parts = gemini.requests[1]['body']['contents'][0]['parts']
+    assert [part['text'] for part in parts][0] == processor.EXTRACTION_PROMPT
+    assert parts[1]['text'].startswith('statement 2 ')
+
+
+def test_unsplittable_response_is_retried_per_file(gemini):
+    gemini.reply(payload=text_reply("Date,Particulars,Amount\n01-03-2024,SWIGGY,-450\n"))
+    gemini.reply(payload=text_reply("Date,Particulars,Amount\n01-03-2024,SWIGGY,-450\n"))
+    gemini.reply(payload=text_reply("Date,Particulars,Amount\n02-03-2024,UBER,-230\n"))
+
+    first, second = processor.ai_parse_files(_uploads(2), 'test-key')
+    assert 'SWIGGY' in first and 'UBER' in second
+    assert len(gemini.requests) == 3
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from budgets import BudgetTracker, monthly_spend
+
+ROWS = pd.DataFrame({
+    'Date': pd.to_datetime(['2024-03-02', '2024-03-15', '2024-03-20', '2024-04-01', '2024-03-25']),
+    'Particulars': ['SWIGGY', 'ZOMATO', 'UBER', 'SWIGGY', 'SALARY'],
+    'Category': ['Food', 'Food', 'Transport', 'Food', 'Income'],
+    'Amount': [-3000.0, -1500.0, -900.0, -700.0, 85000.0],
+    'Currency': 'INR',
+})
+BUDGETS = {'Food': 5000, 'Transport': 1000, 'Shopping': 2000, 'Travel': 0}
+
+
+def test_monthly_spend_counts_debits_only():
+    spend = monthly_spend(ROWS, 'INR')
+    assert spend.to_dict() == {('2024-03', 'Food'): 4500.0, ('2024-03', 'Transport'): 900.0,
+                               ('2024-04', 'Food'): 700.0}
+
+
+def test_month_status_and_alerts():
+    tracker = BudgetTracker(ROWS, 'INR')
+
+    status = tracker.month_status(BUDGETS, '2024-03')
+    assert set(status) == {'Food', 'Transport', 'Shopping'}
+    assert status['Food'] == {'budget': 5000.0, 'spent': 4500.0, 'remaining': 500.0, 'used': 0.9}
+    assert status['Shopping']['spent'] == 0.0
+
+    alerts = tracker.alerts(BUDGETS, '2024-03')
+    assert [(a['category'], a['level']) for a in alerts] == [('Food', 'warning'), ('Transport', 'warning')]
+
+    tracker.update(ROWS.iloc[[0]].assign(Date=pd.Timestamp('2024-03-28'), Amount=-600.0))
+    assert [(a['category'], a['level']) for a in tracker.alerts(BUDGETS, '2024-03')][0] == ('Food', 'exceeded')
+
+
+def test_incremental_update_matches_a_full_rebuild():
+    tracker = BudgetTracker(ROWS.iloc[:2], 'INR')
+    tracker.update(ROWS.iloc[2:4])
+    tracker.update(ROWS.iloc[4:])
+    tracker.update(ROWS.iloc[:0])
+
+    full = BudgetTracker(ROWS, 'INR')
+    assert tracker.spend.sort_index().to_dict() == full.spend.sort_index().to_dict()
+
+
+def test_report_grid_covers_every_month_and_budgeted_category():
+    report = BudgetTracker(ROWS, 'INR').report(BUDGETS)
+
+    assert len(report) == 2 * 3
+    april_food = report[(report['Month'] == '2024-04') & (report['Category'] == 'Food')].iloc[0]
+    assert (april_food['Spent'], april_food['Remaining']) == (700.0, 4300.0)
+    assert BudgetTracker(None, 'INR').report({}).empty
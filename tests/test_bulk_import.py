@@ -0,0 +1,73 @@
+import os
+
+import bulk_import
+from storage import load_transactions
+
+STATEMENT = """Date,Particulars,Amount
+05-01-2024,SWIGGY ORDER,-450.00
+07-01-2024,SALARY CREDIT,85000.00
+09-01-2024,UBER TRIP,-230.50
+"""
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_import_writes_rows_and_checkpoints_next_to_store(workdir):
+    _write('statements/jan.csv', STATEMENT)
+    store = 'data/store.csv'
+
+    results = bulk_import.import_directory('statements', store, workers=1)
+
+    assert [(r['status'], r['written']) for r in results] == [('ok', 3)]
+    assert len(load_transactions(store)) == 3
+    assert os.path.exists(bulk_import.checkpoint_path_for(store))
+    assert not any(name.startswith('.import') for name in os.listdir('statements'))
+
+
+def test_rerun_skips_files_already_imported(workdir):
+    _write('statements/jan.csv', STATEMENT)
+    store = 'data/store.csv'
+    bulk_import.import_directory('statements', store, workers=1)
+
+    assert bulk_import.import_directory('statements', store, workers=1) == []
+
+
+def test_fresh_store_imports_everything_again(workdir):
+    _write('statements/jan.csv', STATEMENT)
+    bulk_import.import_directory('statements', 'data/first.csv', workers=1)
+
+    results = bulk_import.import_directory('statements', 'data/second.csv', workers=1,
+                                           checkpoint_path='data/shared_checkpoint.jsonl')
+    assert [r['written'] for r in results] == [3]
+
+    # The same store, emptied and imported into again
+    os.remove('data/second.csv')
+    results = bulk_import.import_directory('statements', 'data/second.csv', workers=1,
+                                           checkpoint_path='data/shared_checkpoint.jsonl')
+    assert [r['written'] for r in results] == [3]
+
+
+def test_changed_content_is_imported_again(workdir):
+    _write('statements/jan.csv', STATEMENT)
+    store = 'data/store.csv'
+    bulk_import.import_directory('statements', store, workers=1)
+
+    _write('statements/jan.csv', STATEMENT + "12-01-2024,AMAZON,-1299.00\n")
+    results = bulk_import.import_directory('statements', store, workers=1)
+
+    assert [(r['written'], r['duplicates']) for r in results] == [(1, 3)]
+
+
+def test_unparseable_file_is_an_error_and_retried(workdir):
+    _write('statements/broken.csv', "Date,Particulars,Amount\nnot a date,,\n")
+    store = 'data/store.csv'
+
+    results = bulk_import.import_directory('statements', store, workers=1)
+    assert [(r['status'], r['error']) for r in results] == [('error', "No transactions found")]
+
+    results = bulk_import.import_directory('statements', store, workers=1)
+    assert [r['status'] for r in results] == ['error']
@@ -0,0 +1,115 @@
+import sys
+
+import pandas as pd
+
+import caching
+from caching import BoundedCache, estimate_size
+
+
+class Holder:
+    def __init__(self, frame):
+        self.frame = frame
+        self.parent = None
+
+
+def _cache(name, **kwargs):
+    return BoundedCache(f"test_{name}", **kwargs)
+
+
+def test_least_recently_used_entry_goes_first():
+    cache = _cache('lru', max_items=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # b is now the oldest
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_evicts_down_to_max_bytes():
+    cache = _cache('bytes', max_bytes=100, sizer=len)
+    cache.put('a', 'x' * 40)
+    cache.put('b', 'x' * 40)
+    cache.put('c', 'x' * 40)
+
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 80 and len(cache) == 2
+    # Too big on its own: not stored, and nothing else is evicted for it
+    cache.put('d', 'x' * 101)
+    assert cache.get('d') is None and len(cache) == 2
+    # Replacing an entry releases its old size
+    cache.put('b', 'x')
+    assert cache.stats()['bytes'] == 41
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'monotonic', lambda: now[0])
+    cache = _cache('ttl', ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2, ttl=300)
+
+    now[0] += 61
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    stats = cache.stats()
+    assert (stats['expirations'], stats['items']) == (1, 1)
+
+
+def test_other_version_invalidates_the_entry():
+    cache = _cache('version')
+    cache.put('summary', 'old', version='v1')
+
+    assert cache.get('summary', version='v1') == 'old'
+    assert cache.get('summary', version='v2') is None
+    # Dropped, not just hidden
+    assert cache.get('summary') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_namespaces_are_separate_and_droppable():
+    cache = _cache('namespaces')
+    cache.put('summary', 1, namespace='a@b.com')
+    cache.put('summary', 2, namespace='c@d.com')
+    cache.drop_namespace('a@b.com')
+
+    assert cache.get('summary', namespace='a@b.com') is None
+    assert cache.get('summary', namespace='c@d.com') == 2
+
+
+def test_get_or_load_loads_once():
+    cache = _cache('load')
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return 'value'
+
+    assert cache.get_or_load('a', loader) == cache.get_or_load('a', loader) == 'value'
+    assert len(loads) == 1
+    assert cache.stats()['hit_rate'] == 0.5
+
+
+def test_estimate_size_measures_frames_deeply():
+    frame = pd.DataFrame({'Particulars': ['SWIGGY ORDER ' * 10] * 100, 'Amount': [1.0] * 100})
+
+    assert estimate_size(frame) == frame.memory_usage(deep=True).sum()
+    assert estimate_size({'frame': frame}) > estimate_size(frame)
+    assert estimate_size(Holder(frame)) > estimate_size(frame)
+
+
+def test_estimate_size_survives_cycles():
+    frame = pd.DataFrame({'Amount': range(100)})
+    holder = Holder(frame)
+    holder.parent = holder
+    loop = {'frame': frame}
+    loop['self'] = loop
+
+    assert estimate_size(holder) == sys.getsizeof(holder) + estimate_size(frame)
+    assert estimate_size(loop) == sys.getsizeof(loop) + estimate_size(frame)
+    cache = _cache('cycles')
+    assert cache.put('holder', holder) is holder
+    # The shared frame is counted once
+    assert estimate_size({'a': frame, 'b': frame}) < 2 * estimate_size(frame)
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from processor import process_csv_chunked
+
+STORE = 'data/store.csv'
+REPEAT = "Date,Particulars,Amount\n01-03-2024,SWIGGY,-450\n01-03-2024,SWIGGY,-450\n"
+
+
+def _import(text, chunksize):
+    with open('data/import.csv', 'w') as f:
+        f.write(text)
+    return process_csv_chunked('data/import.csv', store_path=STORE, chunksize=chunksize)
+
+
+@pytest.mark.parametrize('chunksize', [1, 2])
+def test_repeats_within_a_file_are_kept_across_chunks(workdir, chunksize):
+    stats = _import(REPEAT, chunksize)
+
+    assert (stats['rows_written'], stats['duplicates']) == (2, 0)
+    assert len(pd.read_csv(STORE)) == 2
+
+
+@pytest.mark.parametrize('chunksize', [1, 2])
+def test_each_stored_row_absorbs_one_repeat(workdir, chunksize):
+    _import("Date,Particulars,Amount\n01-03-2024,SWIGGY,-450\n", chunksize)
+
+    stats = _import(REPEAT, chunksize)
+    assert (stats['rows_written'], stats['duplicates']) == (1, 1)
+    assert len(pd.read_csv(STORE)) == 2
+
+    # Importing the same file again adds nothing
+    stats = _import(REPEAT, chunksize)
+    assert (stats['rows_written'], stats['duplicates']) == (0, 2)
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+import classifier
+import processor
+import state
+
+CATEGORIES = [{'name': 'Food', 'keywords': ['restaurant']}, {'name': 'Travel', 'keywords': ['flight']}]
+
+
+@pytest.fixture(autouse=True)
+def backends(workdir, monkeypatch):
+    """Fresh local backends in the test's directory"""
+    monkeypatch.setattr(state, '_backends', {})
+
+
+def _predict(email, *particulars):
+    labels, _ = classifier.get_model(email).predict(
+        processor.canonical_merchants(pd.Series(list(particulars), dtype=object)).tolist())
+    return list(labels)
+
+
+def _labels(email):
+    return state.user_store().get(email, classifier.LABELS_DOC)
+
+
+def test_users_train_separate_models():
+    classifier.confirm_categories('a@b.com', ['KOHINOOR TRADERS', 'SKYLARK AVIATION'], ['Food', 'Travel'])
+    classifier.confirm_categories('c@d.com', ['KOHINOOR TRADERS', 'SKYLARK AVIATION'], ['Travel', 'Food'])
+    assert classifier.train_classifier('a@b.com', CATEGORIES) == 4
+    assert classifier.train_classifier('c@d.com', CATEGORIES) == 4
+
+    assert _predict('a@b.com', 'KOHINOOR TRADERS', 'SKYLARK AVIATION') == ['Food', 'Travel']
+    assert _predict('c@d.com', 'KOHINOOR TRADERS', 'SKYLARK AVIATION') == ['Travel', 'Food']
+    assert classifier.get_model('e@f.com') is None
+
+
+def test_one_users_labels_never_change_another_users_predictions():
+    classifier.confirm_categories('c@d.com', ['KOHINOOR TRADERS', 'SKYLARK AVIATION'], ['Food', 'Travel'])
+    classifier.train_classifier('c@d.com', CATEGORIES)
+    before = _predict('c@d.com', 'KOHINOOR TRADERS', 'SKYLARK AVIATION', 'MOONBEAM STORES')
+    labels_before = _labels('c@d.com')
+
+    classifier.confirm_categories('a@b.com', ['KOHINOOR TRADERS', 'SKYLARK AVIATION', 'MOONBEAM STORES'] * 5,
+                                  ['Travel', 'Food', 'Shopping'] * 5)
+    classifier.train_classifier('a@b.com', CATEGORIES)
+
+    assert _predict('c@d.com', 'KOHINOOR TRADERS', 'SKYLARK AVIATION', 'MOONBEAM STORES') == before
+    assert _labels('c@d.com') == labels_before
+    assert _predict('a@b.com', 'MOONBEAM STORES') == ['Shopping']
+
+
+def test_other_is_not_a_label():
+    classifier.confirm_categories('a@b.com', ['KOHINOOR TRADERS', 'MOONBEAM STORES'], ['Food', 'Other'])
+
+    assert list(_labels('a@b.com').values()) == ['Food']
+
+
+def test_assigned_categories_are_never_recorded_as_labels():
+    classifier.confirm_categories('a@b.com', ['KOHINOOR TRADERS', 'SKYLARK AVIATION'], ['Food', 'Travel'])
+    classifier.train_classifier('a@b.com', CATEGORIES)
+    confirmed = _labels('a@b.com')
+
+    # AI-assigned (Shopping), keyword-matched (SWIGGY) and model-predicted
+    # (KOHINOOR) categories, through every import path
+    text = ("Date,Particulars,Amount,Category\n01-03-2024,MOONBEAM STORES,-500,Shopping\n"
+            "02-03-2024,SWIGGY ORDER,-450,\n03-03-2024,KOHINOOR TRADERS BLR,-300,\n")
+    parsed = processor.process_data(text, email='a@b.com')
+    assert dict(zip(parsed['Particulars'], parsed['Category'])) == {
+        'MOONBEAM STORES': 'Shopping', 'SWIGGY ORDER': 'Food', 'KOHINOOR TRADERS BLR': 'Food'}
+    with open('data/import.csv', 'w') as f:
+        f.write(text)
+    processor.process_csv_chunked('data/import.csv', store_path='data/store.csv', email='a@b.com')
+    processor.categorize_transactions(pd.Series(['SKYLARK AVIATION', 'UBER TRIP']), email='a@b.com')
+
+    assert _labels('a@b.com') == confirmed
@@ -0,0 +1,106 @@
+import os
+
+import pandas as pd
+import pytest
+
+import compaction
+from storage import read_rows, write_transactions
+
+pytest.importorskip('pyarrow')
+
+STORE = 'data/store.csv'
+
+
+def _rows(start, count, prefix='T'):
+    days = pd.date_range(start, periods=count, freq='7D')
+    return pd.DataFrame({'Date': days, 'Particulars': [f"MERCHANT {i % 5}" for i in range(count)],
+                         'Category': 'Other', 'Amount': [-100.0 - i for i in range(count)], 'Currency': 'INR',
+                         'Transaction_ID': [f"{prefix}{i}" if i % 2 else None for i in range(count)]})
+
+
+def _key(df):
+    columns = ['Date', 'Particulars', 'Amount', 'Transaction_ID']
+    df = df[columns].assign(Transaction_ID=df['Transaction_ID'].fillna(''))
+    return df.astype(str).sort_values(columns).reset_index(drop=True)
+
+
+def _month_files():
+    return sorted(name for name in os.listdir(compaction.compacted_dir(STORE)) if name.endswith('.arrow'))
+
+
+def test_compacted_read_matches_the_log(workdir):
+    rows = _rows('2024-01-01', 30)
+    write_transactions(rows, STORE)
+    # A retried write: rows with an id are the same transaction twice
+    write_transactions(rows.iloc[:4], STORE)
+
+    assert compaction.compact(STORE, min_bytes=0) == 34
+    df, end = compaction.read_transactions(STORE)
+
+    assert end == os.path.getsize(STORE)
+    assert len(_month_files()) == len(rows['Date'].dt.strftime('%Y-%m').unique())
+    expected = pd.concat([rows, rows.iloc[:4][rows.iloc[:4]['Transaction_ID'].isna()]])
+    pd.testing.assert_frame_equal(_key(df), _key(expected))
+
+
+def test_log_written_after_compaction_is_merged(workdir):
+    write_transactions(_rows('2024-01-01', 10), STORE)
+    compaction.compact(STORE, min_bytes=0)
+    tail = _rows('2024-06-01', 3, prefix='N')
+    write_transactions(tail, STORE)
+
+    df, _ = compaction.read_transactions(STORE)
+    assert len(df) == 13
+    assert _key(df.tail(3)).equals(_key(tail))
+
+    before = compaction.read_transactions(STORE)[0]
+    assert compaction.compact(STORE) == 0  # Below COMPACT_MIN_BYTES
+    assert compaction.compact(STORE, min_bytes=0) == 3
+    pd.testing.assert_frame_equal(_key(compaction.read_transactions(STORE)[0]), _key(before))
+
+
+def test_only_months_with_new_rows_are_rewritten(workdir):
+    write_transactions(_rows('2024-01-01', 10), STORE)
+    compaction.compact(STORE, min_bytes=0)
+    first = _month_files()
+
+    write_transactions(_rows('2024-03-20', 1, prefix='N'), STORE)
+    compaction.compact(STORE, min_bytes=0)
+    second = _month_files()
+
+    # The replaced March file lingers until STALE_SECONDS pass
+    assert len(second) == len(first) + 1
+    assert [name for name in first if not name.startswith('2024-03')] == \
+        [name for name in second if not name.startswith('2024-03')]
+
+
+def test_read_up_to_an_offset_before_the_compaction(workdir):
+    write_transactions(_rows('2024-01-01', 10), STORE)
+    middle = os.path.getsize(STORE)
+    write_transactions(_rows('2024-04-01', 5, prefix='N'), STORE)
+    compaction.compact(STORE, min_bytes=0)
+
+    df, end = compaction.read_transactions(STORE, middle)
+    assert end == middle and len(df) == 10
+
+
+def test_rolled_back_log_ignores_the_compaction(workdir):
+    write_transactions(_rows('2024-01-01', 10), STORE)
+    compaction.compact(STORE, min_bytes=0)
+    os.remove(STORE)
+    write_transactions(_rows('2025-01-01', 2, prefix='N'), STORE)
+
+    df, _ = compaction.read_transactions(STORE)
+    assert _key(df).equals(_key(read_rows(STORE, 0, os.path.getsize(STORE))[0]))
+
+
+def test_read_chunks_skips_months_outside_the_range(workdir):
+    write_transactions(_rows('2024-01-01', 20), STORE)
+    compaction.compact(STORE, min_bytes=0)
+    write_transactions(_rows('2024-03-03', 1, prefix='N'), STORE)
+
+    chunks = list(compaction.read_chunks(STORE, '2024-03-01', '2024-03-31'))
+    dates = pd.to_datetime(pd.concat(chunks)['Date'])
+    # The March month file and the log tail
+    assert len(chunks) == 2
+    assert dates.dt.strftime('%Y-%m').eq('2024-03').all()
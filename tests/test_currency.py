@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+import pytest
+
+import currency
+
+RATES = "Date,Currency,Rate\n2024-01-01,USD,82\n2024-02-01,USD,83\n2024-03-01,USD,84\n2024-02-01,EUR,90\n"
+
+
+@pytest.fixture
+def rates(workdir):
+    with open(currency.RATES_PATH, 'w') as f:
+        f.write(RATES)
+    currency.clear_rate_cache()
+    yield currency.RATES_PATH
+    currency.clear_rate_cache()
+
+
+def _frame(*rows):
+    return pd.DataFrame([{'Date': pd.Timestamp(day), 'Amount': amount, 'Currency': code}
+                         for day, amount, code in rows])
+
+
+def test_uses_the_latest_rate_on_or_before_each_date(rates):
+    df = _frame(('2024-02-15', 10.0, 'USD'), ('2024-03-01', 10.0, 'USD'), ('2024-01-31', 10.0, 'USD'))
+
+    assert currency.convert_to_base(df).tolist() == [830.0, 840.0, 820.0]
+
+
+def test_dates_before_the_table_use_the_earliest_rate(rates):
+    df = _frame(('2023-06-01', 1.0, 'USD'), ('2024-01-15', 1.0, 'EUR'))
+
+    assert currency.convert_to_base(df).tolist() == [82.0, 90.0]
+
+
+def test_currency_without_rates_is_left_as_is(rates):
+    df = _frame(('2024-02-15', 5.0, 'AED'), ('2024-02-15', 1.0, 'USD'))
+
+    assert currency.convert_to_base(df).tolist() == [5.0, 83.0]
+
+
+def test_base_currency_rows_are_unchanged(rates):
+    df = _frame(('2024-02-15', -450.0, 'INR'), ('2024-02-15', 2.0, 'USD'), ('2024-02-15', 7.0, None))
+
+    assert currency.convert_to_base(df).tolist() == [-450.0, 166.0, 7.0]
+    only_inr = _frame(('2024-02-15', -450.0, 'INR'))
+    assert currency.convert_to_base(only_inr, rates=pd.DataFrame()).tolist() == [-450.0]
+
+
+def test_converts_into_another_base_currency(rates):
+    df = _frame(('2024-02-15', 166.0, 'INR'), ('2024-02-15', 90.0, 'EUR'), ('2024-02-15', 3.0, 'USD'))
+
+    assert currency.convert_to_base(df, 'USD ($)').round(2).tolist() == [2.0, 97.59, 3.0]
+
+
+def test_rate_table_is_reread_only_when_the_file_changes(rates):
+    first = currency.load_rate_table()
+    assert currency.load_rate_table() is first
+
+    with open(rates, 'a') as f:
+        f.write("2024-04-01,USD,85\n")
+    stat = os.stat(rates)
+    os.utime(rates, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    second = currency.load_rate_table()
+    assert second is not first and len(second) == len(first) + 1
+    assert currency.convert_to_base(_frame(('2024-04-02', 1.0, 'USD'))).tolist() == [85.0]
+
+
+def test_missing_rate_file_converts_at_par(workdir):
+    currency.clear_rate_cache()
+
+    assert currency.load_rate_table().empty
+    assert currency.convert_to_base(_frame(('2024-02-15', 2.0, 'USD'))).tolist() == [2.0]
@@ -0,0 +1,85 @@
+import pandas as pd
+
+from dedup import duplicate_mask, match_duplicates, merchant_similarity
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=['Date', 'Particulars', 'Amount', 'Currency', 'Transaction_ID'])
+
+
+EXISTING = _frame([
+    ('2024-03-01', 'SWIGGY BANGALORE', -450.0, 'INR', None),
+    ('2024-03-01', 'BLUE TOKAI COFFEE', -220.0, 'INR', None),
+    ('2024-03-05', 'UPI/AMAZON PAY', -1299.0, 'INR', '412345678901'),
+    ('2024-03-07', 'STARBUCKS', -5.5, 'USD', None),
+])
+
+
+def test_same_transaction_from_another_source_is_a_duplicate():
+    new = _frame([('2024-03-01', 'SWIGGY BANGALORE', -450.0, 'INR', None)])
+    assert duplicate_mask(new, EXISTING).tolist() == [True]
+
+
+def test_booking_a_day_apart_still_matches_with_lower_confidence():
+    new = _frame([('2024-03-02', 'SWIGGY BANGALORE', -450.0, 'INR', None)])
+
+    match, = match_duplicates(new, EXISTING).to_dict('records')
+    assert (match['Existing_Index'], match['Day_Shift'], match['Reason']) == (0, 1, 'amount_date_merchant')
+    assert match['Confidence'] < 1.0
+
+
+def test_outside_the_date_window_is_new():
+    new = _frame([('2024-03-04', 'SWIGGY BANGALORE', -450.0, 'INR', None)])
+    assert duplicate_mask(new, EXISTING).tolist() == [False]
+
+
+def test_genuine_repeats_only_lose_the_one_already_stored():
+    new = _frame([('2024-03-01', 'BLUE TOKAI COFFEE', -220.0, 'INR', None),
+                  ('2024-03-01', 'BLUE TOKAI COFFEE', -220.0, 'INR', None)])
+    assert duplicate_mask(new, EXISTING).sum() == 1
+
+
+def test_reference_number_matches_whatever_else_differs():
+    new = _frame([('2024-03-06', 'AMAZON', -1300.0, 'INR', '412345678901')])
+
+    match, = match_duplicates(new, EXISTING).to_dict('records')
+    assert (match['Existing_Index'], match['Reason'], match['Confidence']) == (2, 'transaction_id', 1.0)
+
+
+def test_different_reference_numbers_never_match():
+    new = _frame([('2024-03-05', 'UPI/AMAZON PAY', -1299.0, 'INR', '499999999999')])
+    assert duplicate_mask(new, EXISTING).tolist() == [False]
+
+
+def test_different_currencies_never_match():
+    new = _frame([('2024-03-07', 'STARBUCKS', -5.5, 'EUR', None)])
+    assert duplicate_mask(new, EXISTING).tolist() == [False]
+
+
+def test_different_merchant_with_same_amount_is_new():
+    new = _frame([('2024-03-01', 'IRCTC RAIL TICKET', -450.0, 'INR', None)])
+    assert duplicate_mask(new, EXISTING).tolist() == [False]
+
+
+def test_empty_inputs():
+    assert match_duplicates(EXISTING.iloc[:0], EXISTING).empty
+    assert duplicate_mask(EXISTING, EXISTING.iloc[:0]).tolist() == [False] * len(EXISTING)
+
+
+def test_merchant_similarity():
+    assert merchant_similarity('Swiggy', 'SWIGGY') == 1.0
+    assert merchant_similarity('', 'Swiggy') == 0.0
+    assert 0 < merchant_similarity('Swiggy', 'Swigy') < 1
+
+
+def test_transaction_ids_match_however_they_were_stored():
+    # Read from CSV without a dtype, numeric IDs were stored as floats;
+    # the amount differs too, so only the ID can tie the rows together
+    stored = _frame([('2024-03-05', 'UPI/AMAZON PAY', -1300.0, 'INR', '412345678901.0'),
+                     ('2024-03-09', 'UPI/FLIPKART', -899.0, 'INR', ' 998877665544 ')])
+    new = _frame([('2024-03-05', 'AMAZON', -1299.0, 'INR', '412345678901'),
+                  ('2024-03-09', 'FLIPKART', -900.0, 'INR', 998877665544.0)])
+
+    matches = match_duplicates(new, stored)
+    assert sorted(zip(matches['New_Index'], matches['Existing_Index'], matches['Reason'])) == [
+        (0, 0, 'transaction_id'), (1, 1, 'transaction_id')]
@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+
+from storage import DedupIndex, append_transactions, write_transactions
+
+STORE = 'data/store.csv'
+
+
+def _rows(*items):
+    return pd.DataFrame([{'Date': pd.Timestamp(day), 'Particulars': particulars, 'Category': 'Other',
+                          'Amount': amount, 'Currency': 'INR', 'Transaction_ID': None}
+                         for day, particulars, amount in items])
+
+
+FIRST = _rows(('2024-03-01', 'SWIGGY', -450.0), ('2024-03-02', 'UBER', -230.0))
+LATER = _rows(('2024-03-05', 'AMAZON', -1299.0), ('2024-03-06', 'NETFLIX', -649.0))
+
+
+def _indexed_rows(index):
+    return index.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+
+def test_appended_rows_are_found(workdir):
+    append_transactions(FIRST, STORE)
+
+    with DedupIndex(STORE) as index:
+        assert index.contains(FIRST).tolist() == [True, True]
+        assert index.contains(LATER).tolist() == [False, False]
+        # A day later, same amount and merchant: the same transaction
+        assert index.contains(_rows(('2024-03-02', 'SWIGGY', -450.0))).tolist() == [True]
+
+
+def test_rows_written_without_the_index_are_caught_up(workdir):
+    append_transactions(FIRST, STORE)
+    write_transactions(LATER, STORE)
+
+    with DedupIndex(STORE) as index:
+        assert index.contains(LATER).tolist() == [True, True]
+        # Only the new rows were indexed, not the whole store again
+        assert _indexed_rows(index) == 4
+        assert index._meta('store_size') == str(os.path.getsize(STORE))
+
+
+def test_row_still_being_written_is_left_for_the_next_open(workdir):
+    append_transactions(FIRST, STORE)
+    line = LATER.iloc[:1].to_csv(header=False, index=False, date_format='%Y-%m-%d')
+    with open(STORE, 'a') as f:
+        f.write(line[:10])
+
+    with DedupIndex(STORE) as index:
+        assert _indexed_rows(index) == 2
+
+    with open(STORE, 'a') as f:
+        f.write(line[10:])
+    with DedupIndex(STORE) as index:
+        assert _indexed_rows(index) == 3
+        assert index.contains(LATER).tolist() == [True, False]
+
+
+def test_replaced_store_is_reindexed(workdir):
+    append_transactions(pd.concat([FIRST, LATER]), STORE)
+    os.remove(STORE)
+    write_transactions(LATER.iloc[:1], STORE)
+
+    with DedupIndex(STORE) as index:
+        assert _indexed_rows(index) == 1
+        assert index.contains(FIRST).tolist() == [False, False]
+
+
+def test_transaction_ids_stored_as_floats_are_found(workdir):
+    stored = FIRST.assign(Transaction_ID=[412345678901.0, None])
+    append_transactions(stored, STORE)
+    new = _rows(('2024-03-01', 'AMAZON PAY', -449.0)).assign(Transaction_ID='412345678901')
+
+    with DedupIndex(STORE) as index:
+        assert index.contains(new).tolist() == [True]
@@ -0,0 +1,146 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast
+import state
+from forecast import CashFlowModel, recurring_schedule
+from recurring import PATTERN_COLUMNS, RecurringDetector
+
+
+def _day(value):
+    return int(forecast._days(np.datetime64(value, 'D')))
+
+
+def _pattern(merchant, period, interval, amount, last, following, direction='debit'):
+    return {'Merchant': merchant, 'Direction': direction, 'Category': 'Other', 'Period': period,
+            'Interval_Days': interval, 'Amount': amount, 'Occurrences': 6, 'Last_Date': pd.Timestamp(last),
+            'Next_Date': pd.Timestamp(following), 'Confidence': 1.0}
+
+
+def _scheduled(patterns, start, horizon):
+    """Dates and amounts recurring_schedule lays out"""
+    schedule = recurring_schedule(pd.DataFrame(patterns, columns=PATTERN_COLUMNS), _day(start), horizon)
+    days = np.flatnonzero(schedule)
+    dates = (days + _day(start)).astype('datetime64[D]').astype(str)
+    return dict(zip(dates, schedule[days]))
+
+
+def _rows(*items):
+    return pd.DataFrame([{'Date': pd.Timestamp(day), 'Particulars': particulars, 'Category': 'Other',
+                          'Amount': amount, 'Currency': 'INR'} for day, particulars, amount in items])
+
+
+@pytest.fixture(autouse=True)
+def no_rates(workdir):
+    """Every row is in INR; no exchange rate file"""
+
+
+def test_monthly_patterns_keep_their_day_of_month():
+    patterns = [_pattern('Rent', 'Monthly', 30.4, -45000.0, '2024-01-31', '2024-03-01')]
+
+    # Clipped to the end of short months, never drifting by 30.4 days
+    assert _scheduled(patterns, '2024-02-01', 90) == {
+        '2024-02-29': -45000.0, '2024-03-31': -45000.0, '2024-04-30': -45000.0}
+
+
+def test_overdue_periodic_patterns_roll_to_their_next_cycle():
+    patterns = [_pattern('Gym', 'Weekly', 7, -500.0, '2024-03-01', '2024-03-08'),
+                _pattern('Salary', 'Biweekly', 14, 60000.0, '2024-02-23', '2024-03-08', direction='credit')]
+
+    assert _scheduled(patterns, '2024-03-10', 14) == {
+        '2024-03-15': -500.0, '2024-03-22': 59500.0}
+
+
+def test_patterns_missing_two_cycles_are_dropped():
+    patterns = [_pattern('Gym', 'Weekly', 7, -500.0, '2024-01-01', '2024-01-08'),
+                _pattern('Rent', 'Monthly', 30.4, -45000.0, '2023-12-05', '2024-01-05')]
+
+    assert _scheduled(patterns, '2024-03-01', 30) == {}
+    assert not recurring_schedule(None, _day('2024-03-01'), 30).any()
+
+
+def test_empty_history_projects_a_flat_balance():
+    result = CashFlowModel().forecast(None, horizon=30, today='2024-03-31')
+
+    assert list(result.columns) == forecast.FORECAST_COLUMNS
+    assert result['Projected'].sum() == 30
+    assert (result['Balance'] == 0).all() and (result['Lower'] == result['Upper']).all()
+
+
+def test_single_row_history():
+    model = CashFlowModel(_rows(('2024-03-30', 'SWIGGY', -450.0)))
+    result = model.forecast(None, horizon=30, today='2024-03-31')
+
+    assert list(result.loc[~result['Projected'], 'Balance']) == [-450.0, -450.0]
+    projected = result[result['Projected']]
+    assert len(projected) == 30 and projected['Date'].iloc[0] == pd.Timestamp('2024-04-01')
+    assert np.isfinite(projected[['Balance', 'Lower', 'Upper']].to_numpy()).all()
+    assert projected['Balance'].is_monotonic_decreasing
+
+
+def test_recurring_flows_are_not_projected_twice():
+    df = pd.concat([_rows(*[(f"2024-{month:02d}-05", 'RENT LODHA', -45000.0) for month in range(1, 7)]),
+                    _rows(*[(day, 'SWIGGY', -300.0) for day in pd.date_range('2024-01-01', '2024-06-20')])])
+    patterns = RecurringDetector(df).patterns
+    result = CashFlowModel(df).forecast(patterns, horizon=30, today='2024-06-20')
+
+    projected = result[result['Projected']].set_index('Date')
+    assert projected.loc['2024-07-05', 'Recurring'] == -45000.0
+    assert projected['Recurring'].sum() == -45000.0
+    # Discretionary spend is SWIGGY's daily 300, not rent spread over the days
+    assert projected['Discretionary'].mean() == pytest.approx(-300.0, rel=0.05)
+
+
+def test_update_matches_a_full_rebuild():
+    first = _rows(('2024-03-01', 'SALARY', 60000.0), ('2024-03-02', 'SWIGGY', -450.0))
+    later = _rows(('2024-03-20', 'UBER', -230.0), ('2024-03-21', 'SWIGGY', -300.0))
+    updated = CashFlowModel(first)
+    updated.update(later)
+
+    rebuilt = CashFlowModel(pd.concat([first, later], ignore_index=True))
+    pd.testing.assert_frame_equal(updated.forecast(None, 30, today='2024-03-31'),
+                                  rebuilt.forecast(None, 30, today='2024-03-31'))
+
+
+def test_forecast_is_cached_per_data_version_and_date(monkeypatch):
+    monkeypatch.setattr(state, '_backends', {})
+    store = state.transaction_store()
+    store.append('a@b.com', _rows(('2024-03-01', 'SALARY', 60000.0)))
+    runs = []
+
+    def cached(today):
+        stamp = (store.version('a@b.com'), today)
+
+        def run():
+            runs.append(stamp)
+            # As the app does on every rerun
+            store.sync('a@b.com')
+            return CashFlowModel(store.load('a@b.com')).forecast(None, 30, today=today)
+        return forecast.forecast_cache.get_or_load(('INR', 30), run, namespace='a@b.com', version=stamp)
+
+    first = cached('2024-03-31')
+    assert cached('2024-03-31') is first and len(runs) == 1
+    # A new day
+    assert cached('2024-04-01') is not first and len(runs) == 2
+    # New rows change the data version
+    time.sleep(0.01)
+    store.append('a@b.com', _rows(('2024-03-31', 'SWIGGY', -450.0)))
+    assert cached('2024-04-01')['Balance'].iloc[-1] < first['Balance'].iloc[-1]
+    assert len(runs) == 3
+    forecast.forecast_cache.drop_namespace('a@b.com')
+
+
+def test_forecast_is_fast_on_a_large_history():
+    df = forecast.synthetic_history(years=5, per_day=10)
+    model, patterns = CashFlowModel(df), RecurringDetector(df).patterns
+    model.forecast(patterns, 90)
+
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        model.forecast(patterns, 90)
+        timings.append(time.perf_counter() - started)
+    assert len(df) > 15000 and min(timings) < 0.1
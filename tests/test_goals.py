@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from goals import GoalTracker, match_rule
+
+ROWS = pd.DataFrame({
+    'Date': pd.to_datetime(['2024-01-10', '2024-02-10', '2024-03-10', '2024-03-12', '2024-03-15']),
+    'Particulars': ['TRANSFER TO SAVINGS 4321', 'TRANSFER TO SAVINGS 4321', 'TRANSFER TO SAVINGS 4321',
+                    'FROM SAVINGS 4321', 'ZERODHA SIP'],
+    'Category': ['Transfer', 'Transfer', 'Transfer', 'Transfer', 'Investment'],
+    'Amount': [-10000.0, -10000.0, -10000.0, 2000.0, -5000.0],
+    'Currency': 'INR',
+})
+SAVINGS = {'id': 'laptop', 'target': 60000, 'start_amount': 5000, 'rule': {'type': 'account', 'value': '4321'}}
+INVESTING = {'id': 'sip', 'target': 10000, 'rule': {'type': 'category', 'value': 'investment'}}
+MANUAL = {'id': 'trip', 'target': 1000, 'start_amount': 250, 'rule': {'type': 'manual'}}
+
+
+def test_match_rule():
+    assert match_rule(SAVINGS['rule'], ROWS).tolist() == [True, True, True, True, False]
+    assert match_rule(INVESTING['rule'], ROWS).tolist() == [False, False, False, False, True]
+    assert not match_rule(MANUAL['rule'], ROWS).any()
+    assert not match_rule({'type': 'keyword', 'value': ' '}, ROWS).any()
+
+
+def test_progress_counts_withdrawals_against_the_goal():
+    tracker = GoalTracker([SAVINGS, INVESTING, MANUAL], ROWS, 'INR')
+
+    progress = tracker.progress(SAVINGS, today='2024-03-31')
+    assert progress['current'] == 33000.0 and progress['pct'] == pytest.approx(55.0)
+    # 28000 saved in the last 90 days
+    assert progress['velocity'] == round(28000 / 90, 2)
+    assert progress['projected_date'] == pd.Timestamp('2024-03-31') + pd.Timedelta(days=87)
+
+    assert tracker.progress(MANUAL, today='2024-03-31')['projected_date'] is None
+    assert tracker.progress(INVESTING, today='2024-03-31')['pct'] == pytest.approx(50.0)
+
+
+def test_reached_goal_is_projected_for_today():
+    goal = dict(INVESTING, target=5000)
+    progress = GoalTracker([goal], ROWS, 'INR').progress(goal, today='2024-04-01')
+    assert progress['projected_date'] == pd.Timestamp('2024-04-01')
+
+
+def test_incremental_update_matches_a_full_rebuild():
+    goals = [SAVINGS, INVESTING]
+    tracker = GoalTracker(goals, ROWS.iloc[:2], 'INR')
+    tracker.update(goals, ROWS.iloc[2:])
+
+    full = GoalTracker(goals, ROWS, 'INR')
+    assert tracker.totals == full.totals
+    assert tracker.progress(SAVINGS, today='2024-03-31') == full.progress(SAVINGS, today='2024-03-31')
+
+
+def test_track_and_untrack():
+    tracker = GoalTracker([], None, 'INR')
+    tracker.track(INVESTING, ROWS)
+    assert tracker.totals == {'sip': 5000.0}
+    tracker.untrack('sip')
+    assert tracker.progress(INVESTING, today='2024-03-31')['current'] == 0.0
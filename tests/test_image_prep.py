@@ -0,0 +1,115 @@
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from image_prep import MAX_DIMENSION, find_duplicate, perceptual_hash, preprocess_image
+
+FONT = ImageFont.load_default(size=28)
+
+
+def _statement(lines, size=(900, 1800), color='white'):
+    """Phone-sized screenshot of a payments list"""
+    image = Image.new('RGB', size, color)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, size[0], 50), fill=(30, 30, 120))  # Status bar
+    for row, line in enumerate(lines):
+        draw.text((60, 200 + row * 70), line, fill='black', font=FONT)
+    return image
+
+
+PAYMENTS = ['01 Mar  SWIGGY        -450.00', '02 Mar  UBER          -230.00', '03 Mar  AMAZON       -1299.00',
+            '04 Mar  NETFLIX       -649.00', '05 Mar  SALARY     +85000.00']
+
+
+def _prepared(image, format='PNG', **save):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **save)
+    buffer.seek(0)
+    return preprocess_image(buffer)[0]
+
+
+def _duplicate_of(first, second):
+    """Index find_duplicate returns for second after seeing first (None if kept)"""
+    seen = [(0, perceptual_hash(first), first)]
+    return find_duplicate(second, perceptual_hash(second), seen)
+
+
+def test_output_is_grayscale_and_cropped():
+    image, size = preprocess_image(_statement(PAYMENTS))
+
+    assert image.mode == 'L'
+    # Status bar and blank margins are gone
+    assert image.width < 900 and image.height < 1800 - 50
+    assert image.getpixel((image.width // 2, 0)) > 200
+    assert 0 < size < 900 * 1800
+
+
+def test_large_shots_are_downsized():
+    image, _ = preprocess_image(_statement(PAYMENTS * 8, size=(2400, 4400)))
+
+    assert max(image.size) <= MAX_DIMENSION
+
+
+def test_smaller_encoding_is_chosen():
+    flat, flat_size = preprocess_image(_statement(PAYMENTS))
+    assert flat.format == 'PNG'
+
+    noise = random.Random(1)
+    photo = Image.new('L', (800, 600))
+    photo.putdata([noise.randrange(256) for _ in range(800 * 600)])
+    photo, photo_size = preprocess_image(photo)
+    assert photo.format == 'JPEG'
+    png = io.BytesIO()
+    photo.save(png, format='PNG', optimize=True)
+    assert photo_size < png.tell()
+
+
+def test_identical_screenshot_is_flagged():
+    first, second = _prepared(_statement(PAYMENTS)), _prepared(_statement(PAYMENTS))
+
+    assert _duplicate_of(first, second) == 0
+
+
+@pytest.mark.parametrize('quality', [85, 60, 40])
+def test_reencoded_screenshot_is_flagged(quality):
+    original = _statement(PAYMENTS)
+
+    assert _duplicate_of(_prepared(original), _prepared(original, format='JPEG', quality=quality)) == 0
+
+
+@pytest.mark.parametrize('size', [(675, 1350), (450, 900), (1350, 2700)])
+def test_resized_screenshot_is_flagged(size):
+    original = _statement(PAYMENTS)
+    resized = original.resize(size, Image.LANCZOS)
+
+    assert _duplicate_of(_prepared(original), _prepared(resized)) == 0
+    # Both ways round, and re-encoded on top
+    assert _duplicate_of(_prepared(resized, format='JPEG', quality=70), _prepared(original)) == 0
+
+
+def test_dark_mode_copy_is_flagged():
+    original = ImageOps.invert(_statement(PAYMENTS))
+
+    assert _duplicate_of(_prepared(original), _prepared(original.resize((675, 1350), Image.LANCZOS))) == 0
+
+
+def test_statements_with_different_content_are_kept():
+    first = _prepared(_statement(PAYMENTS))
+    # Same layout, one amount differs
+    other_amount = _prepared(_statement(PAYMENTS[:2] + ['03 Mar  AMAZON       -1799.00'] + PAYMENTS[3:]))
+    # Another day's payments
+    other_day = _prepared(_statement(['06 Mar  ZOMATO        -380.00', '07 Mar  OLA           -190.00',
+                                      '08 Mar  JIO           -299.00']))
+
+    assert _duplicate_of(first, other_amount) is None
+    assert _duplicate_of(first, other_day) is None
+    # A row fewer
+    assert _duplicate_of(first, _prepared(_statement(PAYMENTS[:4]))) is None
+
+
+def test_different_amount_in_a_resized_shot_is_kept():
+    changed = _statement(PAYMENTS[:2] + ['03 Mar  AMAZON       -1799.00'] + PAYMENTS[3:])
+
+    assert _duplicate_of(_prepared(_statement(PAYMENTS)), _prepared(changed.resize((675, 1350), Image.LANCZOS))) is None
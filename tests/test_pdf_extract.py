@@ -0,0 +1,87 @@
+import io
+import time
+
+import pytest
+from reportlab.lib import pdfencrypt
+from reportlab.pdfgen import canvas
+
+import pdf_extract
+
+
+def _pdf(pages, encrypt=None):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, encrypt=encrypt)
+    for number in range(1, pages + 1):
+        pdf.drawString(72, 720, f"Statement page {number}")
+        pdf.drawString(72, 700, f"01-03-2024 SWIGGY -{number}00.00")
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Small runs over two workers, so even short test files fan out"""
+    monkeypatch.setattr(pdf_extract, 'PDF_WORKERS', 2)
+    monkeypatch.setattr(pdf_extract, 'PAGES_PER_TASK', 2)
+    monkeypatch.setattr(pdf_extract, 'MIN_PARALLEL_PAGES', 2)
+    monkeypatch.setattr(pdf_extract, '_page_cache', pdf_extract.BoundedCache('test_pdf_pages', max_items=100))
+    yield
+    if pdf_extract._pool is not None:
+        pdf_extract._pool.shutdown()
+        pdf_extract._pool = None
+
+
+def _page_numbers(pages):
+    return [int(text.split('\n')[0].rsplit(' ', 1)[1]) for text in pages]
+
+
+def test_pages_keep_their_order_across_workers(pool):
+    pages = pdf_extract.extract_pdf_pages(_pdf(9))
+
+    assert pdf_extract._pool is not None
+    assert _page_numbers(pages) == list(range(1, 10))
+    assert 'SWIGGY -900.00' in pages[8]
+
+
+def test_short_documents_are_extracted_in_process(pool, monkeypatch):
+    monkeypatch.setattr(pdf_extract, 'MIN_PARALLEL_PAGES', 8)
+
+    assert _page_numbers(pdf_extract.extract_pdf_pages(_pdf(3))) == [1, 2, 3]
+    assert pdf_extract._pool is None
+
+
+def test_second_extraction_is_served_from_the_page_cache(pool, monkeypatch):
+    data = _pdf(6)
+    first = pdf_extract.extract_pdf_pages(data)
+
+    def fail(*args):
+        raise AssertionError("page extracted again")
+
+    monkeypatch.setattr(pdf_extract, '_extract_pages', fail)
+    monkeypatch.setattr(pdf_extract, '_get_pool', fail)
+    assert pdf_extract.extract_pdf_pages(data) == first
+    assert pdf_extract.extract_pdf_text(data) == '\n'.join(first)
+
+
+@pytest.mark.parametrize('data, message', [
+    (_pdf(2, encrypt=pdfencrypt.StandardEncryption('secret', ownerPassword='owner')), 'password-protected'),
+    (b'not a pdf at all', 'Unreadable PDF'),
+    (_pdf(9)[:300], 'Unreadable PDF'),
+])
+def test_unreadable_pdf_raises_a_clean_error(pool, data, message):
+    with pytest.raises(ValueError, match=message):
+        pdf_extract.extract_pdf_pages(data)
+    # The pool is still fine for the next file
+    assert _page_numbers(pdf_extract.extract_pdf_pages(_pdf(4))) == [1, 2, 3, 4]
+
+
+def test_pool_is_replaced_after_a_worker_dies(pool):
+    pdf_extract.extract_pdf_pages(_pdf(4))
+    for process in list(pdf_extract._pool._processes.values()):
+        process.kill()
+    time.sleep(0.5)
+
+    with pytest.raises(ValueError, match='worker stopped'):
+        pdf_extract.extract_pdf_pages(_pdf(5))
+    assert _page_numbers(pdf_extract.extract_pdf_pages(_pdf(5))) == [1, 2, 3, 4, 5]
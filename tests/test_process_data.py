@@ -0,0 +1,20 @@
+import pandas as pd
+
+import processor
+
+
+def test_csv_starting_with_error_is_parsed(workdir):
+    text = ("Error_Code,Date,Particulars,Amount\n"
+            "E0,01-03-2024,ERROR CORRECTION REFUND,120\n"
+            "E0,02-03-2024,SWIGGY ORDER,-450\n")
+
+    parsed = processor.process_data(text, email='a@b.com')
+    assert dict(zip(parsed['Particulars'], parsed['Amount'])) == {'ERROR CORRECTION REFUND': 120.0,
+                                                                  'SWIGGY ORDER': -450.0}
+
+
+def test_failed_or_malformed_extractions_give_no_rows(workdir):
+    assert processor.process_data(None).empty
+    assert processor.process_data(processor.AIRequestError("Error processing file: quota")).empty
+    assert processor.process_data("Error processing file: quota exceeded").empty
+    assert isinstance(processor.process_data("```csv\nDate,Particulars,Amount\n```"), pd.DataFrame)
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from recurring import RecurringDetector, detect_recurring, to_events
+
+
+def _monthly(particulars, amount, months, start='2024-01-05'):
+    dates = [pd.Timestamp(start) + pd.DateOffset(months=i) for i in range(months)]
+    return pd.DataFrame({'Date': dates, 'Particulars': particulars, 'Category': 'Entertainment',
+                         'Amount': amount, 'Currency': 'INR'})
+
+
+def _noise():
+    return pd.DataFrame({'Date': pd.to_datetime(['2024-01-09', '2024-02-27', '2024-03-02', '2024-05-19']),
+                         'Particulars': 'SWIGGY', 'Category': 'Food', 'Amount': [-300.0, -820.0, -150.0, -1200.0],
+                         'Currency': 'INR'})
+
+
+def test_detects_a_monthly_subscription():
+    df = pd.concat([_monthly('NETFLIX', -649.0, 6), _noise()], ignore_index=True)
+
+    patterns = detect_recurring(to_events(df))
+    assert len(patterns) == 1
+    pattern = patterns.iloc[0]
+    assert (pattern['Period'], pattern['Direction'], pattern['Amount'], pattern['Occurrences']) == \
+        ('Monthly', 'debit', -649.0, 6)
+    assert pattern['Next_Date'] == pattern['Last_Date'] + pd.Timedelta(days=round(pattern['Interval_Days']))
+
+
+def test_needs_enough_regular_occurrences():
+    assert detect_recurring(to_events(_monthly('NETFLIX', -649.0, 2))).empty
+
+    # Same merchant, amounts all over the place
+    df = _monthly('AMAZON', -649.0, 6)
+    df['Amount'] = [-100.0, -2500.0, -649.0, -40.0, -9000.0, -310.0]
+    assert detect_recurring(to_events(df)).empty
+
+
+def test_same_day_rows_count_as_one_event():
+    df = _monthly('SPOTIFY', -119.0, 4)
+    split = pd.concat([df, df.iloc[[0]].assign(Amount=-1.0)], ignore_index=True)
+
+    events = to_events(split)
+    assert len(events) == 4
+    assert events['Amount'].min() == -120.0
+
+
+def test_incremental_update_matches_a_full_rebuild():
+    df = pd.concat([_monthly('NETFLIX', -649.0, 6), _monthly('SALARY CREDIT', 85000.0, 5), _noise()],
+                   ignore_index=True).sort_values('Date', ignore_index=True)
+    detector = RecurringDetector(df.iloc[:8])
+    detector.update(df.iloc[8:12])
+    detector.update(df.iloc[12:])
+
+    full = RecurringDetector(df).patterns
+    columns = ['Merchant', 'Direction', 'Period', 'Amount', 'Occurrences', 'Last_Date']
+    assert detector.patterns[columns].sort_values('Merchant').reset_index(drop=True).equals(
+        full[columns].sort_values('Merchant').reset_index(drop=True))
+
+
+def test_upcoming_rolls_forward_and_drops_cancelled():
+    detector = RecurringDetector(pd.concat([_monthly('NETFLIX', -649.0, 6),
+                                            _monthly('HOTSTAR', -299.0, 4, start='2023-01-05')]))
+
+    upcoming = detector.upcoming(days=30, today='2024-07-20')
+    assert list(upcoming['Merchant'].str.upper()) == ['NETFLIX']
+    assert pd.Timestamp('2024-07-20') <= upcoming.iloc[0]['Next_Date'] <= pd.Timestamp('2024-08-19')
@@ -0,0 +1,76 @@
+import re
+import time
+import zipfile
+
+import pandas as pd
+import pdfplumber
+import pytest
+
+import reports
+from storage import write_transactions
+
+ROWS = pd.DataFrame({
+    'Date': pd.to_datetime(['2024-01-05', '2024-01-20', '2024-02-03']),
+    'Particulars': ['CAFÉ ₹ COFFEE', '=HYPERLINK("x")', 'SALARY'],
+    'Category': ['Food', 'Shopping', 'Income'],
+    'Amount': [-250.0, -1200.0, 50000.0],
+    'Currency': ['INR', 'INR', 'INR'],
+    'Transaction_ID': [None, None, None],
+})
+
+
+@pytest.fixture
+def store(workdir):
+    path = 'data/store.csv'
+    write_transactions(ROWS, path)
+    return path
+
+
+@pytest.fixture
+def fallback_font(monkeypatch):
+    """Only reportlab's bundled font, which has no rupee sign"""
+    monkeypatch.delenv('REPORT_FONT', raising=False)
+    monkeypatch.setattr(reports, 'FONT_CANDIDATES', [])
+    monkeypatch.setattr(reports, '_report_fonts', None)
+
+
+def test_xlsx_writes_dates_as_date_cells(store):
+    reports.write_report('out.xlsx', 'xlsx', store, 'a@b.com', '2024-01-01', '2024-02-29', 'INR')
+
+    with zipfile.ZipFile('out.xlsx') as book:
+        sheet = book.read('xl/worksheets/sheet3.xml').decode('utf-8')
+    # A2 is the first transaction's date: a styled serial number, not text
+    cell = re.search(r'<c r="A2"([^>]*)><v>([^<]+)</v>', sheet)
+    assert cell is not None and 't=' not in cell.group(1)
+    assert float(cell.group(2)) == (pd.Timestamp('2024-01-05') - pd.Timestamp('1899-12-30')).days
+    # Text that looks like a formula stays text
+    assert '<f>' not in sheet and 'HYPERLINK' in sheet
+
+
+def test_pdf_spells_out_characters_the_font_lacks(store, fallback_font):
+    reports.write_report('out.pdf', 'pdf', store, 'a@b.com', '2024-01-01', '2024-02-29', 'INR')
+
+    with pdfplumber.open('out.pdf') as pdf:
+        text = '\n'.join(page.extract_text() for page in pdf.pages)
+    assert 'CAFÉ Rs. COFFEE' in text
+    assert '?' not in text
+
+
+def test_font_covering_rupee_sign_is_preferred(fallback_font):
+    regular, _ = reports.report_fonts()
+    assert regular.printable('₹100') == 'Rs.100'
+    assert regular.printable('Café') == 'Café'
+
+
+def test_finished_jobs_are_pruned_after_retention(store):
+    jobs = reports.ReportJobs(workers=1, retention=60)
+    job_id = jobs.submit('a@b.com', '2024-01-01', '2024-02-29', 'csv', 'INR', store)
+    deadline = time.monotonic() + 10
+    while jobs.status(job_id)[0] == 'running' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert jobs.status(job_id) == ('done', job_id)
+
+    jobs._prune(now=time.monotonic() + 61)
+    assert job_id not in jobs.jobs and not jobs.finished
+    # The report outlives its job in the cache
+    assert jobs.status(job_id) == ('done', job_id)
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from contextlib import closing
+
+import state
+
+# Claims a job, reports it and then hangs, so the test can kill it mid-job
+DYING_WORKER = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+import state
+job = state.LocalJobQueue(lease_seconds=0.5).claim('worker-1', timeout=5)
+print(job['id'], flush=True)
+time.sleep(60)
+"""
+
+
+def test_job_queue_round_trip(workdir):
+    jobs = state.LocalJobQueue()
+    payload = {'files': ['x' * 100], 'user': 'a@b.com'}
+    job_id = jobs.enqueue('import', payload)
+    assert jobs.pending() == 1
+    assert jobs.status(job_id)['status'] == 'queued'
+
+    assert jobs.claim('worker-1', timeout=1) == {'id': job_id, 'kind': 'import', 'payload': payload}
+    assert jobs.status(job_id)['status'] == 'running' and jobs.pending() == 0
+
+    jobs.finish(job_id, result={'written': 3})
+    job = jobs.status(job_id)
+    assert (job['status'], job['result'], job['worker']) == ('done', {'written': 3}, 'worker-1')
+    assert jobs.claim('worker-1', timeout=0.1) is None
+
+
+def test_job_of_a_killed_worker_is_picked_up_again(workdir):
+    jobs = state.LocalJobQueue(lease_seconds=0.5)
+    job_id = jobs.enqueue('import', {'n': 1})
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    worker = subprocess.Popen([sys.executable, '-c', DYING_WORKER, root], stdout=subprocess.PIPE, text=True)
+    try:
+        assert worker.stdout.readline().strip() == job_id
+    finally:
+        worker.kill()
+        worker.wait()
+    assert jobs.status(job_id)['status'] == 'running'
+
+    claimed = jobs.claim('worker-2', timeout=3)
+    assert claimed == {'id': job_id, 'kind': 'import', 'payload': {'n': 1}}
+    assert jobs.status(job_id)['worker'] == 'worker-2'
+    jobs.finish(job_id, result='ok')
+    assert jobs.status(job_id)['status'] == 'done'
+
+
+def test_running_job_with_a_live_lease_stays_claimed(workdir):
+    worker = state.LocalJobQueue(lease_seconds=0.3)
+    other = state.LocalJobQueue(lease_seconds=0.3)
+    job_id = worker.enqueue('import', {'n': 1})
+    worker.claim('worker-1', timeout=1)
+
+    time.sleep(1)
+    assert other.claim('worker-2', timeout=0.1) is None
+    assert other.status(job_id)['worker'] == 'worker-1'
+    worker.finish(job_id, result='ok')
+    assert other.status(job_id)['status'] == 'done'
+
+
+def test_queue_created_before_leases_is_upgraded(workdir):
+    with closing(sqlite3.connect(state.JOBS_PATH)) as conn:
+        conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT, status TEXT, payload TEXT, result TEXT, "
+                     "error TEXT, worker TEXT, created REAL, started REAL, finished REAL)")
+        conn.execute("INSERT INTO jobs (id, kind, status, payload, worker, created, started) "
+                     "VALUES ('old', 'import', 'running', '{}', 'gone', 1, 2)")
+        conn.commit()
+
+    # A job left running by a version without leases is taken over
+    claimed = state.LocalJobQueue().claim('worker-1', timeout=1)
+    assert claimed['id'] == 'old'
@@ -0,0 +1,195 @@
+import threading
+import time
+
+import fakeredis
+import pandas as pd
+import pytest
+
+import state
+
+
+def _rows(*particulars, day='2024-03-01'):
+    return pd.DataFrame({'Date': pd.to_datetime([day] * len(particulars)), 'Particulars': list(particulars),
+                         'Category': 'Other', 'Amount': [-100.0 - i for i in range(len(particulars))],
+                         'Currency': 'INR', 'Transaction_ID': None})
+
+
+@pytest.fixture
+def server(workdir):
+    return fakeredis.FakeServer()
+
+
+def _client(server):
+    return fakeredis.FakeRedis(server=server)
+
+
+def test_user_store_round_trip(server):
+    users = state.RedisUserStore(_client(server), prefix='test')
+
+    assert users.load_budgets('a@b.com') == {}
+    users.save_budgets('a@b.com', {'Food': 5000, 'Travel': 0})
+    users.save_goals('a@b.com', [{'name': 'Laptop', 'target': 90000}])
+
+    other = state.RedisUserStore(_client(server), prefix='test')
+    assert other.load_budgets('A@B.com ') == {'Food': 5000.0}
+    assert other.load_goals('a@b.com') == [{'name': 'Laptop', 'target': 90000}]
+    assert other.load_goals('c@d.com') == []
+
+
+def test_transaction_store_syncs_between_replicas(server):
+    first = state.RedisTransactionStore(_client(server), prefix='test', mirror_dir='data/mirror-1')
+    second = state.RedisTransactionStore(_client(server), prefix='test', mirror_dir='data/mirror-2')
+    first.append('a@b.com', _rows('SWIGGY', 'UBER'))
+
+    assert sorted(second.load('a@b.com')['Particulars']) == ['SWIGGY', 'UBER']
+    assert second.sync('a@b.com').empty
+
+    first.append('a@b.com', _rows('AMAZON'))
+    added = second.sync('a@b.com')
+    assert list(added['Particulars']) == ['AMAZON']
+    assert len(second.load('a@b.com')) == 3
+    # Each user has their own log
+    assert second.load('c@d.com').empty
+
+
+def test_mirror_rolls_back_a_write_cut_short(server):
+    store = state.RedisTransactionStore(_client(server), prefix='test', mirror_dir='data/mirror')
+    store.append('a@b.com', _rows('SWIGGY'))
+    path = store.path('a@b.com')
+    with open(path, 'a') as f:
+        f.write('2024-03-02,HALF WRIT')
+
+    store.append('a@b.com', _rows('UBER'))
+    assert sorted(pd.read_csv(path)['Particulars']) == ['SWIGGY', 'UBER']
+
+
+def test_lock_excludes_other_holders(server, monkeypatch):
+    monkeypatch.setattr(state, 'LOCK_WAIT_SECONDS', 0.3)
+    first = state.RedisTransactionStore(_client(server), prefix='test', mirror_dir='data/mirror-1')
+    second = state.RedisTransactionStore(_client(server), prefix='test', mirror_dir='data/mirror-2')
+
+    with first.lock('a@b.com'):
+        with first.lock('a@b.com'):
+            pass  # Re-entrant in the holding thread
+        with pytest.raises(TimeoutError):
+            with second.lock('a@b.com'):
+                pass
+        with second.lock('c@d.com'):
+            pass
+    with second.lock('a@b.com'):
+        pass
+
+
+def test_lock_serializes_writers(server):
+    store = state.RedisTransactionStore(_client(server), prefix='test', mirror_dir='data/mirror')
+    inside, overlaps = [], []
+
+    def work():
+        with store.lock('a@b.com'):
+            if inside:
+                overlaps.append(True)
+            inside.append(True)
+            time.sleep(0.02)
+            inside.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not overlaps
+
+
+def test_job_queue_round_trip(server):
+    jobs = state.RedisJobQueue(_client(server), prefix='test')
+    payload = {'files': ['x' * 100], 'user': 'a@b.com'}
+    job_id = jobs.enqueue('import', payload)
+    assert jobs.pending() == 1
+    assert jobs.status(job_id)['status'] == 'queued'
+
+    claimed = jobs.claim('worker-1', timeout=1)
+    assert claimed == {'id': job_id, 'kind': 'import', 'payload': payload}
+    assert jobs.status(job_id)['status'] == 'running' and jobs.pending() == 0
+
+    jobs.finish(job_id, result={'written': 3})
+    job = jobs.status(job_id)
+    assert (job['status'], job['result'], job['worker']) == ('done', {'written': 3}, 'worker-1')
+    assert jobs.claim('worker-1', timeout=0.1) is None
+
+
+def test_job_queue_large_payload_and_failure(server, monkeypatch):
+    monkeypatch.setattr(state, 'PAYLOAD_CHUNK_BYTES', 64)
+    jobs = state.RedisJobQueue(_client(server), prefix='test')
+    payload = {'text': 'statement ' * 50}
+    job_id = jobs.enqueue('import', payload)
+
+    assert jobs.claim('worker-1', timeout=1)['payload'] == payload
+    jobs.finish(job_id, error="Bad file")
+    assert jobs.status(job_id)['status'] == 'failed'
+
+
+def test_shared_cache_expiry(server):
+    cache = state.RedisSharedCache(_client(server), prefix='test')
+    cache.put('ai', 'key', 'value', ttl=60)
+    cache.put('ai', 'forever', 'value')
+
+    assert cache.get('ai', 'key') == 'value'
+    assert cache.get('ai', 'forever') == 'value'
+    assert cache.get('ai', 'missing') is None
+
+
+def test_lock_release_leaves_a_lease_taken_over_by_someone_else(server):
+    client = _client(server)
+    store = state.RedisTransactionStore(client, prefix='test', mirror_dir='data/mirror')
+    key = store._key('a@b.com', 'lock')
+
+    release = store._acquire('a@b.com')
+    # Our lease lapsed and another process took the lock
+    client.set(key, 'someone-else')
+    release()
+    assert client.get(key) == b'someone-else'
+
+
+def test_lock_lease_is_renewed_while_held(server, monkeypatch):
+    monkeypatch.setattr(state, 'LOCK_LEASE_SECONDS', 0.3)
+    client = _client(server)
+    store = state.RedisTransactionStore(client, prefix='test', mirror_dir='data/mirror')
+
+    with store.lock('a@b.com'):
+        time.sleep(0.8)
+        assert client.exists(store._key('a@b.com', 'lock'))
+    assert not client.exists(store._key('a@b.com', 'lock'))
+
+
+def test_job_of_a_dead_worker_is_requeued(server):
+    dead = state.RedisJobQueue(_client(server), prefix='test', lease_seconds=0.3)
+    alive = state.RedisJobQueue(_client(server), prefix='test', lease_seconds=0.3)
+    job_id = dead.enqueue('import', {'n': 1})
+    assert dead.claim('worker-1', timeout=1)['id'] == job_id
+    # The worker dies: nothing renews its lease any more
+    dead._leases.pop(job_id).set()
+
+    time.sleep(0.4)
+    assert alive.requeue_stale() == []  # First seen without a lease
+    time.sleep(0.4)
+    assert alive.requeue_stale() == [job_id]
+
+    claimed = alive.claim('worker-2', timeout=1)
+    assert claimed['id'] == job_id and claimed['payload'] == {'n': 1}
+    assert alive.status(job_id)['worker'] == 'worker-2'
+    alive.finish(job_id, result='ok')
+    assert alive.client.llen(alive.processing_key) == 0
+
+
+def test_running_job_with_a_live_lease_stays_claimed(server):
+    worker = state.RedisJobQueue(_client(server), prefix='test', lease_seconds=0.3)
+    sweeper = state.RedisJobQueue(_client(server), prefix='test', lease_seconds=0.3)
+    job_id = worker.enqueue('import', {'n': 1})
+    worker.claim('worker-1', timeout=1)
+
+    for _ in range(3):
+        time.sleep(0.4)
+        assert sweeper.requeue_stale() == []
+    assert sweeper.pending() == 0
+    worker.finish(job_id, result='ok')
+    assert sweeper.status(job_id)['status'] == 'done'
@@ -0,0 +1,58 @@
+import os
+import pickle
+import time
+
+import pandas as pd
+
+import workspaces
+from workspaces import WorkspaceCache
+
+BIG = pd.DataFrame({'Amount': range(200000)})
+
+
+def _cache(tmp_path):
+    return WorkspaceCache(spill_after=0, spill_dir=str(tmp_path / 'spill'))
+
+
+def _spill_files(cache):
+    return os.listdir(cache.spill_dir) if os.path.isdir(cache.spill_dir) else []
+
+
+def test_idle_items_spill_and_rehydrate(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put('a@b.com', 'transactions', BIG)
+    time.sleep(0.01)
+
+    assert cache.spill_idle() > 0
+    assert 'transactions' not in cache.workspaces['a@b.com'].items
+    assert len(_spill_files(cache)) == 1
+
+    assert cache.get('a@b.com', 'transactions').equals(BIG)
+    assert _spill_files(cache) == []
+
+
+def test_item_used_while_spilling_stays_in_memory(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    cache.put('a@b.com', 'transactions', BIG)
+    time.sleep(0.01)
+    dump = pickle.dump
+
+    def dump_while_user_returns(value, f, protocol=None):
+        # Runs outside the cache lock: the user's session gets through
+        assert cache.get('a@b.com', 'transactions') is value
+        dump(value, f, protocol=protocol)
+
+    monkeypatch.setattr(workspaces.pickle, 'dump', dump_while_user_returns)
+    assert cache.spill_idle() == 0
+    assert 'transactions' in cache.workspaces['a@b.com'].items
+    assert _spill_files(cache) == []
+
+
+def test_stale_spill_files_are_cleared_at_startup(tmp_path):
+    spill_dir = tmp_path / 'spill'
+    spill_dir.mkdir()
+    (spill_dir / 'left-over.pkl').write_bytes(b'old')
+    (spill_dir / 'notes.txt').write_text('kept')
+
+    WorkspaceCache(spill_dir=str(spill_dir))
+    assert sorted(os.listdir(spill_dir)) == ['notes.txt']
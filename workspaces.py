@@ -0,0 +1,385 @@
+import os
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from caching import CacheCounters, estimate_size
+
+# Budgets for the in-process working sets of signed-in users. A user over
+# quota loses their least recently used items; idle users lose everything.
+# Items are rebuilt from the user's on-disk shard on next access.
+USER_QUOTA_BYTES = int(os.environ.get('USER_QUOTA_MB', 256)) * 1024 * 1024
+TOTAL_QUOTA_BYTES = int(os.environ.get('WORKSPACE_QUOTA_MB', 2048)) * 1024 * 1024
+IDLE_SECONDS = int(os.environ.get('WORKSPACE_IDLE_SECONDS', 1800))
+
+# Before that, items of users inactive for SPILL_AFTER_SECONDS are spilled
+# to disk (pickled) and read back on the next access, which is much cheaper
+# than rebuilding trackers from the store. Small items stay in memory.
+# Spill files only make sense to the process that wrote them, so the
+# directory is emptied when a process starts; give every app process
+# sharing a disk its own WORKSPACE_SPILL_DIR.
+SPILL_DIR = os.environ.get('WORKSPACE_SPILL_DIR', 'data/spill')
+SPILL_AFTER_SECONDS = int(os.environ.get('WORKSPACE_SPILL_SECONDS', 300))
+SPILL_MIN_BYTES = 256 * 1024
+
+
+class Workspace:
+    """One user's cached items, least recently used first"""
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.spilled = {}
+        self.last_access = time.monotonic()
+
+    def nbytes(self):
+        return sum(self.sizes.values())
+
+    def spilled_bytes(self):
+        return sum(size for _, size in self.spilled.values())
+
+
+class WorkspaceCache:
+    """
+    Per-user partitions of in-process state, shared by a user's sessions
+
+    Each user gets a namespace of items (transactions, trackers, ...)
+    with its own memory quota. Large items of users inactive for
+    spill_after seconds are spilled to disk and rehydrated lazily; users
+    idle for idle_seconds are evicted whole, as are the least recently
+    active users when the process-wide quota is exceeded.
+    """
+
+    def __init__(self, user_quota=USER_QUOTA_BYTES, total_quota=TOTAL_QUOTA_BYTES, idle_seconds=IDLE_SECONDS,
+                 spill_after=SPILL_AFTER_SECONDS, spill_dir=SPILL_DIR):
+        self.user_quota = user_quota
+        self.total_quota = total_quota
+        self.idle_seconds = idle_seconds
+        self.spill_after = spill_after
+        self.spill_dir = spill_dir
+        self.workspaces = OrderedDict()
+        self._lock = threading.RLock()
+        self.counters = CacheCounters('workspaces', usage=lambda: (
+            sum(len(workspace.items) for workspace in list(self.workspaces.values())), self.nbytes()))
+        self._clear_spill_dir()
+
+    def _clear_spill_dir(self):
+        """Remove spill files left behind by a previous process"""
+        try:
+            names = os.listdir(self.spill_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.pkl'):
+                self._remove_file(os.path.join(self.spill_dir, name))
+
+    def _workspace(self, user):
+        workspace = self.workspaces.get(user)
+        if workspace is None:
+            workspace = Workspace()
+            self.workspaces[user] = workspace
+        workspace.last_access = time.monotonic()
+        self.workspaces.move_to_end(user)
+        return workspace
+
+    def get(self, user, key, loader=None):
+        """
+        Cached item of a user, loading it on a miss
+
+        Args:
+            user: Authenticated email
+            key: Item key
+            loader: Zero-argument callable building the item (optional)
+
+        Returns:
+            object: The item, or None on a miss without a loader
+        """
+        with self._lock:
+            workspace = self._workspace(user)
+            if key in workspace.items:
+                workspace.items.move_to_end(key)
+                self.counters.hit()
+                return workspace.items[key]
+            spilled = workspace.spilled.pop(key, None)
+        if spilled is not None:
+            value = self._rehydrate(spilled[0])
+            if value is not None:
+                self.counters.hit()
+                self.put(user, key, value)
+                return value
+        self.counters.miss()
+        if loader is None:
+            return None
+        # Loaded outside the lock so one user's slow load doesn't block others
+        value = loader()
+        self.put(user, key, value)
+        return value
+
+    def put(self, user, key, value):
+        """Store an item and enforce the user's and the process quota"""
+        size = estimate_size(value)
+        with self._lock:
+            workspace = self._workspace(user)
+            workspace.items[key] = value
+            workspace.items.move_to_end(key)
+            workspace.sizes[key] = size
+            self._enforce_user_quota(workspace, keep=key)
+            self._enforce_total_quota(keep=user)
+
+    def cached(self, user, kind):
+        """
+        Items of a user whose key is kind or a tuple starting with kind
+
+        Used to update derived state in place without loading it.
+
+        Returns:
+            list: Matching items
+        """
+        with self._lock:
+            workspace = self.workspaces.get(user)
+            if workspace is None:
+                return []
+            # Callers update these items in place: counts as an access, so
+            # a spill that is in progress isn't committed over the update
+            workspace.last_access = time.monotonic()
+            matches = lambda key: key == kind or (isinstance(key, tuple) and key[0] == kind)
+            spilled = [key for key in workspace.spilled if matches(key)]
+        # Spilled items are read back so in-place updates reach them too
+        for key in spilled:
+            self.get(user, key)
+        with self._lock:
+            return [value for key, value in workspace.items.items() if matches(key)]
+
+    def remeasure(self, user):
+        """Refresh the recorded sizes of a user's items after in-place updates"""
+        with self._lock:
+            workspace = self.workspaces.get(user)
+            if workspace is None:
+                return
+            for key, value in workspace.items.items():
+                workspace.sizes[key] = estimate_size(value)
+            self._enforce_user_quota(workspace)
+            self._enforce_total_quota(keep=user)
+
+    def drop(self, user, key=None):
+        """Forget one item of a user, or the whole workspace"""
+        with self._lock:
+            workspace = self.workspaces.get(user)
+            if workspace is None:
+                return
+            if key is None:
+                self._discard(user)
+            else:
+                workspace.items.pop(key, None)
+                workspace.sizes.pop(key, None)
+                spilled = workspace.spilled.pop(key, None)
+                if spilled is not None:
+                    self._remove_file(spilled[0])
+
+    def _discard(self, user):
+        workspace = self.workspaces.pop(user)
+        self.counters.evicted(len(workspace.items) + len(workspace.spilled))
+        for path, _ in workspace.spilled.values():
+            self._remove_file(path)
+
+    def _enforce_user_quota(self, workspace, keep=None):
+        for key in list(workspace.items):
+            if workspace.nbytes() <= self.user_quota:
+                break
+            if key != keep:
+                del workspace.items[key]
+                del workspace.sizes[key]
+                self.counters.evicted()
+
+    def _enforce_total_quota(self, keep=None):
+        for user in list(self.workspaces):
+            if self.nbytes() <= self.total_quota:
+                break
+            if user != keep:
+                self._discard(user)
+
+    def _spill_path(self, user, key):
+        digest = hashlib.sha256(repr((user, key)).encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.spill_dir, f"{digest}.pkl")
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _rehydrate(self, path):
+        """Read a spilled item back, None if the file is gone or unreadable"""
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Error rehydrating workspace item: {str(e)}")
+            value = None
+        self._remove_file(path)
+        return value
+
+    def spill_idle(self, now=None):
+        """
+        Spill large items of users inactive for longer than spill_after
+
+        Victims are picked under the lock but written outside it, so other
+        users' get/put don't wait on the disk. A victim whose user became
+        active meanwhile stays in memory.
+
+        Returns:
+            int: Bytes released from memory
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            victims = [(user, workspace, workspace.last_access, key, workspace.items[key], size)
+                       for user, workspace in self.workspaces.items()
+                       if now - workspace.last_access > self.spill_after
+                       for key, size in workspace.sizes.items() if size >= SPILL_MIN_BYTES]
+        if not victims:
+            return 0
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        released = 0
+        for user, workspace, last_access, key, value, size in victims:
+            path = self._spill_path(user, key)
+            try:
+                with open(path, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+                # Not spillable; it will be rebuilt from the store instead
+                print(f"Error spilling workspace item: {str(e)}")
+                self._remove_file(path)
+                path = None
+
+            with self._lock:
+                current = (self.workspaces.get(user) is workspace and workspace.last_access == last_access
+                           and workspace.items.get(key) is value)
+                if current:
+                    if path is not None:
+                        workspace.spilled[key] = (path, size)
+                    del workspace.items[key]
+                    released += workspace.sizes.pop(key)
+            if not current and path is not None:
+                self._remove_file(path)
+        return released
+
+    def evict_idle(self, now=None):
+        """
+        Evict the working sets of users idle for longer than idle_seconds
+
+        Returns:
+            int: Number of users evicted
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            idle = [user for user, workspace in self.workspaces.items()
+                    if now - workspace.last_access > self.idle_seconds]
+            for user in idle:
+                self._discard(user)
+        return len(idle)
+
+    def maintain(self, now=None):
+        """Spill inactive users, then evict idle ones"""
+        self.spill_idle(now)
+        self.evict_idle(now)
+
+    def nbytes(self):
+        """Total recorded in-memory size of all workspaces"""
+        return sum(workspace.nbytes() for workspace in self.workspaces.values())
+
+    def stats(self):
+        """
+        Per-user memory usage
+
+        Returns:
+            dict: user -> {'items', 'bytes', 'spilled_items', 'spilled_bytes', 'idle_seconds'}
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {user: {'items': len(workspace.items), 'bytes': workspace.nbytes(),
+                           'spilled_items': len(workspace.spilled), 'spilled_bytes': workspace.spilled_bytes(),
+                           'idle_seconds': now - workspace.last_access}
+                    for user, workspace in self.workspaces.items()}
+
+
+class SessionRegistry:
+    """
+    Memory usage of open browser sessions
+
+    Each script run reports its session; the registry keeps the size of
+    the session's own state and which user workspace it shares.
+    """
+
+    def __init__(self, idle_seconds=IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def touch(self, session_id, user, state):
+        """
+        Record one script run of a session
+
+        Args:
+            session_id: Streamlit session id
+            user: User the session is signed in as (None if signed out)
+            state: Mapping of the session's state
+        """
+        size = sum(estimate_size(value) for value in state.values())
+        with self._lock:
+            self.sessions[session_id] = {'user': user, 'state_bytes': size, 'last_seen': time.monotonic()}
+
+    def stats(self, workspace_cache=None):
+        """
+        Per-session memory usage, dropping sessions gone for idle_seconds
+
+        Args:
+            workspace_cache: WorkspaceCache the sessions' users live in
+
+        Returns:
+            dict: session_id -> {'user', 'state_bytes', 'workspace_bytes',
+                  'spilled_bytes', 'idle_seconds'}
+        """
+        now = time.monotonic()
+        users = (workspace_cache or workspaces).stats()
+        with self._lock:
+            for session_id in [s for s, info in self.sessions.items() if now - info['last_seen'] > self.idle_seconds]:
+                del self.sessions[session_id]
+            return {session_id: {'user': info['user'], 'state_bytes': info['state_bytes'],
+                                 'workspace_bytes': users.get(info['user'], {}).get('bytes', 0),
+                                 'spilled_bytes': users.get(info['user'], {}).get('spilled_bytes', 0),
+                                 'idle_seconds': now - info['last_seen']}
+                    for session_id, info in self.sessions.items()}
+
+
+# Shared by every session in this process
+workspaces = WorkspaceCache()
+sessions = SessionRegistry()
+_maintenance_thread = None
+_maintenance_lock = threading.Lock()
+
+
+def start_maintenance(interval=60):
+    """
+    Spill and evict idle workspaces from a daemon thread
+
+    Runs even when no session is active, so memory of users who left
+    their tabs open is released without waiting for someone to click.
+    Safe to call on every script run; only one thread is started.
+    """
+    global _maintenance_thread
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                workspaces.maintain()
+            except Exception as e:
+                print(f"Error in workspace maintenance: {str(e)}")
+
+    with _maintenance_lock:
+        if _maintenance_thread is None:
+            _maintenance_thread = threading.Thread(target=run, name='workspace-maintenance', daemon=True)
+            _maintenance_thread.start()